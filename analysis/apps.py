@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class AnalysisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analysis'
+
+    def ready(self):
+        from .db import configure_sqlite_connection
+        from .metrics import instrument_connection
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='analysis_configure_sqlite')
+        connection_created.connect(instrument_connection, dispatch_uid='analysis_instrument_connection')
@@ -0,0 +1,363 @@
+import time
+import asyncio
+import threading
+from functools import partial
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from wikipedia_analysis.loggers import logging
+
+
+logger = logging.getLogger("wiki_analysis")
+
+
+class _Entry:
+    """
+        A cached value along with the wall clock time it was fetched.
+        Wall clock rather than monotonic time since entries are shared across processes.
+    """
+    __slots__ = ('value', 'fetched_at')
+
+    def __init__(self, value, fetched_at: float) -> None:
+        self.value = value
+        self.fetched_at = fetched_at
+
+
+class LRUCacheTier:
+    """
+        Thread safe in-process LRU cache, bounded by the number of entries
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """
+            Constructor to initialize the LRU tier
+        :param max_entries: Maximum number of entries to hold before evicting the least recently used one
+        """
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DjangoCacheTier:
+    """
+        Shared cache tier backed by one of the configured Django caches (`settings.CACHES`).
+        A `FileBasedCache` alias gives an on-disk tier, a Redis/Memcached alias a cross process one.
+    """
+
+    def __init__(self, alias: str, key_prefix: str = 'wiki_article', timeout: Optional[int] = None) -> None:
+        """
+            Constructor to initialize the shared tier
+        :param alias: Alias of the Django cache to use
+        :param key_prefix: Prefix added to every key stored by this tier
+        :param timeout: Backend expiry in seconds, None to keep the entries as long as the backend allows
+        """
+        self.alias = alias
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    def _key(self, key: str) -> str:
+        return f"{self.key_prefix}:{key}"
+
+    def get(self, key: str) -> Optional[_Entry]:
+        try:
+            stored = self._cache.get(self._key(key))
+        except Exception as ex:
+            logger.error(f"Shared article cache read failed. key:: {key}  exception:: {ex}")
+            return None
+        if stored is None:
+            return None
+        value, fetched_at = stored
+        return _Entry(value, fetched_at)
+
+    def set(self, key: str, entry: _Entry) -> None:
+        try:
+            self._cache.set(self._key(key), (entry.value, entry.fetched_at), self.timeout)
+        except Exception as ex:
+            logger.error(f"Shared article cache write failed. key:: {key}  exception:: {ex}")
+
+    def delete(self, key: str) -> None:
+        self._cache.delete(self._key(key))
+
+    def clear(self) -> None:
+        # The backend may be shared with other users, so only our own keys would be safe to drop and most
+        # backends can not enumerate keys. Entries expire through `timeout` instead.
+        pass
+
+
+class ArticleCache:
+    """
+        Tiered cache of the cleaned article text keyed by the normalized topic.
+
+        Lookups go through the in-process LRU first and then the optional shared tier. Entries younger than
+        `ttl` are fresh. Entries older than `ttl` but within `ttl + stale_ttl` are served as is while a
+        background thread refreshes them (stale-while-revalidate), so a hit never waits on the network.
+        Anything older is a miss and is fetched in the caller's thread. Given a `revalidate` callable, a refresh
+        first checks if the stale value is still current and then only marks it fresh again instead of fetching.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300, stale_ttl: float = 3600,
+                 shared_tier: Optional[DjangoCacheTier] = None) -> None:
+        """
+            Constructor to initialize the cache tiers
+        :param max_entries: Size of the in-process LRU tier
+        :param ttl: Seconds for which an entry is considered fresh
+        :param stale_ttl: Seconds after `ttl` for which a stale entry may still be served
+        :param shared_tier: Optional shared tier consulted on a local miss
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.local = LRUCacheTier(max_entries)
+        self.shared = shared_tier
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.revalidations = 0
+        self.refresh_failures = 0
+        self._refreshing = set()
+        self._refresh_tasks = set()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                # Promote to the local tier so the next lookup stays in process
+                self.local.set(key, entry)
+        return entry
+
+    def get(self, key: str):
+        """
+            Returns the cached value if it can still be served, None otherwise. Does not trigger a refresh.
+        :param key: Normalized topic
+        :return: Cached value or None
+        """
+        entry = self._lookup(key)
+        if entry is None or time.time() - entry.fetched_at > self.ttl + self.stale_ttl:
+            return None
+        return entry.value
+
+    def peek(self, key: str):
+        """
+            Returns the cached value however old it is, None if there is none. Not counted as a hit or miss.
+        """
+        entry = self._lookup(key)
+        return entry.value if entry is not None else None
+
+    def is_fresh(self, key: str) -> bool:
+        """
+            Checks if the key is cached and younger than `ttl`. Not counted as a hit or miss.
+        """
+        entry = self._lookup(key)
+        return entry is not None and time.time() - entry.fetched_at <= self.ttl
+
+    def touch(self, key: str) -> bool:
+        """
+            Marks the cached value fresh again, it being known to be current
+        :param key: Normalized topic
+        :return: bool, False if the key is not cached
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            return False
+        self.set(key, entry.value)
+        with self._lock:
+            self.revalidations += 1
+        return True
+
+    def set(self, key: str, value) -> None:
+        entry = _Entry(value, time.time())
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self) -> None:
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def _refresh(self, key: str, fetch: Callable, revalidate: Optional[Callable] = None) -> None:
+        try:
+            if revalidate is not None and revalidate():
+                self.touch(key)
+                return
+            self.set(key, fetch())
+            with self._lock:
+                self.refreshes += 1
+        except Exception as ex:
+            with self._lock:
+                self.refresh_failures += 1
+            logger.error(f"Background refresh of the article failed. topic:: {key}  exception:: {ex}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: str, fetch: Callable, revalidate: Optional[Callable] = None) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, fetch, revalidate), daemon=True,
+                         name=f"article-cache-refresh-{key}").start()
+
+    def get_or_fetch(self, key: str, fetch: Callable, revalidate: Optional[Callable] = None):
+        """
+            Returns the cached value for the key, calling `fetch` on a miss and refreshing stale entries
+            in the background.
+        :param key: Normalized topic
+        :param fetch: Callable without arguments returning the value to cache
+        :param revalidate: Callable receiving a stale value and returning True if it is still current
+        :return: Cached or freshly fetched value
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            age = time.time() - entry.fetched_at
+            if age <= self.ttl:
+                with self._lock:
+                    self.hits += 1
+                return entry.value
+            if age <= self.ttl + self.stale_ttl:
+                with self._lock:
+                    self.stale_hits += 1
+                self._schedule_refresh(key, fetch, partial(revalidate, entry.value) if revalidate else None)
+                return entry.value
+
+        with self._lock:
+            self.misses += 1
+        value = fetch()
+        self.set(key, value)
+        return value
+
+    async def _arefresh(self, key: str, fetch: Callable, revalidate: Optional[Callable] = None) -> None:
+        try:
+            if revalidate is not None and await revalidate():
+                self.touch(key)
+                return
+            self.set(key, await fetch())
+            with self._lock:
+                self.refreshes += 1
+        except Exception as ex:
+            with self._lock:
+                self.refresh_failures += 1
+            logger.error(f"Background refresh of the article failed. topic:: {key}  exception:: {ex}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def aget_or_fetch(self, key: str, fetch: Callable, revalidate: Optional[Callable] = None):
+        """
+            Async counterpart of get_or_fetch, stale entries are refreshed in a task of the running event loop
+        :param key: Normalized topic
+        :param fetch: Callable without arguments returning an awaitable of the value to cache
+        :param revalidate: Callable receiving a stale value and returning an awaitable of True if it is current
+        :return: Cached or freshly fetched value
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            age = time.time() - entry.fetched_at
+            if age <= self.ttl:
+                with self._lock:
+                    self.hits += 1
+                return entry.value
+            if age <= self.ttl + self.stale_ttl:
+                with self._lock:
+                    self.stale_hits += 1
+                    schedule = key not in self._refreshing
+                    self._refreshing.add(key)
+                if schedule:
+                    # Keep a reference to the task, the loop only holds a weak one
+                    task = asyncio.get_running_loop().create_task(
+                        self._arefresh(key, fetch, partial(revalidate, entry.value) if revalidate else None))
+                    self._refresh_tasks.add(task)
+                    task.add_done_callback(self._refresh_tasks.discard)
+                return entry.value
+
+        with self._lock:
+            self.misses += 1
+        value = await fetch()
+        self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        """
+            Returns the cache counters
+        :return: dict of hit/miss/eviction counters and the local tier size
+        """
+        return dict(hits=self.hits, stale_hits=self.stale_hits, misses=self.misses,
+                    evictions=self.local.evictions, refreshes=self.refreshes, revalidations=self.revalidations,
+                    refresh_failures=self.refresh_failures, size=len(self.local))
+
+
+_article_cache = None
+_article_cache_lock = threading.Lock()
+
+
+def get_article_cache() -> Optional[ArticleCache]:
+    """
+        Returns the process wide article cache built from `settings.WIKI_ARTICLE_CACHE`,
+        None if the cache is disabled
+    """
+    global _article_cache
+    config = getattr(settings, 'WIKI_ARTICLE_CACHE', {})
+    if not config.get('ENABLED', False):
+        return None
+    if _article_cache is None:
+        with _article_cache_lock:
+            if _article_cache is None:
+                shared_alias = config.get('SHARED_CACHE_ALIAS')
+                shared_tier = DjangoCacheTier(shared_alias, timeout=config.get('SHARED_CACHE_TIMEOUT')) \
+                    if shared_alias else None
+                _article_cache = ArticleCache(max_entries=config.get('MAX_ENTRIES', 1024),
+                                              ttl=config.get('TTL', 300),
+                                              stale_ttl=config.get('STALE_TTL', 3600),
+                                              shared_tier=shared_tier)
+    return _article_cache
+
+
+def reset_article_cache() -> None:
+    """
+        Drops the process wide article cache so that it is rebuilt from the current settings
+    """
+    global _article_cache
+    with _article_cache_lock:
+        _article_cache = None
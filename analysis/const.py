@@ -1,5 +1,60 @@
 WIKI_BASE_URL = "https://en.wikipedia.org/w/api.php"
-WIKI_TOPIC_SEARCH_URL = f"{WIKI_BASE_URL}?action=query&prop=extracts&format=json&exintro="
-COMMON_WORDS = ['the', 'is', 'in', 'at', 'which', 'on', 'a', 'this']
+WIKI_TOPIC_SEARCH_URL = f"{WIKI_BASE_URL}?action=query&prop=extracts|info&format=json&exintro="
+# Page metadata only (`lastrevid`, `touched`), to check if an article changed without downloading it
+WIKI_REVISION_URL = f"{WIKI_BASE_URL}?action=query&prop=info&format=json"
+# Whole article as plain text, no HTML to strip
+WIKI_FULL_ARTICLE_URL = f"{WIKI_BASE_URL}?action=query&prop=extracts|info&format=json&explaintext=1"
+# Continuation queries followed for a full article before giving up
+WIKI_MAX_CONTINUATIONS = 10
+# Bytes read at a time from a streamed WIKI response
+WIKI_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Analysis scopes, the lead section or the whole article
+SCOPE_INTRO = 'intro'
+SCOPE_FULL = 'full'
+ANALYSIS_SCOPES = (SCOPE_INTRO, SCOPE_FULL)
+
+# `prop=extracts` returns at most 20 intro extracts per query (`exlimit=max`)
+WIKI_MAX_TITLES_PER_QUERY = 20
+# `prop=info` accepts up to 50 titles per query
+WIKI_MAX_INFO_TITLES_PER_QUERY = 50
+# Sources a topic is resolved to many pages from, in one query: the full text search (`generator=search`) or the
+# members of the category named after the topic (`generator=categorymembers`)
+PAGES_SEARCH = 'search'
+PAGES_CATEGORY = 'category'
+PAGE_SOURCES = (PAGES_SEARCH, PAGES_CATEGORY)
+# Pages analysed per topic, bound by the intro extracts of a single query
+WIKI_MAX_PAGES_PER_TOPIC = WIKI_MAX_TITLES_PER_QUERY
+DEFAULT_PAGES_PER_TOPIC = 10
+BATCH_FETCH_WORKERS = 8
+BATCH_MAX_TOPICS = 500
+COMMON_WORDS = frozenset(['the', 'is', 'in', 'at', 'which', 'on', 'a', 'this'])
+
+# Stopword list names besides the languages of analysis/stopwords: the built in COMMON_WORDS and no list at all
+STOPWORDS_COMMON = 'common'
+STOPWORDS_NONE = 'none'
+# Numeric word rules: keep them, skip numbers (`2024`) or skip any word holding a digit (`1990s`, `2nd`)
+NUMBERS_KEEP = 'keep'
+NUMBERS_SKIP = 'skip'
+NUMBERS_SKIP_ANY = 'skip_any'
+NUMBER_RULES = (NUMBERS_KEEP, NUMBERS_SKIP, NUMBERS_SKIP_ANY)
+
+# Characters of text lowercased and tokenized at a time
+TOKENIZER_CHUNK_SIZE = 64 * 1024
 
 SEARCH_HISTORY_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Fields of a search history entry, in response order
+HISTORY_FIELDS = ('topic', 'word_frequency', 'created_at')
+# Seconds a search history total count is cached for in cursor pagination
+HISTORY_COUNT_CACHE_TIMEOUT = 60
+
+# Default periods of `/word_trends/`, in days, when `since` is not given
+WORD_TRENDS_TOP_DAYS = 7
+WORD_TRENDS_TREND_DAYS = 30
+WORD_TRENDS_DATE_FORMAT = '%Y-%m-%d'
+
+# Search history export: rows read from the database cursor at a time, bytes written per response chunk and the
+# gzip compression level
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BLOCK_SIZE = 64 * 1024
+EXPORT_GZIP_LEVEL = 6
@@ -0,0 +1,34 @@
+from django.conf import settings
+
+from wikipedia_analysis.loggers import logging
+
+
+logger = logging.getLogger("wiki_analysis")
+
+# PRAGMAs that need a writable connection
+WRITE_PRAGMAS = ('journal_mode',)
+
+
+def is_read_only(connection) -> bool:
+    """
+        Checks if the connection opens its SQLite database read only (`file:...?mode=ro` name)
+    """
+    name = str(connection.settings_dict['NAME'])
+    return name.startswith('file:') and 'mode=ro' in name
+
+
+def configure_sqlite_connection(sender, connection, **kwargs) -> None:
+    """
+        `connection_created` receiver applying `settings.WIKI_SQLITE_PRAGMAS` to every new SQLite connection
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'WIKI_SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    read_only = is_read_only(connection)
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            if read_only and pragma in WRITE_PRAGMAS:
+                continue
+            cursor.execute(f"PRAGMA {pragma} = {value}")
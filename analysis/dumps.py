@@ -0,0 +1,140 @@
+import io
+import bz2
+import gzip
+import json
+from collections import namedtuple
+from typing import Iterator
+from xml.etree.ElementTree import iterparse
+
+from .extraction import strip_wikitext
+from .filters import TokenFilter
+from .termstore import sorted_terms, encode_terms, select_top_terms
+from .tokenizer import WordCounter
+
+
+DUMP_FORMAT_XML = 'xml'
+DUMP_FORMAT_JSONL = 'jsonl'
+DUMP_FORMATS = (DUMP_FORMAT_XML, DUMP_FORMAT_JSONL)
+
+# An article of a dump, index being its position among the articles of the dump
+DumpPage = namedtuple('DumpPage', ['index', 'title', 'revision_id', 'text'])
+# Analysis of a DumpPage, terms being the encoded term frequencies when they are to be stored
+PageAnalysis = namedtuple('PageAnalysis', ['index', 'title', 'revision_id', 'total_words', 'top_words', 'terms'])
+
+
+def detect_format(path: str) -> str:
+    """
+        Returns the format of a dump from its name, e.g. `enwiki-pages-articles.xml.bz2` or `articles.jsonl.gz`
+    :raises:
+        ValueError if the name has no known extension
+    """
+    name = path.lower()
+    for suffix in ('.bz2', '.gz'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    for dump_format in DUMP_FORMATS:
+        if name.endswith(f".{dump_format}"):
+            return dump_format
+    raise ValueError(f"Unknown dump format of {path}, expected .xml or .jsonl, optionally .bz2 or .gz")
+
+
+def open_dump(path: str) -> io.BufferedIOBase:
+    """
+        Opens a dump for binary reading, decompressing bz2 and gz dumps on the fly
+    """
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_xml_pages(stream) -> Iterator[DumpPage]:
+    """
+        Yields the articles of a MediaWiki XML export (`pages-articles`), the wikitext being reduced to prose.
+        Pages outside of the main namespace and redirects are skipped. Every page element is cleared once read,
+        so memory does not grow with the dump.
+    :param stream: Binary stream of the XML
+    """
+    index = 0
+    root = None
+    title = revision_id = text = None
+    namespace = '0'
+    redirect = in_revision = False
+    for event, element in iterparse(stream, events=('start', 'end')):
+        name = _local_name(element.tag)
+        if event == 'start':
+            if root is None:
+                root = element
+            elif name == 'page':
+                title = revision_id = text = None
+                namespace = '0'
+                redirect = False
+            elif name == 'revision':
+                in_revision = True
+            continue
+        if name == 'title':
+            title = element.text
+        elif name == 'ns':
+            namespace = (element.text or '0').strip()
+        elif name == 'redirect':
+            redirect = True
+        elif name == 'id' and in_revision and revision_id is None:
+            revision_id = int(element.text)
+        elif name == 'revision':
+            in_revision = False
+        elif name == 'text':
+            text = element.text or ''
+        elif name == 'page':
+            if namespace == '0' and not redirect and title:
+                yield DumpPage(index, title, revision_id, strip_wikitext(text or ''))
+                index += 1
+            # Pages already read are not kept by the tree
+            root.clear()
+
+
+def iter_jsonl_pages(stream) -> Iterator[DumpPage]:
+    """
+        Yields the articles of a JSON lines dump, one `{"title": ..., "text": ..., "revision_id": ...}` object
+        per line with plain text (e.g. the output of WikiExtractor, whose `revid` is read too)
+    :param stream: Binary stream of the JSON lines
+    """
+    index = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        page = json.loads(line)
+        if not page.get('title'):
+            continue
+        revision_id = page.get('revision_id', page.get('revid'))
+        yield DumpPage(index, page['title'], int(revision_id) if revision_id else None, page.get('text') or '')
+        index += 1
+
+
+def iter_dump_pages(stream, dump_format: str) -> Iterator[DumpPage]:
+    if dump_format == DUMP_FORMAT_XML:
+        return iter_xml_pages(stream)
+    return iter_jsonl_pages(stream)
+
+
+def analyse_pages(pages: list, top_word_count: int, token_filter: TokenFilter, store_terms: bool) -> list:
+    """
+        Counts the words of dump pages, in a worker process. Nothing is read from or written to the database.
+    :param pages: List of DumpPage
+    :param top_word_count: Number of top words of each page
+    :param token_filter: Filter of the top words
+    :param store_terms: (bool) if every term of the pages is to be encoded for the term frequency store
+    :return: List of PageAnalysis in the order of the pages
+    """
+    results = []
+    for page in pages:
+        counter = WordCounter().feed(page.text)
+        terms = sorted_terms(counter.close())
+        results.append(PageAnalysis(page.index, page.title, page.revision_id, counter.tokens,
+                                    select_top_terms(terms, top_word_count, token_filter),
+                                    encode_terms(terms) if store_terms else None))
+    return results
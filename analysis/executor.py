@@ -0,0 +1,211 @@
+import os
+import threading
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from django.conf import settings
+
+from .tokenizer import WordCounter, _trailing_word_start
+from .filters import TokenFilter, NO_FILTER, load_stopwords, STOPWORDS_DIR
+from wikipedia_analysis.loggers import logging
+
+
+logger = logging.getLogger("wiki_analysis")
+
+DEFAULT_ANALYSIS_EXECUTOR_CONFIG = {
+    'ENABLED': False,
+    # Worker processes, os.cpu_count() when None
+    'MAX_WORKERS': None,
+    # Texts shorter than this many characters are counted in the calling thread
+    'MIN_TEXT_SIZE': 256 * 1024,
+    # Longer texts are split into blocks of about this many characters, counted in parallel
+    'BLOCK_SIZE': 1024 * 1024,
+    # Start method of the workers, forking a threaded server is not safe so forkserver is used where available
+    'START_METHOD': 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn',
+}
+
+
+def _init_worker() -> None:
+    """
+        Worker initializer, loads every bundled stopword list once so that filters sent by name find them
+    """
+    names = [path.stem for path in STOPWORDS_DIR.glob('*.txt')]
+    load_stopwords(','.join(names))
+
+
+def _count_block(text: str, token_filter: TokenFilter) -> tuple:
+    """
+        Counts the words of a block of text in a worker process
+    :return: Filtered Counter of the words and number of tokens
+    """
+    counter = WordCounter(token_filter).feed(text)
+    return counter.close(), counter.tokens
+
+
+class AnalysisExecutor:
+    """
+        Warm process pool counting the words of large texts on every core. Tokenizing is pure Python and holds
+        the GIL, so a large article counted in a request thread stalls every other thread of the worker; in
+        the pool it only costs the parent the pickling of the text and the merge of the counts.
+    """
+
+    def __init__(self, config: Optional[dict] = None) -> None:
+        """
+            Constructor to initialize the executor, the pool starts on the first submission
+        :param config: Executor configuration, see DEFAULT_ANALYSIS_EXECUTOR_CONFIG
+        """
+        self.config = {**DEFAULT_ANALYSIS_EXECUTOR_CONFIG, **(config or {})}
+        self.max_workers = self.config['MAX_WORKERS'] or os.cpu_count() or 1
+        self.min_text_size = self.config['MIN_TEXT_SIZE']
+        self.block_size = max(self.config['BLOCK_SIZE'], self.min_text_size)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.inline = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context(self.config['START_METHOD'])
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                                 initializer=_init_worker)
+            return self._pool
+
+    def warm(self) -> None:
+        """
+            Starts every worker process now rather than on the first large text
+        """
+        pool = self._get_pool()
+        for future in [pool.submit(_count_block, '', NO_FILTER) for _ in range(self.max_workers)]:
+            future.result()
+
+    def submit(self, text: str, token_filter: TokenFilter):
+        """
+            Submits a block of text to be counted
+        :return: Future of the filtered Counter and number of tokens
+        """
+        with self._lock:
+            self.submitted += 1
+        return self._get_pool().submit(_count_block, text, token_filter)
+
+    def count_inline(self) -> None:
+        """
+            Counts a text counted in the calling thread rather than submitted
+        """
+        with self._lock:
+            self.inline += 1
+
+    def reset(self) -> None:
+        """
+            Drops a broken pool, the next submission starts a new one
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        return dict(max_workers=self.max_workers, submitted=self.submitted, inline=self.inline,
+                    started=self._pool is not None)
+
+
+class PooledWordCounter(WordCounter):
+    """
+        WordCounter handing blocks of BLOCK_SIZE characters to an AnalysisExecutor. Blocks are cut on a word
+        boundary, counted and filtered in the workers and merged in order, so the counts and the order of ties
+        are the ones of WordCounter. At most two blocks per worker are in flight, which keeps a streamed article
+        in bounded memory. Texts shorter than MIN_TEXT_SIZE in total are counted in the calling thread.
+    """
+
+    def __init__(self, executor: AnalysisExecutor, token_filter: TokenFilter = NO_FILTER) -> None:
+        super().__init__(token_filter)
+        self.executor = executor
+        self._buffer = []
+        self._buffered = 0
+        self._futures = deque()
+
+    def feed(self, text: str) -> 'PooledWordCounter':
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.executor.block_size:
+            self._submit(final=False)
+        return self
+
+    def _submit(self, final: bool) -> None:
+        text = ''.join(self._buffer)
+        cut = len(text) if final else _trailing_word_start(text)
+        if not cut:
+            # A single word longer than the block, wait for its end
+            self._buffer = [text]
+            return
+        self._buffer = [text[cut:]] if cut < len(text) else []
+        self._buffered = len(text) - cut
+        self._futures.append(self.executor.submit(text[:cut], self.token_filter))
+        while len(self._futures) > 2 * self.executor.max_workers:
+            self._merge(self._futures.popleft())
+
+    def _merge(self, future) -> None:
+        try:
+            counts, tokens = future.result()
+        except BrokenProcessPool:
+            logger.error("Analysis process pool is broken, restarting it")
+            self.executor.reset()
+            raise
+        self.counts.update(counts)
+        self.tokens += tokens
+
+    def close(self) -> Counter:
+        if self._filtered:
+            return self.counts
+        if not self._futures and self._buffered < self.executor.min_text_size:
+            self.executor.count_inline()
+            text = ''.join(self._buffer)
+            self._buffer = []
+            super().feed(text)
+            return super().close()
+        if self._buffered:
+            self._submit(final=True)
+        while self._futures:
+            self._merge(self._futures.popleft())
+        # The workers filtered their blocks
+        self._filtered = True
+        return self.counts
+
+
+_analysis_executor = None
+_analysis_executor_lock = threading.Lock()
+
+
+def get_analysis_executor() -> Optional[AnalysisExecutor]:
+    """
+        Returns the process wide analysis executor built from `settings.WIKI_ANALYSIS_EXECUTOR`, None if it is
+        disabled
+    """
+    global _analysis_executor
+    config = {**DEFAULT_ANALYSIS_EXECUTOR_CONFIG, **getattr(settings, 'WIKI_ANALYSIS_EXECUTOR', {})}
+    if not config['ENABLED']:
+        return None
+    if _analysis_executor is None:
+        with _analysis_executor_lock:
+            if _analysis_executor is None:
+                _analysis_executor = AnalysisExecutor(config)
+    return _analysis_executor
+
+
+def new_word_counter(token_filter: TokenFilter = NO_FILTER) -> WordCounter:
+    """
+        Returns a PooledWordCounter when the analysis executor is enabled, a WordCounter otherwise
+    """
+    executor = get_analysis_executor()
+    if executor is None:
+        return WordCounter(token_filter)
+    return PooledWordCounter(executor, token_filter)
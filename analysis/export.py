@@ -0,0 +1,100 @@
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, AsyncIterator, Optional
+
+from asgiref.sync import sync_to_async
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import SearchResult
+from .const import EXPORT_CHUNK_SIZE, EXPORT_BLOCK_SIZE, EXPORT_GZIP_LEVEL
+
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def parse_since(value: Optional[str]) -> Optional[datetime]:
+    """
+        Returns the aware datetime of an ISO 8601 day or date and time, naive ones being in the current time zone
+    :param value: e.g. 2024-03-01 or 2024-03-01T12:00:00.123456+00:00
+    :return: datetime or None when no value is given
+    :raises:
+        ValueError if the value is invalid
+    """
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date {value}, expected an ISO 8601 day or date and time")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def export_queryset(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    after_id: Optional[int] = None, topic: Optional[str] = None) -> QuerySet:
+    """
+        Returns the search results to export as (id, topic, created_at, word_frequency) tuples, oldest first.
+        Rows are ordered by id, which only grows, so `after_id` set to the last exported id pulls the rows saved
+        since the previous export.
+    :param since: Only rows created at or after this time
+    :param until: Only rows created before this time
+    :param after_id: Only rows with a greater id
+    :param topic: Only rows of this cleaned topic
+    """
+    search_results = SearchResult.objects.all()
+    if since is not None:
+        search_results = search_results.filter(created_at__gte=since)
+    if until is not None:
+        search_results = search_results.filter(created_at__lt=until)
+    if after_id is not None:
+        search_results = search_results.filter(id__gt=after_id)
+    if topic:
+        search_results = search_results.filter(topic=topic)
+    return search_results.order_by('id').values_list('id', 'topic', 'created_at', 'word_frequency')
+
+
+def iter_ndjson(rows: QuerySet, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """
+        Yields a JSON line per row of export_queryset, reading `chunk_size` rows at a time from the database cursor
+        so that memory stays constant whatever the size of the history
+    """
+    for pk, topic, created_at, word_frequency in rows.iterator(chunk_size=chunk_size):
+        yield f'{{"id":{pk},"topic":{json.dumps(topic)},' \
+              f'"word_frequency":{json.dumps(word_frequency.tolist())},"created_at":"{created_at.isoformat()}"}}\n'
+
+
+def iter_blocks(lines: Iterable[str], compress: bool = False, block_size: int = EXPORT_BLOCK_SIZE) -> Iterator[bytes]:
+    """
+        Joins the lines into blocks of about `block_size` bytes, gzip compressed if asked, so that the response is
+        written in a few large chunks rather than one per row
+    """
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    block, size = [], 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= block_size:
+            data = ''.join(block).encode()
+            block, size = [], 0
+            if compressor is None:
+                yield data
+            elif data := compressor.compress(data):
+                yield data
+    data = ''.join(block).encode()
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+async def aiter_blocks(blocks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+        Serves the blocks to the ASGI handler one at a time. A synchronous iterator would be read to the end into
+        memory by StreamingHttpResponse, every block is read in the same thread so the database cursor stays in
+        the thread of its connection.
+    """
+    done = object()
+    next_block = sync_to_async(next, thread_sensitive=True)
+    while (block := await next_block(blocks, done)) is not done:
+        yield block
@@ -0,0 +1,81 @@
+import re
+from html import unescape
+
+from django.conf import settings
+
+
+DEFAULT_EXTRACT_CONFIG = {
+    # Ask WIKI for plain text extracts (`explaintext`) instead of HTML, skipping the stripping altogether
+    'EXPLAINTEXT': False,
+}
+
+# One alternation for everything that is not prose: <script> and <style> elements with their content, comments,
+# and any other tag. The pattern starts with a literal '<', so the regex engine skips from one '<' to the next
+# in C and the text between tags is never looked at character by character.
+MARKUP_RE = re.compile(r'<(?:(script|style)\b.*?</\1\s*>|!--.*?-->|[^>]*>)', re.DOTALL | re.IGNORECASE)
+
+# Wikitext of the dumps: <ref> elements, innermost templates and tables, innermost links, external links
+# with their label, bold/italic quotes and heading marks
+REF_RE = re.compile(r'<ref\b[^>/]*/>|<ref\b.*?</ref\s*>', re.DOTALL | re.IGNORECASE)
+TEMPLATE_RE = re.compile(r'\{\{[^{}]*\}\}|\{\|[^{}]*?\|\}')
+LINK_RE = re.compile(r'\[\[([^\[\]|]*)(?:\|([^\[\]]*))?\]\]')
+EXTERNAL_LINK_RE = re.compile(r'\[(?:https?:)?//[^\s\]]*\s*([^\]]*)\]')
+EMPHASIS_HEADING_RE = re.compile(r"'{2,}|^=+|=+\s*$", re.MULTILINE)
+# Links to these namespaces are media or metadata, not prose
+NON_PROSE_NAMESPACES = frozenset(['file', 'image', 'category', 'media'])
+
+
+def get_extract_config() -> dict:
+    """
+        Returns the extract configuration, `settings.WIKI_EXTRACTS` over the defaults
+    """
+    return {**DEFAULT_EXTRACT_CONFIG, **getattr(settings, 'WIKI_EXTRACTS', {})}
+
+
+def strip_html(text: str) -> str:
+    """
+        Returns the prose of an HTML extract: tags are removed, <script>/<style> elements and comments are
+        dropped with their content and entities (`&amp;`, `&#160;`...) are decoded. Tags are removed in a single
+        `sub` with a constant replacement, so no Python code runs per tag, and entities are only decoded when
+        the text has any.
+    :param text: HTML text
+    :return: Plain text
+    """
+    if '<' in text:
+        text = MARKUP_RE.sub('', text)
+    if '&' in text:
+        text = unescape(text)
+    return text
+
+
+def _link_text(match) -> str:
+    target, label = match.groups()
+    if ':' in target and target.split(':', 1)[0].strip().lower() in NON_PROSE_NAMESPACES:
+        return ''
+    return target if label is None else label
+
+
+def _replace_innermost(pattern, replacement, text: str) -> str:
+    # Nested constructs are removed from the inside out
+    while True:
+        text, replaced = pattern.subn(replacement, text)
+        if not replaced:
+            return text
+
+
+def strip_wikitext(text: str) -> str:
+    """
+        Returns the prose of the wikitext of a dump: references, templates, tables, media and category links
+        are dropped, links keep their label, markup and HTML are removed and entities decoded
+    :param text: Wikitext
+    :return: Plain text
+    """
+    text = REF_RE.sub('', text)
+    if '{' in text:
+        text = _replace_innermost(TEMPLATE_RE, '', text)
+    if '[[' in text:
+        text = _replace_innermost(LINK_RE, _link_text, text)
+    if '[' in text:
+        text = EXTERNAL_LINK_RE.sub(r'\1', text)
+    text = EMPHASIS_HEADING_RE.sub('', text)
+    return strip_html(text)
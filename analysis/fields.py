@@ -0,0 +1,191 @@
+import sys
+import json
+import zlib
+from array import array
+from base64 import b64encode, b64decode
+from collections.abc import Sequence
+
+from django.db import models
+
+
+# First byte of an encoded word frequency: the width in bytes of the packed counts, or _FORMAT_JSON for values
+# that are not [word, count] pairs (the {"word": ..., "frequency": ...} dicts of older rows). _COMPRESSED is set
+# when the rest is zlib compressed.
+_FORMAT_JSON = 0
+_COUNT_TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+_COMPRESSED = 0x80
+# Smaller payloads do not get smaller compressed
+_COMPRESS_MIN_SIZE = 256
+_SEPARATOR = '\0'
+
+
+def _varint(value: int) -> bytes:
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def _read_varint(data, position: int) -> tuple:
+    value, shift = 0, 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _pairs(value) -> tuple:
+    """
+        Splits [word, count] pairs into the words and the counts
+    :raises:
+        ValueError if the value is not a list of pairs of a word and a count fitting 32 bits
+    """
+    words, counts = [], []
+    for item in value:
+        if not isinstance(item, (list, tuple)) or len(item) != 2:
+            raise ValueError("Not a pair")
+        word, count = item
+        if not isinstance(word, str) or _SEPARATOR in word or type(count) is not int or not 0 <= count < 2 ** 32:
+            raise ValueError("Not a word and a count")
+        words.append(word)
+        counts.append(count)
+    return words, counts
+
+
+def encode_word_frequency(value) -> bytes:
+    """
+        Packs the [word, count] pairs of a search result: the number of pairs as a varint, the counts as little
+        endian integers of the smallest width holding the largest one and the words joined by NUL. Other values
+        are kept as JSON, and payloads of _COMPRESS_MIN_SIZE bytes or more are compressed when it pays off.
+    :param value: List of (word, count) pairs, or any JSON serializable value
+    :return: Encoded blob
+    """
+    try:
+        words, counts = _pairs(value)
+    except ValueError:
+        header, payload = _FORMAT_JSON, json.dumps(value, separators=(',', ':')).encode()
+    else:
+        largest = max(counts, default=0)
+        header = 1 if largest < 2 ** 8 else 2 if largest < 2 ** 16 else 4
+        packed = array(_COUNT_TYPECODES[header], counts)
+        if sys.byteorder != 'little':
+            packed.byteswap()
+        payload = _varint(len(counts)) + packed.tobytes() + _SEPARATOR.join(words).encode()
+    if len(payload) >= _COMPRESS_MIN_SIZE:
+        compressed = zlib.compress(payload)
+        if len(compressed) < len(payload):
+            header, payload = header | _COMPRESSED, compressed
+    return bytes((header,)) + payload
+
+
+def decode_word_frequency(blob: bytes) -> list:
+    """
+        Unpacks a blob built by encode_word_frequency
+    :param blob: Encoded blob
+    :return: List of [word, count] lists, or the value kept as JSON
+    """
+    header = blob[0]
+    if header & _COMPRESSED:
+        data, position = zlib.decompress(blob[1:]), 0
+    else:
+        data, position = blob, 1
+    width = header & ~_COMPRESSED
+    if width == _FORMAT_JSON:
+        return json.loads(data[position:])
+    size = data[position]
+    if size < 0x80:
+        position += 1
+    else:
+        size, position = _read_varint(data, position)
+    if not size:
+        return []
+    counts_end = position + size * width
+    if width == 1:
+        # Iterating bytes gives the integers
+        counts = data[position:counts_end]
+    else:
+        counts = array(_COUNT_TYPECODES[width])
+        counts.frombytes(data[position:counts_end])
+        if sys.byteorder != 'little':
+            counts.byteswap()
+    return list(map(list, zip(data[counts_end:].decode().split(_SEPARATOR), counts)))
+
+
+_UNDECODED = object()
+
+
+class WordFrequency(Sequence):
+    """
+        Read only word frequency of a search result loaded from the database, decoded on first access. Rows that
+        are only counted, filtered on other columns or saved again never decode it.
+    """
+    __slots__ = ('blob', '_value')
+
+    def __init__(self, blob: bytes) -> None:
+        self.blob = blob
+        self._value = _UNDECODED
+
+    def tolist(self) -> list:
+        """
+            Returns the decoded value, the same list on every call
+        """
+        if self._value is _UNDECODED:
+            self._value = decode_word_frequency(self.blob)
+        return self._value
+
+    def __getitem__(self, index):
+        return self.tolist()[index]
+
+    def __len__(self) -> int:
+        return len(self.tolist())
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, WordFrequency):
+            return self.blob == other.blob or self.tolist() == other.tolist()
+        return self.tolist() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"WordFrequency({self.tolist()!r})"
+
+
+class WordFrequencyField(models.BinaryField):
+    """
+        Stores the [word, count] pairs of a search result packed by encode_word_frequency, 2 bytes or so per pair
+        besides the word against 8 for JSON text. Values are read as WordFrequency, decoded only when they are
+        used, and written from lists of pairs (or a WordFrequency, saved back without encoding it again).
+    """
+    description = "Word frequency pairs in a compact binary encoding"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        # PostgreSQL returns a memoryview, SQLite bytes
+        return WordFrequency(value if isinstance(value, bytes) else bytes(value))
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            # Serialized as base64 by value_to_string
+            return WordFrequency(b64decode(value.encode('ascii')))
+        if isinstance(value, (bytes, memoryview)):
+            return WordFrequency(bytes(value))
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        if isinstance(value, WordFrequency):
+            return value.blob
+        return encode_word_frequency(value)
+
+    def value_to_string(self, obj) -> str:
+        return b64encode(self.get_prep_value(self.value_from_object(obj))).decode('ascii')
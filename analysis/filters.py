@@ -0,0 +1,196 @@
+import re
+import sys
+from pathlib import Path
+from functools import lru_cache
+from collections import Counter
+
+from django.conf import settings
+
+from .const import COMMON_WORDS, STOPWORDS_COMMON, STOPWORDS_NONE, NUMBERS_KEEP, NUMBERS_SKIP, \
+    NUMBERS_SKIP_ANY, NUMBER_RULES
+from wikipedia_analysis.loggers import logging
+
+
+logger = logging.getLogger("wiki_analysis")
+
+STOPWORDS_DIR = Path(__file__).resolve().parent / 'stopwords'
+STOPWORD_LIST_NAME_RE = re.compile(r'[a-z][a-z_]*\Z')
+DIGIT_RE = re.compile(r'\d')
+
+
+@lru_cache(maxsize=None)
+def _read_stopword_list(name: str, dirs: tuple) -> frozenset:
+    for directory in dirs:
+        path = Path(directory) / f"{name}.txt"
+        if path.is_file():
+            with open(path, encoding='utf-8') as stopword_file:
+                return frozenset(line.strip().lower() for line in stopword_file
+                                 if line.strip() and not line.startswith('#'))
+    logger.error(f"Stopword list not found. name:: {name}")
+    raise ValueError("Stopword list is invalid.")
+
+
+def _stopword_dirs() -> tuple:
+    return tuple(getattr(settings, 'WIKI_STOPWORDS', {}).get('DIRS', ())) + (STOPWORDS_DIR,)
+
+
+def load_stopwords(names: str) -> frozenset:
+    """
+        Returns the union of comma separated stopword lists. A list is `common` (COMMON_WORDS), `none` or a
+        language with a `<language>.txt` file, one word per line, in `settings.WIKI_STOPWORDS['DIRS']` or
+        analysis/stopwords. Files are read once per process.
+    :param names: Comma separated list names, e.g. `en,fr`
+    :return: Lower case stopwords
+    :raises:
+        ValueError if a list is unknown
+    """
+    if not isinstance(names, str):
+        raise ValueError("Stopword list is invalid.")
+    dirs = _stopword_dirs()
+    stopwords = frozenset()
+    for name in filter(None, (name.strip().lower() for name in names.split(','))):
+        if name == STOPWORDS_COMMON:
+            stopwords |= COMMON_WORDS
+        elif name == STOPWORDS_NONE:
+            continue
+        elif STOPWORD_LIST_NAME_RE.match(name):
+            stopwords |= _read_stopword_list(name, dirs)
+        else:
+            logger.error(f"Stopword list name is invalid. name:: {name}")
+            raise ValueError("Stopword list is invalid.")
+    return stopwords
+
+
+class TokenFilter:
+    """
+        Word filter built once per analysis: a stopword frozenset, length bounds and a numeric rule compiled
+        into a single `rejects(word)` predicate.
+
+        Counting never calls it per token, it is applied to the distinct words once counting is done (see
+        WordCounter.close and termstore.select_top_terms), so a list of hundreds of stopwords costs one hash
+        lookup per distinct word.
+    """
+
+    def __init__(self, stopwords: frozenset = frozenset(), min_length: int = 1, max_length: int = None,
+                 numbers: str = NUMBERS_KEEP) -> None:
+        """
+            Constructor to initialize and compile the filter
+        :param stopwords: Lower case words to leave out
+        :param min_length: Shortest word kept, in characters
+        :param max_length: Longest word kept, in characters, None for no limit
+        :param numbers: NUMBERS_KEEP, NUMBERS_SKIP or NUMBERS_SKIP_ANY
+        :raises:
+            ValueError if a bound or the numeric rule is invalid
+        """
+        if min_length < 1:
+            raise ValueError("Min length is invalid.")
+        if max_length is not None and max_length < min_length:
+            raise ValueError("Max length is invalid.")
+        if numbers not in NUMBER_RULES:
+            raise ValueError("Numbers rule is invalid.")
+        self.stopwords = frozenset(stopwords)
+        # Names of the stopword lists when built by from_params, pickled instead of the words
+        self.stopword_lists = None
+        self.min_length = min_length
+        self.max_length = max_length
+        self.numbers = numbers
+        self.rejects = self._compile()
+
+    @classmethod
+    def from_params(cls, stopwords: str = STOPWORDS_COMMON, min_length=1, max_length=None,
+                    numbers: str = NUMBERS_SKIP) -> 'TokenFilter':
+        """
+            Builds the filter from request parameters, given as strings or values
+        :param stopwords: Comma separated stopword list names, see load_stopwords
+        :param min_length: Shortest word kept
+        :param max_length: Longest word kept, None or '' for no limit
+        :param numbers: Numeric rule
+        :return: TokenFilter
+        :raises:
+            ValueError if a parameter is invalid
+        """
+        try:
+            min_length = int(min_length)
+            max_length = int(max_length) if max_length not in (None, '') else None
+        except (TypeError, ValueError):
+            raise ValueError("Length is invalid.")
+        token_filter = cls(load_stopwords(stopwords), min_length, max_length, numbers)
+        token_filter.stopword_lists = stopwords
+        return token_filter
+
+    def __reduce__(self):
+        # The compiled predicate can not be pickled, the filter is rebuilt on the other side
+        return _restore_token_filter, (self.stopword_lists or self.stopwords, self.min_length, self.max_length,
+                                       self.numbers)
+
+    @property
+    def key(self) -> tuple:
+        """
+            Key identifying filters that keep the same words
+        """
+        return self.stopwords, self.min_length, self.max_length, self.numbers
+
+    @property
+    def is_noop(self) -> bool:
+        return not self.stopwords and self.min_length == 1 and self.max_length is None \
+            and self.numbers == NUMBERS_KEEP
+
+    def _compile(self):
+        stopwords = self.stopwords
+        min_length = self.min_length
+        max_length = sys.maxsize if self.max_length is None else self.max_length
+        bounded = self.min_length > 1 or self.max_length is not None
+        numeric = {NUMBERS_KEEP: None, NUMBERS_SKIP: str.isnumeric, NUMBERS_SKIP_ANY: DIGIT_RE.search}[self.numbers]
+
+        def rejects(word: str) -> bool:
+            # Disabled checks short circuit on a local flag
+            return bool(word in stopwords or (bounded and not min_length <= len(word) <= max_length)
+                        or (numeric is not None and numeric(word)))
+        return rejects
+
+    def filter_counts(self, counts: Counter) -> Counter:
+        """
+            Removes the rejected words from the counter in place
+        :param counts: Counter of the words
+        :return: The same counter
+        """
+        if self.is_noop:
+            return counts
+        rejects = self.rejects
+        for word in [word for word in counts if rejects(word)]:
+            del counts[word]
+        return counts
+
+
+@lru_cache(maxsize=64)
+def _restore_token_filter(stopwords, min_length: int, max_length: int, numbers: str) -> TokenFilter:
+    """
+        Unpickles a TokenFilter, reusing the filters already built in this process. Stopwords given by list names
+        are read from the lists loaded by this process.
+    """
+    if isinstance(stopwords, str):
+        return TokenFilter.from_params(stopwords, min_length, max_length, numbers)
+    return TokenFilter(stopwords, min_length, max_length, numbers)
+
+
+@lru_cache(maxsize=256)
+def _cached_token_filter(stopwords, min_length, max_length, numbers, dirs: tuple) -> TokenFilter:
+    return TokenFilter.from_params(stopwords, min_length, max_length, numbers)
+
+
+def get_token_filter(stopwords: str = STOPWORDS_COMMON, min_length=1, max_length=None,
+                     numbers: str = NUMBERS_SKIP) -> TokenFilter:
+    """
+        Returns TokenFilter.from_params of the parameters, built once per process for each distinct parameters
+        and stopword directories. Filters are never changed once built, so requests share them
+    :raises:
+        ValueError if a parameter is invalid
+    """
+    try:
+        return _cached_token_filter(stopwords, min_length, max_length, numbers, _stopword_dirs())
+    except TypeError:
+        # Unhashable parameters, e.g. a list from a JSON body, are left to from_params to reject
+        return TokenFilter.from_params(stopwords, min_length, max_length, numbers)
+
+
+NO_FILTER = TokenFilter()
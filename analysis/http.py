@@ -0,0 +1,346 @@
+import time
+import random
+import asyncio
+import weakref
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from typing import Optional, TYPE_CHECKING
+
+from django.conf import settings
+
+from .metrics import observe_upstream
+from wikipedia_analysis.loggers import logging
+
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from urllib3.util.retry import Retry
+
+logger = logging.getLogger("wiki_analysis")
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+DEFAULT_HTTP_CLIENT_CONFIG = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 50,
+    'MAX_RETRIES': 3,
+    'BACKOFF_FACTOR': 0.5,
+    'BACKOFF_JITTER': 0.5,
+    'BACKOFF_MAX': 30,
+    'CIRCUIT_FAILURE_THRESHOLD': 5,
+    'CIRCUIT_RECOVERY_TIMEOUT': 30,
+    'USER_AGENT': 'wikipedia-analysis/1.0',
+}
+
+
+class CircuitOpenError(Exception):
+    """
+        Raised instead of calling WIKI while the circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+        Thread safe circuit breaker. Opens after `failure_threshold` consecutive failures and rejects calls for
+        `recovery_timeout` seconds, after which a single trial call is let through (half open). A successful
+        trial closes the circuit, a failed one opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """
+            Checks if a call may go through
+        :raises:
+            CircuitOpenError if the circuit is open
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError("Wikipedia is unavailable, try again later")
+                self.state = self.HALF_OPEN
+            elif self.state == self.HALF_OPEN:
+                # A trial call is already in flight
+                self.rejected += 1
+                raise CircuitOpenError("Wikipedia is unavailable, try again later")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                    logger.error(f"Circuit breaker opened after {self.failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def abandon_trial(self) -> None:
+        """
+            Called when a call ends with neither a success nor a failure recorded (cancelled, or an unexpected
+            error), so that a half open circuit is not left waiting for its trial forever: the circuit is opened
+            again with its recovery timeout already elapsed, the next call makes the trial
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+
+def _retry_after(response) -> Optional[float]:
+    """
+        Returns the seconds to wait from the Retry-After header of the response, if any
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_environment_settings(session: 'requests.Session') -> None:
+    """
+        Makes the session read the settings requests takes from the environment (proxies, `NO_PROXY`, CA bundle)
+        once per origin instead of on every request, where scanning the environment costs more than preparing
+        the request. They do not change while the process runs
+    """
+    merge = session.merge_environment_settings
+    merged = {}
+
+    def merge_environment_settings(url, proxies, stream, verify, cert):
+        if proxies or verify is not None or cert is not None:
+            return merge(url, proxies, stream, verify, cert)
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc, stream)
+        environment = merged.get(key)
+        if environment is None:
+            environment = merged[key] = merge(url, proxies, stream, verify, cert)
+        return dict(environment, proxies=dict(environment['proxies']))
+
+    session.merge_environment_settings = merge_environment_settings
+
+
+class WikiHttpClient:
+    """
+        Shared HTTP client for all WIKI access.
+
+        The sync path uses a requests Session whose connection pool keeps connections alive across requests
+        and threads, with urllib3 retrying 429/5xx responses and connection errors with jittered exponential
+        backoff, honouring Retry-After. The async path uses a pooled httpx.AsyncClient per event loop with the
+        same retry policy. Both go through one circuit breaker.
+
+        requests is imported by the first client and httpx by the first async client rather than with this
+        module: together they take about a tenth of a second to import, paid at start up by every worker
+        even though a WSGI worker never uses httpx.
+    """
+
+    def __init__(self, config: Optional[dict] = None) -> None:
+        """
+            Constructor to initialize the session and the circuit breaker
+        :param config: Client configuration, see DEFAULT_HTTP_CLIENT_CONFIG
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.config = {**DEFAULT_HTTP_CLIENT_CONFIG, **(config or {})}
+        self.timeout = (self.config['CONNECT_TIMEOUT'], self.config['READ_TIMEOUT'])
+        self.breaker = CircuitBreaker(self.config['CIRCUIT_FAILURE_THRESHOLD'],
+                                      self.config['CIRCUIT_RECOVERY_TIMEOUT'])
+        self.adapter = HTTPAdapter(pool_connections=self.config['POOL_CONNECTIONS'],
+                                   pool_maxsize=self.config['POOL_MAXSIZE'],
+                                   max_retries=self._build_retry())
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = self.config['USER_AGENT']
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        _cache_environment_settings(self.session)
+        self._async_clients = weakref.WeakKeyDictionary()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _build_retry(self) -> 'Retry':
+        from urllib3.util.retry import Retry
+
+        return Retry(total=self.config['MAX_RETRIES'], backoff_factor=self.config['BACKOFF_FACTOR'],
+                     backoff_jitter=self.config['BACKOFF_JITTER'], backoff_max=self.config['BACKOFF_MAX'],
+                     status_forcelist=RETRY_STATUS_CODES, allowed_methods=frozenset(['GET']),
+                     respect_retry_after_header=True, raise_on_status=False)
+
+    def _record(self, failed: bool, retries: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            self.failures += failed
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def get(self, url: str, params: Optional[dict] = None, stream: bool = False) -> 'requests.Response':
+        """
+            GET the url through the pooled session
+        :param url: Url to fetch
+        :param params: Query parameters to add to the url
+        :param stream: (bool) if the body is to be read by the caller with `iter_content`, the caller then
+            closes the response to release the connection
+        :return: Response, the caller checks the status
+        :raises:
+            CircuitOpenError if the circuit breaker is open
+            requests.RequestException on connection errors and timeouts once the retries are exhausted
+        """
+        import requests
+
+        self.breaker.before_call()
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+        except requests.RequestException:
+            self._record(failed=True, retries=self.config['MAX_RETRIES'])
+            raise
+        except BaseException:
+            self.breaker.abandon_trial()
+            raise
+        retry_state = getattr(response.raw, 'retries', None)
+        retries = len(retry_state.history) if retry_state is not None else 0
+        self._record(failed=response.status_code in RETRY_STATUS_CODES, retries=retries)
+        observe_upstream(response.status_code, None if stream else len(response.content))
+        return response
+
+    def _get_async_client(self) -> 'httpx.AsyncClient':
+        """
+            Returns the pooled async HTTP client of the running event loop, an httpx.AsyncClient can not be
+            shared across loops
+        """
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.config['POOL_MAXSIZE'],
+                                    max_keepalive_connections=self.config['POOL_CONNECTIONS']),
+                timeout=httpx.Timeout(self.config['READ_TIMEOUT'], connect=self.config['CONNECT_TIMEOUT']),
+                headers={'User-Agent': self.config['USER_AGENT']},
+            )
+        return client
+
+    def _backoff(self, retry: int, response=None) -> float:
+        """
+            Seconds to wait before the given retry, Retry-After wins over the jittered exponential backoff
+        """
+        if response is not None:
+            retry_after = _retry_after(response)
+            if retry_after is not None:
+                return min(retry_after, self.config['BACKOFF_MAX'])
+        backoff = self.config['BACKOFF_FACTOR'] * (2 ** (retry - 1))
+        backoff += random.uniform(0, self.config['BACKOFF_JITTER'])
+        return min(backoff, self.config['BACKOFF_MAX'])
+
+    async def aget(self, url: str, params: Optional[dict] = None) -> 'httpx.Response':
+        """
+            Async counterpart of get
+        :raises:
+            CircuitOpenError if the circuit breaker is open
+            httpx.TransportError on connection errors and timeouts once the retries are exhausted
+        """
+        import httpx
+
+        self.breaker.before_call()
+        try:
+            client = self._get_async_client()
+            retry = 0
+            while True:
+                try:
+                    response = await client.get(url, params=params)
+                except httpx.TransportError:
+                    if retry >= self.config['MAX_RETRIES']:
+                        self._record(failed=True, retries=retry)
+                        raise
+                    response = None
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or retry >= self.config['MAX_RETRIES']:
+                        self._record(failed=response.status_code in RETRY_STATUS_CODES, retries=retry)
+                        observe_upstream(response.status_code, len(response.content))
+                        return response
+                retry += 1
+                await asyncio.sleep(self._backoff(retry, response))
+        except httpx.TransportError:
+            # Only raised once recorded as a failure
+            raise
+        except BaseException:
+            # Cancelled, or failed before any outcome was recorded
+            self.breaker.abandon_trial()
+            raise
+
+    async def aclose(self) -> None:
+        """
+            Closes the pooled async HTTP client of the running event loop, if any
+        """
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def stats(self) -> dict:
+        """
+            Returns the request, retry and circuit breaker counters along with the state of the connection pools
+        """
+        pools = {}
+        pool_manager = self.adapter.poolmanager
+        for key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(key)
+            if pool is not None:
+                pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = dict(
+                    connections_created=pool.num_connections, requests=pool.num_requests,
+                    idle_connections=pool.pool.qsize() if pool.pool is not None else 0)
+        return dict(requests=self.requests, retries=self.retries, failures=self.failures,
+                    circuit_state=self.breaker.state, circuit_opened=self.breaker.opened,
+                    circuit_rejected=self.breaker.rejected, pools=pools)
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client() -> WikiHttpClient:
+    """
+        Returns the process wide WIKI HTTP client built from `settings.WIKI_HTTP_CLIENT`
+    """
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = WikiHttpClient(getattr(settings, 'WIKI_HTTP_CLIENT', {}))
+    return _http_client
+
+
+def reset_http_client() -> None:
+    """
+        Drops the process wide WIKI HTTP client so that it is rebuilt from the current settings
+    """
+    global _http_client
+    with _http_client_lock:
+        _http_client = None
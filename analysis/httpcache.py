@@ -0,0 +1,118 @@
+import json
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from wikipedia_analysis.loggers import logging
+
+
+logger = logging.getLogger("wiki_analysis")
+
+DEFAULT_HTTP_CACHE_CONFIG = {
+    'ENABLED': True,
+    'MAX_AGE': 60,
+    'HISTORY_MAX_AGE': 0,
+    'RESPONSE_CACHE_ALIAS': None,
+    'RESPONSE_CACHE_TIMEOUT': 300,
+}
+
+
+def get_http_cache_config() -> dict:
+    """
+        Returns the HTTP caching configuration, `settings.WIKI_HTTP_CACHE` over the defaults
+    """
+    return {**DEFAULT_HTTP_CACHE_CONFIG, **getattr(settings, 'WIKI_HTTP_CACHE', {})}
+
+
+def _canonical(value):
+    # Sets are sorted so that the ETag does not depend on the hash seed of the process
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} can not be part of an ETag")
+
+
+def make_etag(*parts) -> str:
+    """
+        Returns a strong ETag identifying the given parts, the same in every process
+    :param parts: JSON serializable values, sets and datetimes
+    :return: Quoted ETag
+    """
+    data = json.dumps(parts, default=_canonical, separators=(',', ':')).encode()
+    return f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+
+
+def not_modified(request, etag: Optional[str], last_modified: Optional[datetime] = None) -> Optional[HttpResponse]:
+    """
+        Returns a 304 response if the request validators (If-None-Match, If-Modified-Since) match
+    :param request: HTTPRequest object
+    :param etag: Current ETag of the resource, None if unknown
+    :param last_modified: Current modification time of the resource
+    :return: HttpResponseNotModified or None
+    """
+    if etag is None and last_modified is None:
+        return None
+    return get_conditional_response(request, etag=etag,
+                                    last_modified=int(last_modified.timestamp()) if last_modified else None)
+
+
+def set_validators(response, etag: Optional[str], last_modified: Optional[datetime] = None,
+                   max_age: int = 0):
+    """
+        Adds the ETag, Last-Modified and Cache-Control headers to a successful or 304 response, a max_age of 0
+        makes caches revalidate every time
+    :return: The response
+    """
+    if response.status_code not in (200, 304):
+        return response
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    if max_age:
+        patch_cache_control(response, public=True, max_age=max_age)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def _response_cache(config: dict):
+    alias = config['RESPONSE_CACHE_ALIAS']
+    return caches[alias] if alias else None
+
+
+def cached_response(etag: str, config: dict) -> Optional[HttpResponse]:
+    """
+        Returns the rendered response stored for the ETag, if any
+    """
+    cache = _response_cache(config)
+    if cache is None:
+        return None
+    try:
+        content = cache.get(f"wiki_response:{etag[1:-1]}")
+    except Exception as ex:
+        logger.error(f"Exception raised while reading the response cache. etag:: {etag}  exception:: {ex}")
+        return None
+    if content is None:
+        return None
+    return HttpResponse(content, content_type='application/json')
+
+
+def store_response(etag: str, response, config: dict) -> None:
+    """
+        Keeps the rendered body of a successful response for the ETag, RESPONSE_CACHE_TIMEOUT seconds
+    """
+    cache = _response_cache(config)
+    if cache is None or response.status_code != 200:
+        return
+    try:
+        cache.set(f"wiki_response:{etag[1:-1]}", response.content, config['RESPONSE_CACHE_TIMEOUT'])
+    except Exception as ex:
+        logger.error(f"Exception raised while writing the response cache. etag:: {etag}  exception:: {ex}")
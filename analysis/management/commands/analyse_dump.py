@@ -0,0 +1,153 @@
+import os
+import time
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from analysis.models import SearchResult, ArticleTermFrequency, DumpCheckpoint
+from analysis.dumps import DUMP_FORMATS, detect_format, open_dump, iter_dump_pages, analyse_pages
+from analysis.executor import DEFAULT_ANALYSIS_EXECUTOR_CONFIG
+from analysis.filters import TokenFilter
+from analysis.rollups import save_search_results
+from analysis.utils import WikiAnalysisUtil
+from analysis.const import SCOPE_FULL, STOPWORDS_COMMON, NUMBERS_SKIP, NUMBER_RULES
+
+
+STORE_RESULTS = 'results'
+STORE_TERMS = 'terms'
+STORE_BOTH = 'both'
+
+
+class Command(BaseCommand):
+    help = ("Analyses every article of a local Wikipedia dump (MediaWiki XML or JSON lines, optionally bz2/gz "
+            "compressed) in parallel worker processes and bulk writes the results. The dump is streamed, and "
+            "the progress is checkpointed with every write so that an interrupted run resumes where it stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('dump', help="Path of the dump")
+        parser.add_argument('--format', choices=DUMP_FORMATS, help="Dump format, guessed from the name by default")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Worker processes, 1 analyses in this process")
+        parser.add_argument('--task-size', type=int, default=50, help="Pages sent to a worker at a time")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Pages written per transaction")
+        parser.add_argument('--store', choices=(STORE_RESULTS, STORE_TERMS, STORE_BOTH), default=STORE_RESULTS,
+                            help="Save the top words as search results, every term in the term frequency store "
+                                 "(scope full), or both")
+        parser.add_argument('-n', type=int, default=10, help="Number of top words per article")
+        parser.add_argument('--stopwords', default=STOPWORDS_COMMON)
+        parser.add_argument('--min-length', type=int, default=1)
+        parser.add_argument('--max-length', type=int)
+        parser.add_argument('--numbers', choices=NUMBER_RULES, default=NUMBERS_SKIP)
+        parser.add_argument('--limit', type=int, help="Analyse at most this many pages in this run")
+        parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of a previous run")
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['dump'])
+        if not os.path.isfile(path):
+            raise CommandError(f"No such dump {path}")
+        try:
+            dump_format = options['format'] or detect_format(path)
+            token_filter = TokenFilter.from_params(options['stopwords'], options['min_length'],
+                                                   options['max_length'], options['numbers'])
+        except ValueError as ex:
+            raise CommandError(f"{ex}")
+        for option in ('workers', 'task_size', 'batch_size'):
+            if options[option] <= 0:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive")
+        self.store = options['store']
+        store_terms = self.store in (STORE_TERMS, STORE_BOTH)
+
+        # The dump is identified by its path and size, a new dump at the same path starts over
+        key = hashlib.sha256(f"{path}:{os.path.getsize(path)}".encode()).hexdigest()
+        checkpoint, _ = DumpCheckpoint.objects.get_or_create(key=key, defaults={'dump': path})
+        if options['restart']:
+            checkpoint.pages_done = 0
+            checkpoint.save(update_fields=['pages_done', 'updated_at'])
+        self.checkpoint = checkpoint
+        skip = checkpoint.pages_done
+        if skip:
+            self.stdout.write(f"Resuming after {skip} pages")
+
+        self.started = time.monotonic()
+        self.analysed = 0
+        self.chars = 0
+        with open_dump(path) as stream:
+            pages = iter_dump_pages(stream, dump_format)
+            pages = islice(pages, skip, skip + options['limit'] if options['limit'] else None)
+            tasks = self._tasks(pages, options['task_size'])
+            args = (options['n'], token_filter, store_terms)
+            if options['workers'] == 1:
+                results = (analyse_pages(task, *args) for task in tasks)
+                self._write_results(results, options['batch_size'])
+            else:
+                context = multiprocessing.get_context(DEFAULT_ANALYSIS_EXECUTOR_CONFIG['START_METHOD'])
+                with ProcessPoolExecutor(max_workers=options['workers'], mp_context=context) as pool:
+                    results = self._ordered(pool, tasks, args, 2 * options['workers'])
+                    self._write_results(results, options['batch_size'])
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"Analysed {self.analysed} pages in {elapsed:.1f}s ({self.analysed / max(elapsed, 1e-9):.1f} pages/s, "
+            f"{self.chars / max(elapsed, 1e-9) / 1e6:.2f}M characters/s of text), {self.checkpoint.pages_done} pages done"))
+
+    def _tasks(self, pages, task_size: int):
+        while True:
+            task = list(islice(pages, task_size))
+            if not task:
+                return
+            self.chars += sum(len(page.text) for page in task)
+            yield task
+
+    @staticmethod
+    def _ordered(pool: ProcessPoolExecutor, tasks, args: tuple, max_in_flight: int):
+        """
+            Yields the results of the tasks in the order of the dump, with at most max_in_flight tasks submitted
+            ahead, so the dump is not read faster than it is analysed
+        """
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(pool.submit(analyse_pages, task, *args))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+    def _write_results(self, results, batch_size: int) -> None:
+        batch = []
+        for analyses in results:
+            batch.extend(analyses)
+            if len(batch) >= batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def _write(self, analyses: list) -> None:
+        """
+            Writes a batch of analyses and moves the checkpoint past them in one transaction
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            if self.store in (STORE_RESULTS, STORE_BOTH):
+                save_search_results([SearchResult(topic=WikiAnalysisUtil.clean_input_topic(analysis.title),
+                                                  word_frequency=analysis.top_words) for analysis in analyses])
+            if self.store in (STORE_TERMS, STORE_BOTH):
+                # Last analysis of a topic wins, like update_or_create would
+                terms = {WikiAnalysisUtil.clean_input_topic(analysis.title): analysis for analysis in analyses}
+                ArticleTermFrequency.objects.bulk_create(
+                    [ArticleTermFrequency(topic=topic, scope=SCOPE_FULL, revision_id=analysis.revision_id,
+                                          total_words=analysis.total_words, terms=analysis.terms, checked_at=now)
+                     for topic, analysis in terms.items()],
+                    update_conflicts=True, unique_fields=['topic', 'scope'],
+                    update_fields=['revision_id', 'total_words', 'terms', 'checked_at'])
+            self.checkpoint.pages_done = analyses[-1].index + 1
+            self.checkpoint.save(update_fields=['pages_done', 'updated_at'])
+        self.analysed += len(analyses)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"{self.checkpoint.pages_done} pages done, {self.analysed / max(elapsed, 1e-9):.1f} pages/s")
@@ -0,0 +1,65 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from analysis.models import SearchResult, DailyWordCount
+from analysis.rollups import rollup_counts, apply_rollups
+from analysis.const import WORD_TRENDS_DATE_FORMAT
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the daily word rollups of /word_trends/ from the search history, streaming the history "
+            "in batches. Results saved while it runs are rolled up by the save itself.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Search results read and rolled up per batch")
+        parser.add_argument('--since', help="First day to rebuild (YYYY-MM-DD), every day by default")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive")
+        search_results = SearchResult.objects.all()
+        rollups = DailyWordCount.objects.all()
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], WORD_TRENDS_DATE_FORMAT).date()
+            except ValueError:
+                raise CommandError("--since must be a YYYY-MM-DD day")
+            start = timezone.make_aware(datetime.combine(since, time.min))
+            search_results = search_results.filter(created_at__gte=start)
+            rollups = rollups.filter(day__gte=since)
+
+        # Rows after last_id are saved, and rolled up, after the old rollups are gone
+        with transaction.atomic():
+            deleted, _ = rollups.delete()
+            last_id = SearchResult.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        self.stdout.write(f"Deleted {deleted} rollup rows, rolling up search results up to id {last_id}")
+
+        rows = search_results.filter(id__lte=last_id).order_by('id').values_list('created_at', 'word_frequency')
+        batch = []
+        done = 0
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                done = self._apply(batch, done)
+                batch = []
+        done = self._apply(batch, done)
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {done} search results"))
+
+    def _apply(self, batch: list, done: int) -> int:
+        """
+            Rolls up a batch in its own transaction and reports the progress
+        :return: Number of search results rolled up so far
+        """
+        if not batch:
+            return done
+        with transaction.atomic():
+            apply_rollups(rollup_counts(batch))
+        done += len(batch)
+        self.stdout.write(f"  {done} search results rolled up")
+        return done
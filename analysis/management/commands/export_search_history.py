@@ -0,0 +1,55 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.export import parse_since, export_queryset, iter_ndjson, iter_blocks
+from analysis.utils import WikiAnalysisUtil
+from analysis.const import EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = ("Exports the search history as newline delimited JSON, oldest first, streaming it from a database "
+            "cursor in constant memory. Pass the id of the last exported line as --after-id to export only the "
+            "searches saved since.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Path of the export, standard output by default")
+        parser.add_argument('--gzip', action='store_true', help="Gzip compress the export")
+        parser.add_argument('--since', help="Only searches created at or after this ISO 8601 day or date and time")
+        parser.add_argument('--until', help="Only searches created before this ISO 8601 day or date and time")
+        parser.add_argument('--after-id', type=int, help="Only searches saved after this one")
+        parser.add_argument('--topic', help="Only searches of this topic")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help="Rows read from the database cursor at a time")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be positive")
+        try:
+            since = parse_since(options['since'])
+            until = parse_since(options['until'])
+        except ValueError as ex:
+            raise CommandError(f"{ex}")
+        topic = options['topic']
+        rows = export_queryset(since, until, options['after_id'],
+                               WikiAnalysisUtil.clean_input_topic(topic) if topic else None)
+
+        exported = 0
+
+        def lines():
+            nonlocal exported
+            for line in iter_ndjson(rows, options['chunk_size']):
+                exported += 1
+                yield line
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for block in iter_blocks(lines(), compress=options['gzip']):
+                output.write(block)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+        # The export may be on standard output, the summary goes to standard error
+        self.stderr.write(self.style.SUCCESS(f"Exported {exported} search results"))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analysis.warmer import CacheWarmer, get_warmer_config
+
+
+class Command(BaseCommand):
+    help = ("Prefetches the lead sections of the topics searched the most into the term store (and the shared tier "
+            "of the article cache, if any), every --interval seconds, reporting the warm hit ratio of each period. "
+            "Options default to WIKI_WARMER.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Warm once and exit")
+        parser.add_argument('--interval', type=float, help="Seconds between runs")
+        parser.add_argument('--top', type=int, help="Number of most searched topics kept warm")
+        parser.add_argument('--window', type=int, help="Seconds of search history the topics are ranked over")
+        parser.add_argument('--rate', type=float, help="WIKI queries per second")
+        parser.add_argument('--max-requests', type=int, help="WIKI queries per run")
+
+    def handle(self, *args, **options):
+        config = get_warmer_config()
+        for option, key in (('interval', 'INTERVAL'), ('top', 'TOP_K'), ('window', 'WINDOW'),
+                            ('rate', 'REQUESTS_PER_SECOND'), ('max_requests', 'MAX_REQUESTS')):
+            if options[option] is not None:
+                if options[option] <= 0:
+                    raise CommandError(f"--{option.replace('_', '-')} must be positive")
+                config[key] = options[option]
+        warmer = CacheWarmer(config)
+        try:
+            while True:
+                report = warmer.warm()
+                ratio = report['warm_hit_ratio']
+                self.stdout.write(f"Ranked {report['ranked']} topics: {report['already_warm']} already warm, "
+                                  f"{report['prefetched']} prefetched with {report['requests']} queries, "
+                                  f"{report['skipped']} left for lack of budget. Warm hits since the last run: "
+                                  f"{report['warm_hits']}/{report['searches']}"
+                                  f"{f' ({ratio:.1%})' if ratio is not None else ''}")
+                if options['once']:
+                    break
+                time.sleep(config['INTERVAL'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,401 @@
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+DEFAULT_METRICS_CONFIG = {
+    'ENABLED': False,
+    'SERVER_TIMING': True,
+    'DURATION_BUCKETS': (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'SIZE_BUCKETS': (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+}
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stages timed on the request path, reported as histograms and in the Server-Timing header
+STAGE_FETCH = 'fetch'
+STAGE_REVISION = 'revision'
+STAGE_FULL_ARTICLE = 'full_article'
+STAGE_EXTRACT = 'extract'
+STAGE_ANALYSE = 'analyse'
+STAGE_TERM_STORE = 'term_store'
+STAGE_SAVE = 'save'
+STAGE_DB = 'db'
+
+# (stage, seconds) pairs timed while handling the current request, None outside of MetricsMiddleware
+_request_timings = contextvars.ContextVar('wiki_request_timings', default=None)
+_NOOP = nullcontext()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Counter:
+    """
+        Monotonic counter, one value per combination of label values
+    """
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labels, values)} {value}"
+                    for values, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """
+        Histogram of observed values in fixed buckets, one per combination of label values
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [per bucket counts (the last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *label_values) -> int:
+        state = self._values.get(label_values)
+        return state[2] if state is not None else 0
+
+    def samples(self) -> list:
+        lines = []
+        with self._lock:
+            values = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        for label_values, (bucket_counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+        In process registry of the request, stage, upstream and database metrics, rendered in the Prometheus
+        text format. Every process keeps its own registry, scrape each worker or aggregate them upstream.
+    """
+
+    def __init__(self, config: Optional[dict] = None) -> None:
+        """
+            Constructor to initialize the metrics
+        :param config: Metrics configuration, see DEFAULT_METRICS_CONFIG
+        """
+        self.config = {**DEFAULT_METRICS_CONFIG, **(config or {})}
+        durations, sizes = self.config['DURATION_BUCKETS'], self.config['SIZE_BUCKETS']
+        self.request_duration = Histogram('wiki_request_duration_seconds', "Time spent handling requests",
+                                          ('view', 'method', 'status'), durations)
+        self.response_size = Histogram('wiki_response_size_bytes', "Size of the response bodies", ('view',), sizes)
+        self.stage_duration = Histogram('wiki_stage_duration_seconds', "Time spent in each stage of an analysis",
+                                        ('stage',), durations)
+        self.upstream_responses = Counter('wiki_upstream_responses_total', "Wikipedia responses by status code",
+                                          ('status',))
+        self.upstream_response_size = Histogram('wiki_upstream_response_size_bytes',
+                                                "Size of the Wikipedia response bodies read at once", (), sizes)
+        self.db_query_duration = Histogram('wiki_db_query_duration_seconds', "Time spent in database queries",
+                                           ('alias',), durations)
+        self.collectors = []
+
+    @property
+    def metrics(self) -> tuple:
+        return (self.request_duration, self.response_size, self.stage_duration, self.upstream_responses,
+                self.upstream_response_size, self.db_query_duration)
+
+    def add_collector(self, collector: Callable[[], list]) -> None:
+        """
+            Adds a callable returning (name, kind, documentation, [(labels dict, value)]) tuples read at every
+            scrape, for counters kept by other components
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """
+            Returns every metric in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collector in self.collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def component_stats() -> list:
+    """
+        Collector of the counters kept by the HTTP client, request coalescing, the article cache, the write
+        behind queue, the revision refresher and the cache warmer
+    """
+    from .http import get_http_client
+    from .cache import get_article_cache
+    from .singleflight import analysis_flight
+    from .writebehind import get_write_behind_queue
+    from .refresher import get_revision_refresher
+    from .warmer import get_cache_warmer
+
+    http = get_http_client().stats()
+    flight = analysis_flight.stats()
+    metrics = [
+        ('wiki_upstream_requests_total', 'counter', "Wikipedia requests", [({}, http['requests'])]),
+        ('wiki_upstream_retries_total', 'counter', "Retried Wikipedia requests", [({}, http['retries'])]),
+        ('wiki_upstream_failures_total', 'counter', "Failed Wikipedia requests", [({}, http['failures'])]),
+        ('wiki_circuit_open', 'gauge', "1 while the circuit breaker rejects calls",
+         [({}, int(http['circuit_state'] != 'closed'))]),
+        ('wiki_coalesced_requests_total', 'counter', "Analyses answered by another in flight request",
+         [({}, flight['coalesced'])]),
+    ]
+    cache = get_article_cache()
+    if cache is not None:
+        cache_stats = cache.stats()
+        metrics.append(('wiki_article_cache_requests_total', 'counter', "Article cache lookups by result",
+                        [({'result': result}, cache_stats[key])
+                         for result, key in (('hit', 'hits'), ('stale', 'stale_hits'), ('miss', 'misses'))]))
+        metrics.append(('wiki_article_cache_revalidations_total', 'counter',
+                        "Stale articles found current with a metadata only query", [({}, cache_stats['revalidations'])]))
+    write_behind = get_write_behind_queue()
+    if write_behind is not None:
+        metrics.append(('wiki_write_behind_depth', 'gauge', "Search results waiting to be written",
+                        [({}, write_behind.stats()['depth'])]))
+    refresher = get_revision_refresher()
+    if refresher is not None:
+        refresher_stats = refresher.stats()
+        metrics.append(('wiki_refresher_topics_total', 'counter', "Hot topics checked by the refresher by outcome",
+                        [({'outcome': outcome}, refresher_stats[outcome])
+                         for outcome in ('unchanged', 'refetched')]))
+    warmer = get_cache_warmer()
+    if warmer is not None:
+        warmer_stats = warmer.stats()
+        metrics.append(('wiki_warmer_prefetched_total', 'counter', "Topics prefetched by the cache warmer",
+                        [({}, warmer_stats['prefetched'])]))
+        metrics.append(('wiki_warmer_searches_total', 'counter',
+                        "Searches saved between warmer runs, by whether the run before left their topic warm",
+                        [({'warm': 'true'}, warmer_stats['warm_hits']),
+                         ({'warm': 'false'}, warmer_stats['searches'] - warmer_stats['warm_hits'])]))
+    return metrics
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics_config() -> dict:
+    """
+        Returns the metrics configuration, `settings.WIKI_METRICS` over the defaults
+    """
+    return {**DEFAULT_METRICS_CONFIG, **getattr(settings, 'WIKI_METRICS', {})}
+
+
+def get_metrics() -> Optional[MetricsRegistry]:
+    """
+        Returns the process wide metrics registry built from `settings.WIKI_METRICS`, None if it is disabled
+    """
+    global _metrics
+    # Called by every stage timer, so the disabled case is a single settings lookup
+    if not getattr(settings, 'WIKI_METRICS', {}).get('ENABLED', DEFAULT_METRICS_CONFIG['ENABLED']):
+        return None
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry(get_metrics_config())
+                _metrics.add_collector(component_stats)
+    return _metrics
+
+
+def reset_metrics() -> None:
+    """
+        Drops the process wide metrics registry so that it is rebuilt from the current settings
+    """
+    global _metrics
+    with _metrics_lock:
+        _metrics = None
+
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics: MetricsRegistry, stage: str) -> None:
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        record_stage(self.metrics, self.stage, time.perf_counter() - self.start)
+
+
+def record_stage(metrics: MetricsRegistry, stage: str, seconds: float) -> None:
+    metrics.stage_duration.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def timed(stage: str):
+    """
+        Returns a context manager timing the block as the given stage, a shared no-op when metrics are disabled
+    :param stage: Name of the stage, one of the STAGE_* constants
+    """
+    metrics = get_metrics()
+    if metrics is None:
+        return _NOOP
+    return _StageTimer(metrics, stage)
+
+
+def with_request_context(fn: Callable) -> Callable:
+    """
+        Wraps fn to run in a copy of the current context, so that stages timed in another thread (e.g. of a
+        ThreadPoolExecutor) are reported with the request that started it
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def observe_upstream(status_code: int, size: Optional[int] = None) -> None:
+    """
+        Records the status and, when the body was read at once, the size of a Wikipedia response
+    """
+    metrics = get_metrics()
+    if metrics is None:
+        return
+    metrics.upstream_responses.inc(str(status_code))
+    if size is not None:
+        metrics.upstream_response_size.observe(size)
+
+
+def _time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics = get_metrics()
+        if metrics is not None:
+            metrics.db_query_duration.observe(elapsed, context['connection'].alias)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.append((STAGE_DB, elapsed))
+
+
+def instrument_connection(sender, connection, **kwargs) -> None:
+    """
+        `connection_created` receiver timing every query of the new connection while metrics are enabled, no
+        wrapper is installed (and no cost added) when they are disabled
+    """
+    if get_metrics() is not None and _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def server_timing(timings: list, total: float) -> str:
+    """
+        Returns the Server-Timing header value of the request, the durations of a stage being summed
+    :param timings: List of (stage, seconds) tuples
+    :param total: Seconds spent handling the request
+    """
+    durations = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    durations['total'] = total
+    return ', '.join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in durations.items())
+
+
+class MetricsMiddleware:
+    """
+        Times every request and its stages, records the response size and adds a Server-Timing header.
+        Removed from the middleware chain when metrics are disabled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.metrics = get_metrics()
+        if self.metrics is None:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _request_timings.set([])
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            return self._finish(request, response, time.perf_counter() - start, _request_timings.get())
+        finally:
+            _request_timings.reset(token)
+
+    async def __acall__(self, request):
+        token = _request_timings.set([])
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+            return self._finish(request, response, time.perf_counter() - start, _request_timings.get())
+        finally:
+            _request_timings.reset(token)
+
+    def _finish(self, request, response, elapsed: float, timings: list):
+        match = request.resolver_match
+        view = match.url_name or match.view_name if match is not None else 'unmatched'
+        self.metrics.request_duration.observe(elapsed, view, request.method, str(response.status_code))
+        if not response.streaming:
+            self.metrics.response_size.observe(len(response.content), view)
+        if self.metrics.config['SERVER_TIMING']:
+            response['Server-Timing'] = server_timing(timings, elapsed)
+        return response
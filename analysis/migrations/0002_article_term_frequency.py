@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleTermFrequency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=255)),
+                ('scope', models.CharField(max_length=10)),
+                ('revision_id', models.BigIntegerField(null=True)),
+                ('total_words', models.PositiveIntegerField(default=0)),
+                ('terms', models.BinaryField()),
+                ('checked_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'article_term_frequencies',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='articletermfrequency',
+            constraint=models.UniqueConstraint(fields=('topic', 'scope'), name='unique_article_term_frequency'),
+        ),
+    ]
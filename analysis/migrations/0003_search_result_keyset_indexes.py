@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0002_article_term_frequency'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='searchresult',
+            index=models.Index(fields=['-created_at', '-id'], name='search_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchresult',
+            index=models.Index(fields=['topic', '-created_at', '-id'], name='search_topic_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0003_search_result_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyWordCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('word', models.CharField(max_length=255)),
+                ('frequency', models.PositiveBigIntegerField(default=0)),
+                ('searches', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'daily_word_counts',
+                'indexes': [models.Index(fields=['word', 'day'], name='daily_word_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailywordcount',
+            constraint=models.UniqueConstraint(fields=('day', 'word'), name='unique_daily_word_count'),
+        ),
+    ]
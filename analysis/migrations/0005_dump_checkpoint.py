@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0004_daily_word_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DumpCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('dump', models.CharField(max_length=1024)),
+                ('pages_done', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'dump_checkpoints',
+            },
+        ),
+    ]
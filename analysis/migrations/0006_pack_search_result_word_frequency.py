@@ -0,0 +1,71 @@
+# Generated by Django 5.0.2 on 2026-10-17 07:02
+
+from django.db import migrations, models
+
+import analysis.fields
+
+
+BATCH_SIZE = 2000
+
+
+def _copy(apps, source: str, target: str, convert) -> None:
+    """
+        Copies the word frequencies from a column into another, BATCH_SIZE search results at a time
+    """
+    SearchResult = apps.get_model('analysis', 'SearchResult')
+    rows = SearchResult.objects.order_by('id').values_list('id', source)
+    batch = []
+    for pk, value in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(SearchResult(id=pk, **{target: convert(value)}))
+        if len(batch) == BATCH_SIZE:
+            SearchResult.objects.bulk_update(batch, [target])
+            batch = []
+    if batch:
+        SearchResult.objects.bulk_update(batch, [target])
+
+
+def pack_word_frequencies(apps, schema_editor):
+    _copy(apps, 'word_frequency', 'packed_word_frequency', lambda value: value)
+
+
+def unpack_word_frequencies(apps, schema_editor):
+    _copy(apps, 'packed_word_frequency', 'word_frequency', lambda value: value.tolist())
+
+
+class Migration(migrations.Migration):
+    """
+        Moves SearchResult.word_frequency from JSON text to the packed WordFrequencyField through a new column, so
+        that it runs on any database and can be reversed
+    """
+
+    dependencies = [
+        ('analysis', '0005_dump_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchresult',
+            name='packed_word_frequency',
+            field=analysis.fields.WordFrequencyField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='searchresult',
+            name='word_frequency',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(pack_word_frequencies, unpack_word_frequencies),
+        migrations.RemoveField(
+            model_name='searchresult',
+            name='word_frequency',
+        ),
+        migrations.RenameField(
+            model_name='searchresult',
+            old_name='packed_word_frequency',
+            new_name='word_frequency',
+        ),
+        migrations.AlterField(
+            model_name='searchresult',
+            name='word_frequency',
+            field=analysis.fields.WordFrequencyField(),
+        ),
+    ]
@@ -1,13 +1,87 @@
 from django.db import models
 
+from .fields import WordFrequencyField
+
 
 class SearchResult(models.Model):
     topic = models.CharField(max_length=255, db_index=True)
-    word_frequency = models.JSONField()
+    # [word, count] pairs, packed (see analysis.fields) rather than JSON text
+    word_frequency = WordFrequencyField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'search_results'
+        indexes = [
+            # Keyset pagination of the history, newest first, optionally for a single topic
+            models.Index(fields=['-created_at', '-id'], name='search_created_idx'),
+            models.Index(fields=['topic', '-created_at', '-id'], name='search_topic_created_idx'),
+        ]
 
     def __str__(self):
         return self.topic
+
+
+class ArticleTermFrequency(models.Model):
+    """
+        Every word of an article revision with its count, packed by analysis.termstore.encode_terms.
+        Lets any `n` and skip flags be answered without fetching and tokenizing the article again.
+    """
+    topic = models.CharField(max_length=255)
+    scope = models.CharField(max_length=10)
+    revision_id = models.BigIntegerField(null=True)
+    total_words = models.PositiveIntegerField(default=0)
+    terms = models.BinaryField()
+    checked_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'article_term_frequencies'
+        constraints = [
+            models.UniqueConstraint(fields=['topic', 'scope'], name='unique_article_term_frequency'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} ({self.scope})"
+
+
+class DailyWordCount(models.Model):
+    """
+        Rollup of the saved search results: how often a word was counted and in how many searches, per day.
+        Kept up to date on every save by analysis.rollups, so corpus wide questions (top words of the week,
+        trend of a word) read a few rows instead of every word_frequency of the history.
+    """
+    day = models.DateField()
+    word = models.CharField(max_length=255)
+    frequency = models.PositiveBigIntegerField(default=0)
+    searches = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'daily_word_counts'
+        constraints = [
+            # Also the index of the per day top words
+            models.UniqueConstraint(fields=['day', 'word'], name='unique_daily_word_count'),
+        ]
+        indexes = [
+            # Trend of a word
+            models.Index(fields=['word', 'day'], name='daily_word_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.word} ({self.day})"
+
+
+class DumpCheckpoint(models.Model):
+    """
+        Number of pages of a dump analysed by `manage.py analyse_dump`, written in the same transaction as their
+        results so that a resumed run neither skips nor repeats a page
+    """
+    key = models.CharField(max_length=64, unique=True)
+    dump = models.CharField(max_length=1024)
+    pages_done = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'dump_checkpoints'
+
+    def __str__(self):
+        return f"{self.dump} ({self.pages_done})"
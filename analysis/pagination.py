@@ -0,0 +1,70 @@
+import base64
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Q, QuerySet
+
+
+def encode_cursor(created_at: datetime, pk: int) -> str:
+    """
+        Returns the opaque cursor pointing after the given row
+    :param created_at: created_at of the last row of a page
+    :param pk: id of the last row of a page
+    :return: Url safe cursor
+    """
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{pk}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+        Returns the (created_at, id) position encoded in the cursor
+    :param cursor: Cursor built by encode_cursor
+    :return: Tuple of created_at and id
+    :raises:
+        ValueError if the cursor is invalid
+    """
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_page(queryset: QuerySet, page_size: int, cursor: str = None) -> tuple:
+    """
+        Returns a page of rows newest first, seeking on (created_at, id) instead of counting and skipping the
+        rows before the page, so every page costs the same however deep it is
+    :param queryset: Queryset of dicts (`values()`) holding at least `created_at` and `id`
+    :param page_size: Number of rows per page
+    :param cursor: Cursor returned with the previous page, None for the first page
+    :return: Tuple of the rows of the page and the cursor of the next page, None on the last page
+    :raises:
+        ValueError if the cursor is invalid
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # The created_at__lte range lets the database seek on the (created_at, id) index, the OR alone does not
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(id__lt=pk), created_at__lte=created_at)
+    # One more row than needed tells if there is a next page without counting
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+
+
+def cached_count(queryset: QuerySet, cache_key: str, timeout: int) -> int:
+    """
+        Returns the number of rows of the queryset, cached for `timeout` seconds so that paging through a large
+        table does not run COUNT(*) for every page
+    :param queryset: Queryset to count
+    :param cache_key: Key of the count in the default cache
+    :param timeout: Seconds to keep the count
+    :return: Number of rows, possibly up to `timeout` seconds old
+    """
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, timeout)
+    return count
@@ -0,0 +1,250 @@
+import atexit
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import ArticleTermFrequency
+from .cache import get_article_cache
+from .utils import WikiAnalysisUtil, WikiBatchAnalysisUtil, is_current_article
+from .const import SCOPE_INTRO, SCOPE_FULL, WIKI_MAX_TITLES_PER_QUERY, WIKI_MAX_INFO_TITLES_PER_QUERY
+from wikipedia_analysis.loggers import logging
+
+
+logger = logging.getLogger("wiki_analysis")
+
+DEFAULT_REFRESHER_CONFIG = {
+    'ENABLED': False,
+    'INTERVAL': 60,
+    'TOP_TOPICS': 100,
+    'MAX_TRACKED': 10000,
+    'DECAY': 0.5,
+}
+
+
+def _chunks(items: list, size: int) -> list:
+    return [items[index:index + size] for index in range(0, len(items), size)]
+
+
+class HotTopics:
+    """
+        Thread safe request counts per topic, multiplied by `decay` at every refresh so that the hottest topics
+        are the ones requested most recently and often. At most `max_tracked` topics are tracked, the coldest
+        half is dropped when it is exceeded.
+    """
+
+    def __init__(self, max_tracked: int = 10000, decay: float = 0.5) -> None:
+        self.max_tracked = max_tracked
+        self.decay_factor = decay
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, topic: str) -> None:
+        with self._lock:
+            self._counts[topic] = self._counts.get(topic, 0) + 1
+            if len(self._counts) > self.max_tracked:
+                hottest = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+                self._counts = dict(hottest[:self.max_tracked // 2])
+
+    def top(self, n: int) -> list:
+        """
+            Returns the n hottest topics, hottest first
+        """
+        with self._lock:
+            return [topic for topic, _ in sorted(self._counts.items(), key=lambda item: item[1], reverse=True)[:n]]
+
+    def decay(self) -> None:
+        """
+            Ages the counts, topics not requested for a few refreshes are dropped
+        """
+        with self._lock:
+            self._counts = {topic: count * self.decay_factor for topic, count in self._counts.items()
+                            if count * self.decay_factor >= 0.1}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+class RevisionRefresher:
+    """
+        Background thread keeping the hottest topics warm. Every INTERVAL seconds the current revisions of the
+        TOP_TOPICS hottest topics are fetched with metadata only queries, up to WIKI_MAX_INFO_TITLES_PER_QUERY
+        titles each. Cached articles and stored terms of an unchanged page are marked current, only pages whose
+        revision changed are downloaded again (intro extracts batched like WikiBatchAnalysisUtil) and counted again.
+    """
+
+    def __init__(self, config: Optional[dict] = None) -> None:
+        """
+            Constructor to initialize the refresher, the thread starts on the first recorded topic
+        :param config: Refresher configuration, see DEFAULT_REFRESHER_CONFIG
+        """
+        self.config = {**DEFAULT_REFRESHER_CONFIG, **(config or {})}
+        self.hot_topics = HotTopics(self.config['MAX_TRACKED'], self.config['DECAY'])
+        self._worker = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.checked = 0
+        self.unchanged = 0
+        self.refetched = 0
+        self.failures = 0
+
+    def record(self, topic: str) -> None:
+        """
+            Counts a request for the topic
+        :param topic: Cleaned topic
+        """
+        self.hot_topics.record(topic)
+        self.start()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, daemon=True, name='revision-refresher')
+                self._worker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.wait(self.config['INTERVAL']):
+                try:
+                    self.refresh()
+                except Exception as ex:
+                    self.failures += 1
+                    logger.error(f"Exception raised while refreshing the hot topics. exception:: {ex}")
+        finally:
+            connection.close()
+
+    def refresh(self, topics: Optional[list] = None) -> dict:
+        """
+            Checks the revisions of the topics and refreshes the ones that changed
+        :param topics: Cleaned topics, the hottest ones by default
+        :return: dict of the number of checked, unchanged and refetched topics
+        """
+        if topics is None:
+            topics = self.hot_topics.top(self.config['TOP_TOPICS'])
+            self.hot_topics.decay()
+        cache = get_article_cache()
+        cached = {}
+        if cache is not None:
+            cached = {topic: article for topic in topics if (article := cache.peek(topic)) is not None}
+        stored = defaultdict(list)
+        for row in ArticleTermFrequency.objects.filter(topic__in=topics).values('pk', 'topic', 'scope',
+                                                                                'revision_id'):
+            stored[row['topic']].append(row)
+        # Only topics analysed before have something to keep warm
+        known = [topic for topic in topics if topic in cached or topic in stored]
+
+        infos = {}
+        for chunk in _chunks(known, WIKI_MAX_INFO_TITLES_PER_QUERY):
+            try:
+                infos.update(WikiAnalysisUtil.fetch_page_info(chunk))
+            except Exception as ex:
+                self.failures += 1
+                logger.error(f"Exception raised while checking the revisions. titles:: {chunk}  exception:: {ex}")
+
+        current_rows, to_fetch, full_changed = [], set(), []
+        for topic in known:
+            info = infos.get(topic)
+            if info is None:
+                continue
+            article = cached.get(topic)
+            if article is not None:
+                if is_current_article(article, info):
+                    cache.touch(topic)
+                else:
+                    to_fetch.add(topic)
+            for row in stored.get(topic, ()):
+                if row['revision_id'] == info.revision_id:
+                    current_rows.append(row['pk'])
+                elif row['scope'] == SCOPE_FULL:
+                    full_changed.append(topic)
+                else:
+                    to_fetch.add(topic)
+        if current_rows:
+            ArticleTermFrequency.objects.filter(pk__in=current_rows).update(checked_at=timezone.now())
+
+        refetched = self._refetch_intros(sorted(to_fetch), cache, stored)
+        refetched += self._recount_full_articles(full_changed)
+        checked = len(infos)
+        unchanged = checked - len(to_fetch.union(full_changed))
+        with self._lock:
+            self.runs += 1
+            self.checked += checked
+            self.unchanged += unchanged
+            self.refetched += refetched
+        return dict(checked=checked, unchanged=unchanged, refetched=refetched)
+
+    def _refetch_intros(self, topics: list, cache, stored: dict) -> int:
+        """
+            Downloads the lead sections of the topics in batched queries, caches them and counts their terms again
+        """
+        refetched = 0
+        for chunk in _chunks(topics, WIKI_MAX_TITLES_PER_QUERY):
+            try:
+                pages = WikiBatchAnalysisUtil.fetch_wikipedia_articles(chunk)
+            except Exception as ex:
+                self.failures += 1
+                logger.error(f"Exception raised while refetching the articles. titles:: {chunk}  exception:: {ex}")
+                continue
+            for topic in chunk:
+                util_obj = WikiAnalysisUtil(topic)
+                try:
+                    article = util_obj._extract_article({topic: pages[topic]} if topic in pages else {})
+                except ValueError:
+                    continue
+                if cache is not None:
+                    cache.set(topic, article)
+                if any(row['scope'] == SCOPE_INTRO for row in stored.get(topic, ())):
+                    util_obj._store_terms(util_obj._count_text_terms(article.text), article.revision_id)
+                refetched += 1
+        return refetched
+
+    def _recount_full_articles(self, topics: list) -> int:
+        refetched = 0
+        for topic in topics:
+            util_obj = WikiAnalysisUtil(topic, scope=SCOPE_FULL)
+            try:
+                util_obj._store_terms(*util_obj._count_article_terms())
+            except Exception as ex:
+                self.failures += 1
+                logger.error(f"Exception raised while recounting the article. topic:: {topic}  exception:: {ex}")
+                continue
+            refetched += 1
+        return refetched
+
+    def stats(self) -> dict:
+        """
+            Returns the number of tracked topics and the refresh counters
+        """
+        return dict(tracked=len(self.hot_topics), runs=self.runs, checked=self.checked, unchanged=self.unchanged,
+                    refetched=self.refetched, failures=self.failures)
+
+
+_revision_refresher = None
+_revision_refresher_lock = threading.Lock()
+
+
+def get_revision_refresher() -> Optional[RevisionRefresher]:
+    """
+        Returns the process wide refresher built from `settings.WIKI_REFRESHER`, None if it is disabled
+    """
+    global _revision_refresher
+    config = {**DEFAULT_REFRESHER_CONFIG, **getattr(settings, 'WIKI_REFRESHER', {})}
+    if not config['ENABLED']:
+        return None
+    if _revision_refresher is None:
+        with _revision_refresher_lock:
+            if _revision_refresher is None:
+                _revision_refresher = RevisionRefresher(config)
+                atexit.register(_revision_refresher.stop)
+    return _revision_refresher
@@ -0,0 +1,118 @@
+from datetime import date
+from typing import Iterable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import SearchResult, DailyWordCount
+
+
+DEFAULT_ROLLUP_CONFIG = {
+    'ENABLED': True,
+}
+
+# Rows upserted per executemany
+_UPSERT_BATCH_SIZE = 500
+_WORD_MAX_LENGTH = DailyWordCount._meta.get_field('word').max_length
+
+
+def get_rollup_config() -> dict:
+    """
+        Returns the rollup configuration, `settings.WIKI_ROLLUPS` over the defaults
+    """
+    return {**DEFAULT_ROLLUP_CONFIG, **getattr(settings, 'WIKI_ROLLUPS', {})}
+
+
+def _day(created_at) -> date:
+    return timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+
+
+def _word_counts(word_frequency) -> Iterable:
+    """
+        Yields the (word, count) pairs of a saved word_frequency, stored as [word, count] pairs, or as
+        {"word": ..., "frequency": ...} / {word: count} dicts by older rows
+    """
+    for item in word_frequency or ():
+        if isinstance(item, (list, tuple)) and len(item) == 2:
+            yield item
+        elif isinstance(item, dict) and 'word' in item:
+            yield item['word'], item.get('frequency', 0)
+        elif isinstance(item, dict):
+            yield from item.items()
+
+
+def rollup_counts(rows: Iterable) -> dict:
+    """
+        Aggregates search results into per day and word counts
+    :param rows: Iterable of (created_at, word_frequency) pairs
+    :return: Dict of [frequency, searches] keyed by (day, word)
+    """
+    rollups = {}
+    for created_at, word_frequency in rows:
+        day = _day(created_at)
+        for word, count in _word_counts(word_frequency):
+            if not isinstance(word, str) or len(word) > _WORD_MAX_LENGTH:
+                continue
+            totals = rollups.get((day, word))
+            if totals is None:
+                rollups[(day, word)] = [int(count), 1]
+            else:
+                totals[0] += int(count)
+                totals[1] += 1
+    return rollups
+
+
+def apply_rollups(rollups: dict) -> None:
+    """
+        Adds the counts to the rollup table, inserting the missing (day, word) rows and incrementing the others
+        in a single upsert per batch. `bulk_create(update_conflicts=True)` would overwrite the counts instead
+        of adding to them. The ON CONFLICT syntax is the one of SQLite and PostgreSQL.
+    :param rollups: Dict built by rollup_counts
+    """
+    if not rollups:
+        return
+    quote = connection.ops.quote_name
+    table = quote(DailyWordCount._meta.db_table)
+    day, word, frequency, searches = (quote(column) for column in ('day', 'word', 'frequency', 'searches'))
+    sql = (f"INSERT INTO {table} ({day}, {word}, {frequency}, {searches}) VALUES (%s, %s, %s, %s) "
+           f"ON CONFLICT ({day}, {word}) DO UPDATE SET {frequency} = {table}.{frequency} + excluded.{frequency}, "
+           f"{searches} = {table}.{searches} + excluded.{searches}")
+    params = [(connection.ops.adapt_datefield_value(row_day), row_word, totals[0], totals[1])
+              for (row_day, row_word), totals in rollups.items()]
+    with connection.cursor() as cursor:
+        for start in range(0, len(params), _UPSERT_BATCH_SIZE):
+            cursor.executemany(sql, params[start:start + _UPSERT_BATCH_SIZE])
+
+
+def save_search_results(search_results: list) -> list:
+    """
+        Inserts the search results and adds them to the rollups in one transaction, the writer of every
+        SearchResult save path
+    :param search_results: Unsaved SearchResult instances
+    :return: The saved instances
+    """
+    with transaction.atomic():
+        search_results = SearchResult.objects.bulk_create(search_results)
+        if get_rollup_config()['ENABLED']:
+            apply_rollups(rollup_counts((result.created_at, result.word_frequency) for result in search_results))
+    return search_results
+
+
+def top_words(since: date, until: date, n: int) -> list:
+    """
+        Returns the n words counted the most between two days, both included
+    :return: List of (word, frequency) tuples
+    """
+    return list(DailyWordCount.objects.filter(day__range=(since, until)).values('word')
+                .annotate(total=Sum('frequency')).order_by('-total', 'word').values_list('word', 'total')[:n])
+
+
+def word_trend(word: str, since: date, until: date) -> list:
+    """
+        Returns the daily counts of a word between two days, both included, days without the word are left out
+    :return: List of dicts with the day, frequency and searches
+    """
+    return list(DailyWordCount.objects.filter(word=word, day__range=(since, until)).order_by('day')
+                .values('day', 'frequency', 'searches'))
@@ -0,0 +1,33 @@
+from django.conf import settings
+
+from .models import SearchResult
+
+
+class HistoryReadRouter:
+    """
+        Routes the search history reads to the read only `settings.WIKI_HISTORY_READ_DATABASE` alias, so that
+        `/search_history/` never competes with the writers for the write connection. Writes and migrations
+        stay on `default`.
+    """
+
+    @staticmethod
+    def _read_alias():
+        alias = getattr(settings, 'WIKI_HISTORY_READ_DATABASE', None)
+        return alias if alias in settings.DATABASES else None
+
+    def db_for_read(self, model, **hints):
+        if model is SearchResult:
+            return self._read_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The read alias is the same database file as default
+        if db == self._read_alias():
+            return False
+        return None
@@ -0,0 +1,113 @@
+import asyncio
+import weakref
+import threading
+from typing import Awaitable, Callable, Hashable
+
+
+class _Call:
+    """
+        An in-flight call that concurrent callers of the same key wait on
+    """
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+        Coalesces concurrent calls for the same key into a single execution whose result (or exception)
+        is shared with every caller that arrived while it was running.
+
+        `do` is for threaded callers (WSGI workers, sync views), `do_async` for coroutines running on an
+        event loop (ASGI). The two paths keep separate in-flight tables since a thread can not await a future
+        of an event loop it does not run and vice versa, and async calls are only coalesced within the loop
+        they run on.
+    """
+
+    def __init__(self) -> None:
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+        # Event loop -> {key: future}, loops may run in other threads (async_to_sync, ASGI servers)
+        self._async_calls = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable):
+        """
+            Runs `fn` unless a call for the same key is already in flight, in which case its result is awaited
+        :param key: Key identifying identical calls
+        :param fn: Callable without arguments
+        :return: Result of `fn`
+        :raises: Whatever `fn` raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+            Async counterpart of `do`, awaits `fn()` unless a call for the same key is already in flight
+        :param key: Key identifying identical calls
+        :param fn: Callable without arguments returning an awaitable
+        :return: Result of the awaitable
+        :raises: Whatever the awaitable raised
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._async_calls.get(loop)
+            if calls is None:
+                calls = self._async_calls[loop] = {}
+            task = calls.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                # A task of its own, so that the call outlives a cancelled leader (an ASGI client disconnecting)
+                task = calls[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._release(calls, key, done))
+                self.executed += 1
+        # Shield so that a cancelled caller does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _release(self, calls: dict, key: Hashable, task: asyncio.Future) -> None:
+        with self._lock:
+            del calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved, every caller may have been cancelled
+            task.exception()
+
+    def stats(self) -> dict:
+        """
+            Returns the number of executed and coalesced calls
+        """
+        with self._lock:
+            in_flight = len(self._calls) + sum(len(calls) for calls in self._async_calls.values())
+        return dict(executed=self.executed, coalesced=self.coalesced, in_flight=in_flight)
+
+
+analysis_flight = SingleFlight()
@@ -0,0 +1,159 @@
+import re
+import json
+import codecs
+from typing import Callable, Iterable
+
+
+# Next character of a JSON string that needs attention, everything else is plain text
+STRING_SPECIAL_RE = re.compile(r'["\\]')
+SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class ExtractStreamParser:
+    """
+        Incremental parser of a WIKI `prop=extracts` JSON response.
+
+        The value of every `extract` key is decoded chunk by chunk and handed to `on_extract(index, text)`,
+        `index` being the position of the extract in the document, instead of being kept in memory. The rest of
+        the document (the skeleton, small) is kept with the extracts replaced by empty strings and parsed by
+        `close`, so the pages, `normalized` and `continue` parts of the response are still available.
+    """
+
+    def __init__(self, on_extract: Callable[[int, str], None]) -> None:
+        """
+            Constructor to initialize the parser
+        :param on_extract: Callable receiving the index of the extract and a decoded chunk of its text
+        """
+        self.on_extract = on_extract
+        self.extracts = 0
+        self._skeleton = []
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._pending = ''
+        # Skeleton state
+        self._in_string = False
+        self._escape = False
+        self._token = []
+        self._last_string = None
+        self._await_extract = False
+        # Extract state
+        self._in_extract = False
+        self._high_surrogate = None
+
+    def feed_bytes(self, data: bytes) -> None:
+        self.feed(self._decoder.decode(data))
+
+    def feed(self, text: str) -> None:
+        """
+            Parses the next chunk of the document
+        :param text: Decoded chunk of the JSON document
+        """
+        text = self._pending + text
+        self._pending = ''
+        position = 0
+        length = len(text)
+        while position < length:
+            if self._in_extract:
+                position = self._feed_extract(text, position)
+            else:
+                position = self._feed_skeleton(text, position)
+
+    def _feed_skeleton(self, text: str, position: int) -> int:
+        skeleton = self._skeleton
+        for index in range(position, len(text)):
+            char = text[index]
+            skeleton.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = ''.join(self._token)
+                    self._token = []
+                    continue
+                self._token.append(char)
+            elif char == '"':
+                if self._await_extract:
+                    self._await_extract = False
+                    self._in_extract = True
+                    return index + 1
+                self._in_string = True
+            elif char == ':':
+                self._await_extract = self._last_string == 'extract'
+            elif not char.isspace():
+                self._last_string = None
+                self._await_extract = False
+        return len(text)
+
+    def _emit(self, text: str) -> None:
+        if text:
+            self.on_extract(self.extracts, text)
+
+    def _feed_extract(self, text: str, position: int) -> int:
+        length = len(text)
+        while position < length:
+            special = STRING_SPECIAL_RE.search(text, position)
+            if special is None:
+                self._emit(text[position:])
+                return length
+            self._emit(text[position:special.start()])
+            position = special.start()
+            if text[position] == '"':
+                # End of the extract, it is kept as an empty string in the skeleton
+                self._skeleton.append('"')
+                self._in_extract = False
+                self.extracts += 1
+                return position + 1
+            # Escape sequence, wait for the rest of it if the chunk ends inside it
+            if position + 1 >= length:
+                self._pending = text[position:]
+                return length
+            escape = text[position + 1]
+            if escape != 'u':
+                self._emit(self._decode_char(SIMPLE_ESCAPES.get(escape, escape)))
+                position += 2
+                continue
+            if position + 6 > length:
+                self._pending = text[position:]
+                return length
+            self._emit(self._decode_char(chr(int(text[position + 2:position + 6], 16))))
+            position += 6
+        return length
+
+    def _decode_char(self, char: str) -> str:
+        """
+            Joins the halves of a surrogate pair escaped as two `\\u` sequences
+        """
+        high, self._high_surrogate = self._high_surrogate, None
+        if '\ud800' <= char <= '\udbff':
+            self._high_surrogate = char
+            return '\ufffd' if high else ''
+        if '\udc00' <= char <= '\udfff' and high:
+            return chr(0x10000 + ((ord(high) - 0xd800) << 10) + (ord(char) - 0xdc00))
+        return '\ufffd' + char if high else char
+
+    def close(self) -> dict:
+        """
+            Parses the skeleton of the document
+        :return: Decoded document with every extract replaced by an empty string
+        :raises:
+            ValueError if the document is not valid JSON
+        """
+        self.feed(self._decoder.decode(b'', final=True))
+        if self._in_extract or self._pending:
+            raise ValueError("Truncated WIKI response")
+        return json.loads(''.join(self._skeleton))
+
+
+def parse_extracts(chunks: Iterable[bytes], on_extract: Callable[[int, str], None]) -> dict:
+    """
+        Streams a WIKI `prop=extracts` response through an ExtractStreamParser
+    :param chunks: Iterable of raw response chunks
+    :param on_extract: Callable receiving the index of the extract and a decoded chunk of its text
+    :return: Decoded document with every extract replaced by an empty string
+    """
+    parser = ExtractStreamParser(on_extract)
+    for chunk in chunks:
+        parser.feed_bytes(chunk)
+    return parser.close()
@@ -0,0 +1,94 @@
+import sys
+import zlib
+import heapq
+import struct
+from array import array
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+
+from .filters import TokenFilter, NO_FILTER
+
+
+DEFAULT_TERM_STORE_CONFIG = {
+    'ENABLED': True,
+    'REVALIDATE_AFTER': 300,
+}
+
+# Number of terms, followed by the counts as little endian uint32 and the words joined by new lines
+_HEADER = struct.Struct('<I')
+
+
+def get_term_store_config() -> dict:
+    """
+        Returns the term frequency store configuration, `settings.WIKI_TERM_STORE` over the defaults
+    """
+    return {**DEFAULT_TERM_STORE_CONFIG, **getattr(settings, 'WIKI_TERM_STORE', {})}
+
+
+def sorted_terms(counts: Counter) -> list:
+    """
+        Returns the words with their counts, most frequent first. The sort is stable, so words with the same
+        count keep the order they first appeared in, like Counter.most_common
+    :param counts: Counter of the words
+    :return: List of (word, count) tuples
+    """
+    return sorted(counts.items(), key=itemgetter(1), reverse=True)
+
+
+def encode_terms(terms: list) -> bytes:
+    """
+        Packs the terms into a compressed binary blob
+    :param terms: List of (word, count) tuples as returned by sorted_terms, words never contain new lines
+    :return: Compressed blob
+    """
+    counts = array('I', [count for _, count in terms])
+    if sys.byteorder != 'little':
+        counts.byteswap()
+    words = '\n'.join(word for word, _ in terms).encode()
+    return zlib.compress(_HEADER.pack(len(terms)) + counts.tobytes() + words)
+
+
+def decode_terms(blob: bytes) -> list:
+    """
+        Unpacks a blob built by encode_terms
+    :param blob: Compressed blob
+    :return: List of (word, count) tuples, most frequent first
+    """
+    data = zlib.decompress(blob)
+    size, = _HEADER.unpack_from(data)
+    if not size:
+        return []
+    counts_end = _HEADER.size + 4 * size
+    counts = array('I')
+    counts.frombytes(data[_HEADER.size:counts_end])
+    if sys.byteorder != 'little':
+        counts.byteswap()
+    words = data[counts_end:].decode().split('\n')
+    return list(zip(words, counts))
+
+
+def select_top_terms(terms, n: int, token_filter: TokenFilter = NO_FILTER) -> list:
+    """
+        Returns the n most frequent terms passing the filter. Sorted terms are scanned until n terms are found,
+        the terms of a Counter are selected with a heap bounded by n instead of being sorted
+    :param terms: List of (word, count) tuples, most frequent first, or Counter of the words
+    :param n: Number of terms to return
+    :param token_filter: Filter of the words to leave out
+    :return: List of (word, count) tuples, ties in the order the words first appeared
+    """
+    top_terms = []
+    if n <= 0:
+        return top_terms
+    rejects = token_filter.rejects
+    if isinstance(terms, Counter):
+        return heapq.nlargest(n, ((word, count) for word, count in terms.items() if not rejects(word)),
+                              key=itemgetter(1))
+    for word, count in terms:
+        if rejects(word):
+            continue
+        top_terms.append((word, count))
+        if len(top_terms) == n:
+            break
+    return top_terms
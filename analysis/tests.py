@@ -1,16 +1,50 @@
-from unittest.mock import patch, MagicMock
+import os
+import bz2
+import gzip
+import json
+import pickle
+import asyncio
+import tempfile
+import threading
+import time
+from io import StringIO
+from collections import Counter
+from datetime import date, datetime, timezone as dt_timezone
+from unittest.mock import patch, MagicMock, AsyncMock
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.http import JsonResponse
 
-from analysis.utils import WikiAnalysisUtil
-from analysis.models import SearchResult
+from analysis.utils import WikiAnalysisUtil, Article
+from analysis.models import SearchResult, ArticleTermFrequency, DailyWordCount, DumpCheckpoint
+from analysis.cache import ArticleCache, DjangoCacheTier, get_article_cache, reset_article_cache
+from analysis.refresher import RevisionRefresher
+from analysis.warmer import CacheWarmer, RateBudget
+from analysis.singleflight import SingleFlight
+from analysis.http import WikiHttpClient, CircuitBreaker, CircuitOpenError
+from analysis.tokenizer import WordCounter
+from analysis.filters import TokenFilter, load_stopwords, get_token_filter
+from analysis.executor import AnalysisExecutor, PooledWordCounter
+from analysis.const import COMMON_WORDS
+from analysis.termstore import encode_terms, decode_terms, select_top_terms
+from analysis.fields import WordFrequency, encode_word_frequency, decode_word_frequency, _UNDECODED
+from analysis.writebehind import WriteBehindQueue
+from analysis.db import configure_sqlite_connection
+from analysis.routers import HistoryReadRouter
+from analysis.rollups import save_search_results
+from analysis.dumps import detect_format
+from analysis.httpcache import make_etag
+from analysis.metrics import Histogram, get_metrics, reset_metrics, instrument_connection, server_timing
 
 
 class TestWikiAnalysisUtil(TestCase):
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_fetch_wikipedia_article_success(self, mock_get):
         # Mock a successful response
         mock_response = MagicMock()
@@ -46,6 +80,29 @@ class TestWikiAnalysisUtil(TestCase):
         word_freq = util.word_frequency_analysis(text)
         self.assertEqual(word_freq, [('this', 2), ('is', 2), ('a', 2), ('test', 2), ('only', 1)])
 
+    def test_word_frequency_analysis_with_common_words_and_numbers(self):
+        util = WikiAnalysisUtil('test topic', skip_common_words=True, skip_numbers=True)
+        text = "This is a test. This is only a test. 123"
+        word_freq = util.word_frequency_analysis(text)
+        self.assertEqual(word_freq, [('test', 2), ('only', 1)])
+
+    @patch('requests.Session.get')
+    def test_full_scope_streams_article_and_follows_continuation(self, mock_get):
+        first, second = MagicMock(), MagicMock()
+        first.iter_content.return_value = [b'{"continue": {"excontinue": 1, "continue": "||"}, "query": {"pages": ',
+                                           b'{"1": {"title": "Test", "extract": "Shard\\u00e9 data sh', b'ard"}}}}']
+        second.iter_content.return_value = [b'{"query": {"pages": {"1": {"title": "Test", "extract": "data"}}}}']
+        mock_get.side_effect = [first, second]
+        util = WikiAnalysisUtil('test topic', scope='full')
+        self.assertEqual(util.run_analysis()['word_frequency'], [('data', 2), ('shardé', 1), ('shard', 1)])
+        self.assertEqual(mock_get.call_args.kwargs['params'], {'titles': 'test topic', 'excontinue': 1,
+                                                              'continue': '||'})
+        self.assertTrue(mock_get.call_args.kwargs['stream'])
+
+    def test_invalid_scope(self):
+        with self.assertRaises(ValueError):
+            WikiAnalysisUtil('test topic', scope='everything')
+
     def test_clean_input_topic_empty_input(self):
         with self.assertRaises(ValueError):
             WikiAnalysisUtil('')
@@ -65,6 +122,806 @@ class TestWikiAnalysisUtil(TestCase):
         clean_text = util.remove_html_tags(html_text)
         self.assertEqual(clean_text, "This is a paragraph with bold text.")
 
+    def test_remove_html_tags_drops_non_prose_and_decodes_entities(self):
+        html_text = ('<style type="text/css">.mw-parser-output p{margin:0}</style><p>Tom &amp; Jerry&#160;<!-- note -->'
+                     '<SCRIPT>var sharding = 1;</SCRIPT><a\nhref="/wiki/Cat">cats</a> &lt;3</p>')
+        self.assertEqual(WikiAnalysisUtil.remove_html_tags(html_text), "Tom & Jerry\xa0cats <3")
+
+    @override_settings(WIKI_EXTRACTS={'EXPLAINTEXT': True})
+    @patch('requests.Session.get')
+    def test_explaintext_extracts_are_not_stripped(self, mock_get):
+        mock_get.return_value = _mock_wiki_response('Sharding: a < b and c > d')
+        util = WikiAnalysisUtil('Database sharding')
+        self.assertIn('&explaintext=1', util.article_url)
+        self.assertEqual(util._fetch_article().text, 'Sharding: a < b and c > d')
+
+
+class TestWordCounter(TestCase):
+
+    @patch('analysis.tokenizer.TOKENIZER_CHUNK_SIZE', 4)
+    def test_words_split_across_chunks(self):
+        counter = WordCounter().feed_chunks(['Shard', 'ing shardi', 'ng, DATA data'])
+        self.assertEqual(counter.most_common(2), [('sharding', 2), ('data', 2)])
+        self.assertEqual(counter.tokens, 4)
+
+    def test_filters_distinct_words(self):
+        counter = WordCounter(TokenFilter(frozenset(['the']), numbers='skip')).feed('the 42 the answer 42')
+        self.assertEqual(counter.most_common(10), [('answer', 1)])
+
+
+class TestTokenFilter(TestCase):
+
+    def test_length_and_numeric_rules(self):
+        words = ['a', 'an', 'the', 'sharding', '2024', '1990s', 'x2']
+        token_filter = TokenFilter(min_length=2, max_length=4, numbers='skip_any')
+        self.assertEqual([word for word in words if not token_filter.rejects(word)], ['an', 'the'])
+        token_filter = TokenFilter(numbers='skip')
+        self.assertEqual([word for word in words if not token_filter.rejects(word)],
+                         ['a', 'an', 'the', 'sharding', '1990s', 'x2'])
+
+    def test_stopword_lists_are_loaded_and_merged(self):
+        stopwords = load_stopwords('en,fr')
+        self.assertTrue({'the', 'because', 'nous', 'avec'} <= stopwords)
+        self.assertEqual(load_stopwords('common,none'), COMMON_WORDS)
+        for names in ('xx', '../settings', ['en']):
+            with self.assertRaises(ValueError):
+                load_stopwords(names)
+
+    def test_from_params_validates(self):
+        token_filter = TokenFilter.from_params(stopwords='en', min_length='3', max_length='', numbers='keep')
+        self.assertEqual((token_filter.min_length, token_filter.max_length), (3, None))
+        for params in ({'min_length': 'x'}, {'min_length': 0}, {'min_length': 5, 'max_length': 4},
+                       {'numbers': 'drop'}):
+            with self.assertRaises(ValueError):
+                TokenFilter.from_params(**params)
+
+    def test_filters_are_shared_per_parameters(self):
+        token_filter = get_token_filter('en', '3')
+        self.assertIs(get_token_filter('en', '3'), token_filter)
+        self.assertIsNot(get_token_filter('en', '4'), token_filter)
+        with self.assertRaises(ValueError):
+            get_token_filter(['en'])
+
+
+class TestAnalysisExecutor(TestCase):
+
+    def setUp(self):
+        self.executor = AnalysisExecutor({'MAX_WORKERS': 2, 'MIN_TEXT_SIZE': 20, 'BLOCK_SIZE': 32})
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_blocks_counted_in_the_pool_match_word_counter(self):
+        token_filter = TokenFilter.from_params(stopwords='en', numbers='skip')
+        chunks = ['The shard', 'ing of the database 42 splits data, ', 'sharding scales the data node. '] * 20
+        counter = PooledWordCounter(self.executor, token_filter).feed_chunks(chunks)
+        expected = WordCounter(token_filter).feed_chunks(chunks)
+        self.assertEqual(counter.most_common(5), expected.most_common(5))
+        self.assertEqual(counter.tokens, expected.tokens)
+        self.assertGreater(self.executor.stats()['submitted'], 1)
+
+    def test_small_texts_are_counted_inline(self):
+        counter = PooledWordCounter(self.executor).feed('shard shard node')
+        self.assertEqual(counter.most_common(1), [('shard', 2)])
+        self.assertEqual(self.executor.stats(), {'max_workers': 2, 'submitted': 0, 'inline': 1, 'started': False})
+
+    def test_token_filter_pickles_by_stopword_list_name(self):
+        token_filter = TokenFilter.from_params(stopwords='en,fr', min_length=2, numbers='skip_any')
+        restored = pickle.loads(pickle.dumps(token_filter))
+        self.assertEqual(restored.key, token_filter.key)
+        self.assertLess(len(pickle.dumps(token_filter)), 200)
+        self.assertTrue(pickle.loads(pickle.dumps(TokenFilter(frozenset(['the'])))).rejects('the'))
+
+
+@override_settings(WIKI_ARTICLE_CACHE={'ENABLED': False}, WIKI_TERM_STORE={'REVALIDATE_AFTER': 0})
+class TestTermFrequencyStore(TestCase):
+
+    def test_encode_decode_round_trip(self):
+        terms = [('sharding', 3), ('données', 2), ('42', 1)]
+        self.assertEqual(decode_terms(encode_terms(terms)), terms)
+        self.assertEqual(decode_terms(encode_terms([])), [])
+
+    def test_select_top_terms_applies_filters(self):
+        terms = [('the', 5), ('2024', 4), ('sharding', 3), ('data', 2), ('node', 1)]
+        self.assertEqual(select_top_terms(terms, 2, TokenFilter(frozenset(['the']), numbers='skip')),
+                         [('sharding', 3), ('data', 2)])
+        counts = Counter({'node': 1, 'data': 2, 'the': 5, 'shard': 2, '2024': 4, 'sharding': 3})
+        self.assertEqual(select_top_terms(counts, 3, TokenFilter(frozenset(['the']), numbers='skip')),
+                         [('sharding', 3), ('data', 2), ('shard', 2)])
+
+    @patch('requests.Session.get')
+    def test_other_n_and_flags_do_not_refetch_the_article(self, mock_get):
+        article = _mock_wiki_response('The shard and the shard and the node', revision_id=7)
+        revision = MagicMock()
+        revision.json.return_value = {'query': {'pages': {'1': {'title': 'test topic', 'lastrevid': 7}}}}
+        mock_get.side_effect = [article, revision]
+        self.assertEqual(WikiAnalysisUtil('test topic', top_word_count=1).run_analysis()['word_frequency'],
+                         [('the', 3)])
+        util = WikiAnalysisUtil('test topic', top_word_count=2, skip_common_words=True)
+        self.assertEqual(util.run_analysis()['word_frequency'], [('shard', 2), ('and', 2)])
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(ArticleTermFrequency.objects.get(topic='test topic').revision_id, 7)
+
+    @patch('requests.Session.get')
+    def test_new_revision_is_fetched_again(self, mock_get):
+        revision = MagicMock()
+        revision.json.return_value = {'query': {'pages': {'1': {'title': 'test topic', 'lastrevid': 8}}}}
+        mock_get.side_effect = [_mock_wiki_response('old old', revision_id=7), revision,
+                                _mock_wiki_response('new', revision_id=8)]
+        WikiAnalysisUtil('test topic').run_analysis()
+        self.assertEqual(WikiAnalysisUtil('test topic').run_analysis()['word_frequency'], [('new', 1)])
+        self.assertEqual(ArticleTermFrequency.objects.get(topic='test topic').revision_id, 8)
+
+
+class TestWordFrequencyField(TestCase):
+
+    def test_encode_decode_round_trip(self):
+        for value in ([['sharding', 3], ['données', 2], ['', 0]], [['node', 70000]], [],
+                      [[f'word{index}', index] for index in range(500)],
+                      [{'word': 'database', 'frequency': 5}], [['nul\0word', 1]]):
+            self.assertEqual(decode_word_frequency(encode_word_frequency(value)), value)
+        pairs = [(f'shard{index}', 100 - index) for index in range(10)]
+        self.assertLess(len(encode_word_frequency(pairs)), len(json.dumps(pairs)) * 0.6)
+
+    def test_decoded_on_access_and_saved_back_as_is(self):
+        SearchResult.objects.create(topic='database sharding', word_frequency=[('sharding', 12), ('database', 9)])
+        result = SearchResult.objects.get()
+        self.assertIsInstance(result.word_frequency, WordFrequency)
+        self.assertIs(result.word_frequency._value, _UNDECODED)
+        self.assertEqual(result.word_frequency, [['sharding', 12], ['database', 9]])
+        self.assertEqual(result.word_frequency[0], ['sharding', 12])
+        with patch('analysis.fields.encode_word_frequency') as encode:
+            result.save()
+        encode.assert_not_called()
+        self.assertEqual(SearchResult.objects.values_list('word_frequency', flat=True)[0].tolist(),
+                         [['sharding', 12], ['database', 9]])
+
+
+class TestWordFrequencyMigration(TransactionTestCase):
+
+    def _migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('analysis', target)])
+        return executor.loader.project_state([('analysis', target)]).apps
+
+    def test_history_is_packed_and_unpacked(self):
+        apps = self._migrate('0005_dump_checkpoint')
+        OldSearchResult = apps.get_model('analysis', 'SearchResult')
+        OldSearchResult.objects.create(topic='a', word_frequency=[['shard', 3], ['node', 1]])
+        OldSearchResult.objects.create(topic='b', word_frequency=[{'word': 'shard', 'frequency': 2}])
+        self._migrate('0006_pack_search_result_word_frequency')
+        self.assertEqual([result.word_frequency for result in SearchResult.objects.order_by('id')],
+                         [[['shard', 3], ['node', 1]], [{'word': 'shard', 'frequency': 2}]])
+        apps = self._migrate('0005_dump_checkpoint')
+        self.assertEqual(list(apps.get_model('analysis', 'SearchResult').objects.order_by('id')
+                              .values_list('word_frequency', flat=True)),
+                         [[['shard', 3], ['node', 1]], [{'word': 'shard', 'frequency': 2}]])
+        self._migrate('0006_pack_search_result_word_frequency')
+
+
+class TestWriteBehindQueue(TransactionTestCase):
+
+    def test_wait_for_flush_writes_concurrent_saves_in_batches(self):
+        write_behind = WriteBehindQueue(SearchResult, {'MODE': 'wait_for_flush', 'BATCH_SIZE': 10,
+                                                       'FLUSH_INTERVAL': 0.2})
+        threads = [threading.Thread(target=write_behind.save,
+                                    args=(SearchResult(topic=f"topic {index}", word_frequency=[]),))
+                   for index in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(SearchResult.objects.count(), 10)
+        self.assertLess(write_behind.stats()['flushes'], 10)
+        write_behind.stop()
+
+    def test_stop_drains_the_queue(self):
+        write_behind = WriteBehindQueue(SearchResult, {'FLUSH_INTERVAL': 10})
+        for index in range(3):
+            write_behind.save(SearchResult(topic=f"topic {index}", word_frequency=[]))
+        write_behind.stop()
+        self.assertEqual(SearchResult.objects.count(), 3)
+        self.assertEqual(write_behind.stats()['depth'], 0)
+
+    def test_full_queue_saves_inline(self):
+        write_behind = WriteBehindQueue(SearchResult, {'MAX_QUEUE_SIZE': 1, 'PUT_TIMEOUT': 0.01})
+        write_behind.start = MagicMock()
+        write_behind.save(SearchResult(topic="queued", word_frequency=[]))
+        write_behind.save(SearchResult(topic="inline", word_frequency=[]))
+        self.assertEqual(list(SearchResult.objects.values_list('topic', flat=True)), ['inline'])
+        self.assertEqual(write_behind.stats()['inline_saves'], 1)
+
+
+class TestSQLiteProfile(TestCase):
+
+    @staticmethod
+    def _connection(name):
+        connection = MagicMock(vendor='sqlite', settings_dict={'NAME': name})
+        return connection, connection.cursor.return_value.__enter__.return_value
+
+    @override_settings(WIKI_SQLITE_PRAGMAS={'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+    def test_pragmas_applied_to_new_connections(self):
+        connection, cursor = self._connection('/srv/db.sqlite3')
+        configure_sqlite_connection(sender=None, connection=connection)
+        cursor.execute.assert_any_call("PRAGMA journal_mode = WAL")
+        cursor.execute.assert_any_call("PRAGMA synchronous = NORMAL")
+
+        # The journal mode can not be changed through a read only connection
+        connection, cursor = self._connection('file:/srv/db.sqlite3?mode=ro')
+        configure_sqlite_connection(sender=None, connection=connection)
+        cursor.execute.assert_called_once_with("PRAGMA synchronous = NORMAL")
+
+    @override_settings(WIKI_SQLITE_PRAGMAS={})
+    def test_no_pragmas_by_default(self):
+        connection, cursor = self._connection('/srv/db.sqlite3')
+        configure_sqlite_connection(sender=None, connection=connection)
+        cursor.execute.assert_not_called()
+
+    def test_router_sends_history_reads_to_the_read_alias(self):
+        router = HistoryReadRouter()
+        with override_settings(WIKI_HISTORY_READ_DATABASE='default'):
+            self.assertEqual(router.db_for_read(SearchResult), 'default')
+            self.assertIsNone(router.db_for_read(ArticleTermFrequency))
+            self.assertIsNone(router.db_for_write(SearchResult))
+            self.assertFalse(router.allow_migrate('default', 'analysis'))
+        # Not configured in DATABASES, reads stay on default
+        with override_settings(WIKI_HISTORY_READ_DATABASE='missing'):
+            self.assertIsNone(router.db_for_read(SearchResult))
+            self.assertIsNone(router.allow_migrate('default', 'analysis'))
+
+
+class TestArticleCache(TestCase):
+
+    def test_miss_then_hit(self):
+        cache = ArticleCache(max_entries=2, ttl=60)
+        fetch = MagicMock(return_value='text')
+        self.assertEqual(cache.get_or_fetch('topic', fetch), 'text')
+        self.assertEqual(cache.get_or_fetch('topic', fetch), 'text')
+        fetch.assert_called_once()
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+        cache = ArticleCache(max_entries=2, ttl=60)
+        for topic in ('a', 'b', 'c'):
+            cache.set(topic, topic)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), 'c')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    @patch('analysis.cache.threading.Thread')
+    def test_stale_hit_refreshes_in_background(self, mock_thread):
+        cache = ArticleCache(max_entries=2, ttl=0, stale_ttl=60)
+        cache.set('topic', 'old')
+        fetch = MagicMock(return_value='new')
+        self.assertEqual(cache.get_or_fetch('topic', fetch), 'old')
+        fetch.assert_not_called()
+        mock_thread.assert_called_once()
+        self.assertEqual(cache.stats()['stale_hits'], 1)
+
+    def test_stale_hit_of_current_revision_is_not_fetched(self):
+        class InlineThread:
+            def __init__(self, target, args, **kwargs):
+                self.run = lambda: target(*args)
+
+            def start(self):
+                self.run()
+
+        cache = ArticleCache(max_entries=2, ttl=0, stale_ttl=60)
+        cache.set('topic', 'old')
+        fetch = MagicMock(return_value='new')
+        with patch('analysis.cache.threading.Thread', InlineThread):
+            self.assertEqual(cache.get_or_fetch('topic', fetch, revalidate=lambda value: value == 'old'), 'old')
+        fetch.assert_not_called()
+        self.assertEqual(cache.stats()['revalidations'], 1)
+
+    def test_shared_tier_promotes_to_local(self):
+        cache = ArticleCache(max_entries=2, ttl=60, shared_tier=DjangoCacheTier('default'))
+        cache.set('topic', 'text')
+        cache.local.clear()
+        fetch = MagicMock()
+        self.assertEqual(cache.get_or_fetch('topic', fetch), 'text')
+        fetch.assert_not_called()
+        self.assertEqual(len(cache.local), 1)
+
+
+@override_settings(WIKI_ARTICLE_CACHE={'ENABLED': True, 'TTL': 0, 'STALE_TTL': 60})
+class RevisionRefresherTest(TestCase):
+
+    def setUp(self):
+        reset_article_cache()
+        self.addCleanup(reset_article_cache)
+
+    @patch('requests.Session.get')
+    def test_only_changed_pages_are_downloaded(self, mock_get):
+        cache = get_article_cache()
+        checked_at = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        for topic in ('stable', 'edited'):
+            cache.set(topic, Article(f'{topic} text', 1, '2024-01-01T00:00:00Z'))
+            ArticleTermFrequency.objects.create(topic=topic, scope='intro', revision_id=1, checked_at=checked_at,
+                                                terms=encode_terms([('text', 1)]))
+        info = MagicMock()
+        info.json.return_value = {'query': {'pages': {
+            '1': {'title': 'stable', 'lastrevid': 1, 'touched': '2024-01-01T00:00:00Z'},
+            '2': {'title': 'edited', 'lastrevid': 2, 'touched': '2024-02-01T00:00:00Z'}}}}
+        extracts = MagicMock()
+        extracts.json.return_value = {'query': {'pages': {
+            '2': {'title': 'edited', 'extract': '<p>New text, new.</p>', 'lastrevid': 2}}}}
+        mock_get.side_effect = [info, extracts]
+
+        refresher = RevisionRefresher()
+        for topic in ('stable', 'edited', 'stable', 'never analysed'):
+            refresher.hot_topics.record(topic)
+        self.assertEqual(refresher.refresh(), {'checked': 2, 'unchanged': 1, 'refetched': 1})
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args_list[0].kwargs['params'], {'titles': 'stable|edited'})
+        self.assertEqual(mock_get.call_args_list[1].kwargs['params']['titles'], 'edited')
+        self.assertEqual(cache.peek('edited'), Article('New text, new.', 2, None))
+        edited = ArticleTermFrequency.objects.get(topic='edited')
+        self.assertEqual((edited.revision_id, decode_terms(edited.terms)), (2, [('new', 2), ('text', 1)]))
+        self.assertGreater(ArticleTermFrequency.objects.get(topic='stable').checked_at, checked_at)
+
+
+class CacheWarmerTest(TestCase):
+
+    def setUp(self):
+        reset_article_cache()
+        self.addCleanup(reset_article_cache)
+        for topic, searches in (('popular', 3), ('fresh', 2), ('rare', 1)):
+            for _ in range(searches):
+                SearchResult.objects.create(topic=topic, word_frequency=[])
+        ArticleTermFrequency.objects.create(topic='fresh', scope='intro', revision_id=1, checked_at=timezone.now(),
+                                            terms=encode_terms([('text', 1)]))
+
+    @patch('requests.Session.get')
+    def test_prefetches_the_cold_top_topics_and_reports_warm_hits(self, mock_get):
+        extracts = MagicMock()
+        extracts.json.return_value = {'query': {'pages': {
+            '1': {'title': 'popular', 'extract': '<p>Popular topic, popular.</p>', 'lastrevid': 5}}}}
+        mock_get.return_value = extracts
+
+        warmer = CacheWarmer({'TOP_K': 2, 'REQUESTS_PER_SECOND': 0})
+        report = warmer.warm()
+        self.assertEqual(mock_get.call_args.kwargs['params']['titles'], 'popular')
+        self.assertEqual({key: report[key] for key in ('ranked', 'already_warm', 'prefetched', 'requests')},
+                         {'ranked': 2, 'already_warm': 1, 'prefetched': 1, 'requests': 1})
+        self.assertEqual(get_article_cache().peek('popular'), Article('Popular topic, popular.', 5, None))
+        stored = ArticleTermFrequency.objects.get(topic='popular')
+        self.assertEqual((stored.revision_id, decode_terms(stored.terms)), (5, [('popular', 2), ('topic', 1)]))
+        self.assertEqual(warmer.warm_topics, {'popular', 'fresh'})
+
+        for topic in ('popular', 'fresh', 'rare'):
+            SearchResult.objects.create(topic=topic, word_frequency=[])
+        report = warmer.warm()
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual((report['searches'], report['warm_hits'], report['warm_hit_ratio']), (3, 2, 0.6667))
+
+    @patch('requests.Session.get')
+    def test_request_budget(self, mock_get):
+        warmer = CacheWarmer({'TOP_K': 10, 'MAX_REQUESTS': 0})
+        self.assertEqual(warmer.warm()['skipped'], 2)
+        mock_get.assert_not_called()
+        budget = RateBudget(rate=1000, max_calls=2)
+        self.assertEqual([budget.acquire() for _ in range(3)], [True, True, False])
+
+
+class TestSingleFlight(TestCase):
+
+    def test_concurrent_threads_share_one_call(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'result'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', work)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flight.do('key', work))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while flight.coalesced < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+        self.assertEqual(results, ['result'] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats()['coalesced'], 3)
+
+    def test_error_is_shared_and_key_released(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do('key', MagicMock(side_effect=ValueError('boom')))
+        self.assertEqual(flight.do('key', lambda: 'ok'), 'ok')
+
+    def test_concurrent_coroutines_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'result'
+
+        async def run():
+            return await asyncio.gather(*[flight.do_async('key', work) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(run()), ['result'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.coalesced, 4)
+
+    def test_cancelled_leader_does_not_cancel_waiters(self):
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return 'result'
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do_async('key', work))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(flight.do_async('key', work))
+            await asyncio.sleep(0)
+            leader.cancel()
+            await asyncio.sleep(0)
+            release.set()
+            return leader, await waiter
+
+        leader, result = asyncio.run(run())
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(result, 'result')
+        self.assertEqual(flight.stats(), dict(executed=1, coalesced=1, in_flight=0))
+
+    def test_coroutines_on_other_loops_are_not_coalesced(self):
+        flight = SingleFlight()
+        # Both calls must be running at once, a call coalesced across loops would never reach the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        async def work():
+            await asyncio.to_thread(barrier.wait)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(asyncio.run(flight.do_async('key', work))))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['result'] * 2)
+        self.assertEqual(flight.stats(), dict(executed=2, coalesced=0, in_flight=0))
+
+
+class TestWikiHttpClient(TestCase):
+
+    def test_circuit_breaker_opens_and_recovers(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.recovery_timeout = 0
+        breaker.before_call()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    @patch('requests.Session.get')
+    def test_get_uses_timeouts_and_counts_failures(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=503)
+        client = WikiHttpClient({'CONNECT_TIMEOUT': 1, 'READ_TIMEOUT': 2, 'CIRCUIT_FAILURE_THRESHOLD': 1})
+        client.get('http://wiki.test/w/api.php')
+        self.assertEqual(mock_get.call_args.kwargs['timeout'], (1, 2))
+        self.assertEqual(client.stats()['failures'], 1)
+        with self.assertRaises(CircuitOpenError):
+            client.get('http://wiki.test/w/api.php')
+
+    @patch('requests.sessions.get_environ_proxies', return_value={})
+    def test_environment_is_read_once_per_origin(self, mock_proxies):
+        session = WikiHttpClient().session
+        for url in ('http://wiki.test/w/api.php?titles=a', 'http://wiki.test/w/api.php?titles=b',
+                    'http://other.test/w/api.php'):
+            session.merge_environment_settings(url, {}, False, None, None)
+        self.assertEqual([call.args[0] for call in mock_proxies.call_args_list],
+                         ['http://wiki.test/w/api.php?titles=a', 'http://other.test/w/api.php'])
+
+    @patch('analysis.http.asyncio.sleep', new_callable=AsyncMock)
+    @patch('analysis.http.WikiHttpClient._get_async_client')
+    async def test_aget_retries_honouring_retry_after(self, mock_client, mock_sleep):
+        throttled = MagicMock(status_code=429, headers={'Retry-After': '2'})
+        ok = MagicMock(status_code=200, headers={})
+        mock_client.return_value.get = AsyncMock(side_effect=[throttled, ok])
+        client = WikiHttpClient()
+        response = await client.aget('http://wiki.test/w/api.php')
+        self.assertIs(response, ok)
+        mock_sleep.assert_awaited_once_with(2.0)
+        self.assertEqual(client.stats()['retries'], 1)
+
+    @patch('analysis.http.WikiHttpClient._get_async_client')
+    async def test_cancelled_half_open_trial_is_released(self, mock_client):
+        started = asyncio.Event()
+
+        async def hang(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(60)
+
+        mock_client.return_value.get = AsyncMock(side_effect=hang)
+        client = WikiHttpClient({'CIRCUIT_FAILURE_THRESHOLD': 1, 'CIRCUIT_RECOVERY_TIMEOUT': 0})
+        client.breaker.record_failure()
+        trial = asyncio.ensure_future(client.aget('http://wiki.test/w/api.php'))
+        await started.wait()
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+        trial.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await trial
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        mock_client.return_value.get = AsyncMock(return_value=MagicMock(status_code=200, headers={}))
+        await client.aget('http://wiki.test/w/api.php')
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+
+def _mock_wiki_response(extract, revision_id=None):
+    mock_response = MagicMock()
+    mock_response.json.return_value = {'query': {'pages': {'123': {'extract': extract, 'lastrevid': revision_id}}}}
+    return mock_response
+
+
+@override_settings(WIKI_ARTICLE_CACHE={'ENABLED': False})
+class WikiSearchViewTest(TestCase):
+
+    @patch('requests.Session.get')
+    def test_sync_view(self, mock_get):
+        mock_get.return_value = _mock_wiki_response('<p>Sharding splits a database. Sharding scales.</p>')
+        response = self.client.get(reverse('word_frequency'), {'topic': 'Database Sharding', 'n': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'topic': 'database sharding', 'word_frequency': [['sharding', 2]]})
+        self.assertEqual(SearchResult.objects.filter(topic='database sharding').count(), 1)
+
+    @patch('requests.Session.get')
+    def test_filter_parameters(self, mock_get):
+        mock_get.return_value = _mock_wiki_response('<p>In 2024 the shards of the database split in 2 shards.</p>')
+        response = self.client.get(reverse('word_frequency'), {'topic': 'Database Sharding', 'n': 3,
+                                                               'stopwords': 'en', 'min_length': 5})
+        self.assertEqual(response.json()['word_frequency'], [['shards', 2], ['database', 1], ['split', 1]])
+        response = self.client.get(reverse('word_frequency'), {'topic': 'Database Sharding', 'numbers': 'drop'})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('analysis.http.WikiHttpClient._get_async_client')
+    async def test_async_view(self, mock_client):
+        mock_client.return_value.get = AsyncMock(
+            return_value=_mock_wiki_response('<p>Sharding splits a database. Sharding scales.</p>'))
+        response = await self.async_client.get(reverse('word_frequency_async'),
+                                               {'topic': 'Database Sharding', 'n': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'topic': 'database sharding', 'word_frequency': [['sharding', 2]]})
+        self.assertEqual(await SearchResult.objects.filter(topic='database sharding').acount(), 1)
+
+    async def test_async_view_without_topic(self):
+        response = await self.async_client.get(reverse('word_frequency_async'))
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(WIKI_ARTICLE_CACHE={'ENABLED': False}, WIKI_METRICS={'ENABLED': True})
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram('latency_seconds', "Latency", ('stage',), (0.1, 1))
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.observe(value, 'fetch')
+        self.assertEqual(histogram.samples(), [
+            'latency_seconds_bucket{stage="fetch",le="0.1"} 1', 'latency_seconds_bucket{stage="fetch",le="1"} 3',
+            'latency_seconds_bucket{stage="fetch",le="+Inf"} 4', 'latency_seconds_sum{stage="fetch"} 4.05',
+            'latency_seconds_count{stage="fetch"} 4'])
+        self.assertEqual(server_timing([('db', 0.001), ('fetch', 0.01), ('db', 0.002)], 0.02),
+                         'db;dur=3.00, fetch;dur=10.00, total;dur=20.00')
+
+    @patch('requests.Session.get')
+    def test_stages_are_timed_and_exposed(self, mock_get):
+        mock_get.return_value = _mock_wiki_response('<p>Sharding splits a database. Sharding scales.</p>')
+        mock_get.return_value.status_code = 200
+        response = self.client.get(reverse('word_frequency'), {'topic': 'Database Sharding', 'n': 1})
+        stages = [timing.split(';')[0] for timing in response['Server-Timing'].split(', ')]
+        for stage in ('fetch', 'extract', 'analyse', 'save', 'total'):
+            self.assertIn(stage, stages)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('wiki_stage_duration_seconds_count{stage="fetch"} 1', body)
+        self.assertIn('wiki_upstream_responses_total{status="200"} 1', body)
+        self.assertIn('wiki_request_duration_seconds_count{view="word_frequency",method="GET",status="200"} 1', body)
+        self.assertIn('wiki_upstream_requests_total', body)
+
+    @patch('analysis.http.WikiHttpClient._get_async_client')
+    async def test_async_view_server_timing(self, mock_client):
+        mock_client.return_value.get = AsyncMock(
+            return_value=_mock_wiki_response('<p>Sharding splits a database. Sharding scales.</p>'))
+        response = await self.async_client.get(reverse('word_frequency_async'), {'topic': 'Database Sharding'})
+        self.assertIn('fetch;dur=', response['Server-Timing'])
+        self.assertIn('analyse;dur=', response['Server-Timing'])
+
+    def test_queries_are_timed(self):
+        from django.db import connection
+        instrument_connection(None, connection)
+        self.addCleanup(connection.execute_wrappers.clear)
+        SearchResult.objects.count()
+        self.assertGreaterEqual(get_metrics().db_query_duration.count('default'), 1)
+
+    def test_disabled(self):
+        with override_settings(WIKI_METRICS={'ENABLED': False}):
+            response = self.client.get(reverse('search_history'))
+            self.assertNotIn('Server-Timing', response)
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+@override_settings(WIKI_ARTICLE_CACHE={'ENABLED': False})
+class WikiBatchSearchViewTest(TestCase):
+
+    @patch('requests.Session.get')
+    def test_batch_results_per_topic(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'query': {
+                'normalized': [{'from': 'database sharding', 'to': 'Database sharding'},
+                               {'from': 'no such page', 'to': 'No such page'}],
+                'pages': {
+                    '1': {'title': 'Database sharding', 'extract': '<p>Sharding splits a database.</p>'},
+                    '-1': {'title': 'No such page', 'missing': ''},
+                }
+            }
+        }
+        mock_get.return_value = mock_response
+        response = self.client.post(reverse('word_frequency_batch'),
+                                    {'topics': ['Database Sharding', 'no such page', ''], 'n': 1},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'topic': 'database sharding', 'word_frequency': [['sharding', 1]]},
+            {'topic': 'no such page', 'error': 'No data found'},
+            {'topic': '', 'error': 'Topic is invalid.'},
+        ])
+        mock_get.assert_called_once()
+        self.assertEqual(mock_get.call_args.kwargs['params']['titles'], 'database sharding|no such page')
+        self.assertEqual(SearchResult.objects.count(), 1)
+
+    @patch('analysis.utils.WIKI_MAX_TITLES_PER_QUERY', 2)
+    @patch('analysis.utils.WikiBatchAnalysisUtil.fetch_wikipedia_articles')
+    def test_batch_groups_topics_into_queries(self, mock_fetch):
+        mock_fetch.side_effect = lambda titles: {title: {'extract': title} for title in titles}
+        response = self.client.post(reverse('word_frequency_batch'), {'topics': ['a', 'b', 'c', 'A']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 4)
+        self.assertEqual(sorted(call.args[0] for call in mock_fetch.call_args_list), [['a', 'b'], ['c']])
+
+    def test_batch_invalid_body(self):
+        response = self.client.post(reverse('word_frequency_batch'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_topics_must_be_strings(self):
+        for topics in ([['a'], 'b'], [{'a': 1}], [None]):
+            response = self.client.post(reverse('word_frequency_batch'), {'topics': topics},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+def _mock_generator_response(pages):
+    mock_response = MagicMock()
+    mock_response.json.return_value = {'query': {'pages': {
+        str(index): {'title': title, 'lastrevid': index, 'index': len(pages) - index, **page}
+        for index, (title, page) in enumerate(pages)}}}
+    return mock_response
+
+
+@override_settings(WIKI_ARTICLE_CACHE={'ENABLED': False})
+class WikiMultiPageSearchViewTest(TestCase):
+    # Given in reverse search order, `index` is the rank
+    PAGES = [('Partition', {'extract': '<p>Partition the node.</p>'}),
+             ('No extract', {}),
+             ('Shard', {'extract': '<p>Shard the shard, shard the node.</p>'})]
+
+    @patch('requests.Session.get')
+    def test_pages_are_merged_before_selecting_the_top_words(self, mock_get):
+        mock_get.return_value = _mock_generator_response(self.PAGES)
+        response = self.client.get(reverse('word_frequency_pages'), {'topic': 'Database Sharding', 'n': 2,
+                                                                     'pages': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'topic': 'database sharding', 'word_frequency': [['shard', 3], ['node', 2]], 'source': 'search',
+            'pages': [{'title': 'Shard', 'revision_id': 2, 'word_frequency': [['shard', 3], ['node', 1]]},
+                      {'title': 'Partition', 'revision_id': 0, 'word_frequency': [['partition', 1], ['node', 1]]}]})
+        mock_get.assert_called_once()
+        self.assertEqual(mock_get.call_args.kwargs['params'],
+                         {'generator': 'search', 'gsrsearch': 'Database Sharding', 'gsrlimit': 3, 'exlimit': 'max'})
+        self.assertEqual(SearchResult.objects.get().word_frequency, [['shard', 3], ['node', 2]])
+
+    @patch('requests.Session.get')
+    def test_category_pages_counted_on_the_executor(self, mock_get):
+        executor = AnalysisExecutor({'MAX_WORKERS': 2, 'MIN_TEXT_SIZE': 20})
+        self.addCleanup(executor.shutdown)
+        mock_get.return_value = _mock_generator_response(self.PAGES)
+        with patch('analysis.utils.get_analysis_executor', return_value=executor):
+            response = self.client.get(reverse('word_frequency_pages'), {'topic': 'Distributed computing',
+                                                                         'source': 'category', 'n': 2})
+        self.assertEqual(response.json()['word_frequency'], [['shard', 3], ['node', 2]])
+        # The Partition page is below MIN_TEXT_SIZE
+        self.assertEqual((executor.submitted, executor.inline), (1, 1))
+        self.assertEqual(mock_get.call_args.kwargs['params']['gcmtitle'], 'Category:Distributed computing')
+
+    @patch('requests.Session.get')
+    def test_invalid_parameters_and_no_pages(self, mock_get):
+        for params in ({'pages': 21}, {'pages': 'many'}, {'source': 'links'}):
+            response = self.client.get(reverse('word_frequency_pages'), {'topic': 'sharding', **params})
+            self.assertEqual(response.status_code, 400)
+        mock_get.assert_not_called()
+        mock_get.return_value.json.return_value = {'batchcomplete': ''}
+        response = self.client.get(reverse('word_frequency_pages'), {'topic': 'sharding'})
+        self.assertEqual(response.json(), {'error': 'No data found'})
+
+
+@override_settings(WIKI_ARTICLE_CACHE={'ENABLED': False})
+class HttpCacheTest(TestCase):
+
+    def test_etag_does_not_depend_on_set_order(self):
+        self.assertEqual(make_etag('topic', frozenset(['the', 'a', 'of'])),
+                         make_etag('topic', frozenset(['of', 'a', 'the'])))
+        self.assertNotEqual(make_etag('topic', 1), make_etag('topic', 2))
+
+    @patch('requests.Session.get')
+    def test_word_frequency_not_modified(self, mock_get):
+        mock_get.return_value = _mock_wiki_response('<p>Sharding splits a database. Sharding scales.</p>', 7)
+        params = {'topic': 'Database Sharding', 'n': 1}
+        response = self.client.get(reverse('word_frequency'), params)
+        etag = response['ETag']
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        response = self.client.get(reverse('word_frequency'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(SearchResult.objects.count(), 1)
+        # Another n is another result
+        response = self.client.get(reverse('word_frequency'), {**params, 'n': 2}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_history_not_modified_after_one_query(self):
+        SearchResult.objects.create(topic="database sharding", word_frequency=[["database", 5]])
+        response = self.client.get(reverse('search_history'), {'page_size': 5})
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('search_history'), {'page_size': 5},
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        etag = response['ETag']
+        SearchResult.objects.create(topic="load balancing", word_frequency=[["load", 2]])
+        response = self.client.get(reverse('search_history'), {'page_size': 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 2)
+
+    @override_settings(WIKI_HTTP_CACHE={'RESPONSE_CACHE_ALIAS': 'default'})
+    def test_history_response_cache(self):
+        SearchResult.objects.create(topic="database sharding", word_frequency=[["database", 5]])
+        first = self.client.get(reverse('search_history'))
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse('search_history'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
 
 class WikiHistoryViewTest(TestCase):
     def setUp(self):
@@ -99,6 +956,31 @@ class WikiHistoryViewTest(TestCase):
         response = self.client.get(reverse('search_history'), {'page': 'invalid', 'page_size': 'invalid'})
         self.assertEqual(response.status_code, 400)
 
+    def test_cursor_pagination_walks_every_result_once(self):
+        seen, params = [], {'pagination': 'cursor', 'page_size': 6, 'include_total': 'true'}
+        while True:
+            response = self.client.get(reverse('search_history'), params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.json()['data'])
+            self.assertEqual(response.json()['pagination']['total_results'], 20)
+            next_cursor = response.json()['pagination']['next_cursor']
+            if next_cursor is None:
+                break
+            params = {'cursor': next_cursor, 'page_size': 6, 'include_total': 'true'}
+        self.assertEqual(len(seen), 20)
+
+    def test_fields_projection_and_topic_filter(self):
+        SearchResult.objects.create(topic="load balancing", word_frequency=[])
+        response = self.client.get(reverse('search_history'), {'fields': 'topic,created_at',
+                                                               'topic': 'Load Balancing'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 1)
+        self.assertEqual(set(response.json()['data'][0]), {'topic', 'created_at'})
+
+    def test_request_with_invalid_cursor_or_fields(self):
+        self.assertEqual(self.client.get(reverse('search_history'), {'cursor': 'invalid'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('search_history'), {'fields': 'password'}).status_code, 400)
+
     def test_request_when_no_search_results(self):
         SearchResult.objects.all().delete()
         response = self.client.get(reverse('search_history'))
@@ -112,5 +994,152 @@ class WikiHistoryViewTest(TestCase):
         self.assertIsNone(response.json()['pagination']['previous_page'])
 
 
+class HistoryExportTest(TestCase):
+    def setUp(self):
+        for index in range(5):
+            SearchResult.objects.create(topic=f"topic {index % 2}", word_frequency=[[f"word{index}", index]])
+
+    def _lines(self, response) -> list:
+        content = b''.join(response.streaming_content)
+        if response.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def test_streams_every_search_oldest_first(self):
+        response = self.client.get(reverse('search_history_export'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = self._lines(response)
+        self.assertEqual([line['topic'] for line in lines], ['topic 0', 'topic 1', 'topic 0', 'topic 1', 'topic 0'])
+        self.assertEqual(lines[3]['word_frequency'], [['word3', 3]])
+        first = SearchResult.objects.order_by('id').first()
+        self.assertEqual(lines[0]['id'], first.id)
+        self.assertEqual(datetime.fromisoformat(lines[0]['created_at']), first.created_at)
+
+    def test_increments_and_filters(self):
+        ids = list(SearchResult.objects.order_by('id').values_list('id', flat=True))
+        lines = self._lines(self.client.get(reverse('search_history_export'), {'after_id': ids[2]}))
+        self.assertEqual([line['id'] for line in lines], ids[3:])
+        lines = self._lines(self.client.get(reverse('search_history_export'), {'topic': 'Topic 1'}))
+        self.assertEqual([line['id'] for line in lines], [ids[1], ids[3]])
+        SearchResult.objects.filter(id__in=ids[:2]).update(created_at=datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        lines = self._lines(self.client.get(reverse('search_history_export'), {'since': '2024-01-02'}))
+        self.assertEqual([line['id'] for line in lines], ids[2:])
+        lines = self._lines(self.client.get(reverse('search_history_export'), {'until': '2024-01-01T12:00:00'}))
+        self.assertEqual([line['id'] for line in lines], ids[:2])
+        self.assertEqual(self.client.get(reverse('search_history_export'), {'since': 'yesterday'}).status_code, 400)
+
+    def test_gzip_when_accepted(self):
+        response = self.client.get(reverse('search_history_export'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(self._lines(response)), 5)
+
+    async def test_asgi_streams_an_async_iterator(self):
+        response = await self.async_client.get(reverse('search_history_export'))
+        self.assertTrue(response.is_async)
+        content = b''.join([block async for block in response.streaming_content])
+        self.assertEqual(len(content.decode().splitlines()), 5)
+
+    def test_command_writes_a_gzip_increment(self):
+        last_id = SearchResult.objects.order_by('id').values_list('id', flat=True)[1]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.ndjson.gz')
+            call_command('export_search_history', output=path, gzip=True, after_id=last_id, chunk_size=2,
+                         stderr=StringIO())
+            with gzip.open(path, 'rt') as export:
+                lines = [json.loads(line) for line in export]
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(line['id'] > last_id for line in lines))
+
+
+@override_settings(WIKI_ARTICLE_CACHE={'ENABLED': False})
+class WordTrendsTest(TestCase):
+
+    @patch('requests.Session.get')
+    def test_saves_roll_up_incrementally(self, mock_get):
+        mock_get.return_value = _mock_wiki_response('shard shard node')
+        WikiAnalysisUtil('database sharding').process()
+        WikiAnalysisUtil('sharding').process()
+        rows = DailyWordCount.objects.order_by('word').values_list('word', 'frequency', 'searches')
+        self.assertEqual(list(rows), [('node', 2, 2), ('shard', 4, 2)])
+
+    def test_top_words_and_trend(self):
+        with patch('django.utils.timezone.now', return_value=datetime(2024, 3, 1, 12, tzinfo=dt_timezone.utc)):
+            save_search_results([SearchResult(topic='a', word_frequency=[['shard', 3], ['node', 1]]),
+                                 SearchResult(topic='b', word_frequency=[['node', 5]])])
+        with patch('django.utils.timezone.now', return_value=datetime(2024, 3, 2, 12, tzinfo=dt_timezone.utc)):
+            save_search_results([SearchResult(topic='c', word_frequency=[['shard', 4]])])
+
+        response = self.client.get(reverse('word_trends'), {'since': '2024-03-01', 'until': '2024-03-07'})
+        self.assertEqual(response.json(), {'since': '2024-03-01', 'until': '2024-03-07',
+                                           'top_words': [['shard', 7], ['node', 6]]})
+        response = self.client.get(reverse('word_trends'), {'word': 'Shard', 'until': '2024-03-07'})
+        self.assertEqual(response.json()['trend'], [{'day': '2024-03-01', 'frequency': 3, 'searches': 1},
+                                                    {'day': '2024-03-02', 'frequency': 4, 'searches': 1}])
+        response = self.client.get(reverse('word_trends'), {'since': '2024-03-08', 'until': '2024-03-07'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('word_trends'), {'since': 'last week'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill_rebuilds_rollups(self):
+        SearchResult.objects.create(topic='a', word_frequency=[{'word': 'shard', 'frequency': 2}])
+        SearchResult.objects.create(topic='b', word_frequency=[['shard', 3], ['node', 1]])
+        SearchResult.objects.update(created_at=datetime(2024, 3, 1, 12, tzinfo=dt_timezone.utc))
+        # Run twice, a rebuild does not count the history again
+        for _ in range(2):
+            call_command('backfill_word_rollups', batch_size=1, stdout=StringIO())
+        rows = DailyWordCount.objects.order_by('word').values_list('day', 'word', 'frequency', 'searches')
+        self.assertEqual(list(rows), [(date(2024, 3, 1), 'node', 1, 1), (date(2024, 3, 1), 'shard', 5, 2)])
+
+
+SAMPLE_DUMP = os.path.join(os.path.dirname(__file__), 'testdata', 'sample_dump.xml')
+
+
+class AnalyseDumpCommandTest(TransactionTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _analyse(self, path, **options):
+        call_command('analyse_dump', path, stdout=StringIO(), **options)
+
+    def test_xml_bz2_dump_is_analysed_and_resumed(self):
+        path = os.path.join(self.tmp.name, 'enwiki-pages-articles.xml.bz2')
+        with open(SAMPLE_DUMP, 'rb') as sample, bz2.open(path, 'wb') as dump:
+            dump.write(sample.read())
+        self._analyse(path, workers=1, batch_size=2, limit=1, store='both')
+        self.assertEqual(list(SearchResult.objects.values_list('topic', flat=True)),
+                         ['shard (database architecture)'])
+        # The next run starts after the checkpoint, redirects and talk pages are skipped
+        self._analyse(path, workers=1, batch_size=2, store='both')
+        self._analyse(path, workers=1, batch_size=2, store='both')
+        self.assertEqual(sorted(SearchResult.objects.values_list('topic', flat=True)),
+                         ['load balancing (computing)', 'replication (computing)', 'shard (database architecture)'])
+        self.assertEqual(DumpCheckpoint.objects.get().pages_done, 3)
+        shard = SearchResult.objects.get(topic='shard (database architecture)')
+        self.assertEqual(shard.word_frequency[:2], [['database', 5], ['shard', 3]])
+        stored = ArticleTermFrequency.objects.get(topic='shard (database architecture)', scope='full')
+        self.assertEqual(stored.revision_id, 9001)
+        self.assertNotIn('cite', dict(decode_terms(stored.terms)))
+
+    def test_jsonl_gz_dump_in_worker_processes(self):
+        path = os.path.join(self.tmp.name, 'articles.jsonl.gz')
+        with gzip.open(path, 'wt', encoding='utf-8') as dump:
+            for index in range(6):
+                dump.write(json.dumps({'title': f'Topic {index}', 'revid': index, 'text': 'node ' * index}) + '\n')
+        self._analyse(path, workers=2, task_size=2, batch_size=4, store='terms')
+        self.assertEqual(ArticleTermFrequency.objects.count(), 6)
+        self.assertEqual(ArticleTermFrequency.objects.get(topic='topic 5').total_words, 5)
+        self.assertFalse(SearchResult.objects.exists())
+
+    def test_unknown_dump_format(self):
+        self.assertEqual(detect_format('/dumps/enwiki.xml.gz'), 'xml')
+        with self.assertRaises(ValueError):
+            detect_format('/dumps/enwiki.csv')
+
+
 if __name__ == '__main__':
     unittest.main()
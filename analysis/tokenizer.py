@@ -0,0 +1,107 @@
+import re
+import heapq
+from collections import Counter
+from operator import itemgetter
+from typing import Iterable
+
+from .const import TOKENIZER_CHUNK_SIZE
+from .filters import TokenFilter, NO_FILTER
+
+
+WORD_RE = re.compile(r'\w+')
+# Word characters at the end of a chunk, possibly the first part of a word continued in the next chunk
+TRAILING_WORD_RE = re.compile(r'\w+\Z')
+
+
+def _trailing_word_start(chunk: str) -> int:
+    """
+        Returns the index where the word at the end of the chunk starts, len(chunk) if it ends on a non word
+        character. Searching the whole chunk would try the pattern at every word, so only its tail is searched
+        unless the word is longer than the tail.
+    """
+    tail_start = max(0, len(chunk) - 256)
+    trailing = TRAILING_WORD_RE.search(chunk, tail_start)
+    if trailing is None:
+        return len(chunk)
+    if trailing.start() == tail_start and tail_start:
+        trailing = TRAILING_WORD_RE.search(chunk)
+    return trailing.start()
+
+
+class WordCounter:
+    """
+        Streaming word counter. Text is fed in chunks of at most TOKENIZER_CHUNK_SIZE characters, so only one
+        chunk worth of lowercased text and tokens is alive at a time however long the article is.
+
+        The token filter is applied to the distinct words once counting is done, which gives the same counts as
+        filtering every token but costs O(vocabulary) instead of O(tokens).
+    """
+
+    def __init__(self, token_filter: TokenFilter = NO_FILTER) -> None:
+        """
+            Constructor to initialize the filter
+        :param token_filter: Filter of the words not to be counted
+        """
+        self.token_filter = token_filter
+        self.counts = Counter()
+        self.tokens = 0
+        self._carry = ''
+        self._filtered = False
+
+    def _count(self, text: str) -> None:
+        words = WORD_RE.findall(text.lower())
+        self.tokens += len(words)
+        # Counter.update counts in C, keeping the first seen order for ties like Counter(words) does
+        self.counts.update(words)
+
+    def feed(self, text: str) -> 'WordCounter':
+        """
+            Counts the words of the text, a word cut at the end of the text is completed by the next feed
+        :param text: Chunk of text of any size
+        :return: self
+        """
+        for start in range(0, len(text), TOKENIZER_CHUNK_SIZE):
+            chunk = self._carry + text[start:start + TOKENIZER_CHUNK_SIZE]
+            cut = _trailing_word_start(chunk)
+            self._carry = chunk[cut:]
+            self._count(chunk[:cut])
+        return self
+
+    def feed_chunks(self, chunks: Iterable[str]) -> 'WordCounter':
+        """
+            Counts the words of every chunk
+        :param chunks: Iterable of text chunks, e.g. a streamed response
+        :return: self
+        """
+        for chunk in chunks:
+            self.feed(chunk)
+        return self
+
+    def close(self) -> Counter:
+        """
+            Counts the pending word and applies the filters, no more text may be fed afterwards
+        :return: Counter of the words
+        """
+        if self._carry:
+            self._count(self._carry)
+            self._carry = ''
+        if not self._filtered:
+            self.token_filter.filter_counts(self.counts)
+            self._filtered = True
+        return self.counts
+
+    def most_common(self, n: int) -> list:
+        """
+            Returns the n most common words, selected with a heap bounded by n
+        :param n: Number of words to return
+        :return: List of (word, count) tuples, ties in the order the words first appeared
+        """
+        counts = self.close()
+        return heapq.nlargest(n, counts.items(), key=itemgetter(1))
+
+
+def count_words(text: str, token_filter: TokenFilter = NO_FILTER) -> Counter:
+    """
+        Returns the Counter of the words of the text
+    """
+    return WordCounter(token_filter).feed(text).close()
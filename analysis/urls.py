@@ -1,7 +1,13 @@
 from django.urls import path
-from .views import WikiSearch, WikiHistory
+from .views import WikiSearch, AsyncWikiSearch, WikiBatchSearch, WikiMultiPageSearch, WikiHistory, HistoryExport, \
+    WordTrends
 
 urlpatterns = [
     path('word_frequency/', WikiSearch.as_view(), name='word_frequency'),
+    path('word_frequency/async/', AsyncWikiSearch.as_view(), name='word_frequency_async'),
+    path('word_frequency/batch/', WikiBatchSearch.as_view(), name='word_frequency_batch'),
+    path('word_frequency/pages/', WikiMultiPageSearch.as_view(), name='word_frequency_pages'),
     path('search_history/', WikiHistory.as_view(), name='search_history'),
+    path('search_history/export/', HistoryExport.as_view(), name='search_history_export'),
+    path('word_trends/', WordTrends.as_view(), name='word_trends'),
 ]
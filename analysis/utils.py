@@ -1,16 +1,60 @@
-import re
-import requests
 import traceback
-from collections import Counter
+from datetime import timedelta
+from collections import namedtuple, Counter
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
+from asgiref.sync import sync_to_async
+from django.utils import timezone
 
-from .models import SearchResult
-from .const import WIKI_BASE_URL, WIKI_TOPIC_SEARCH_URL, COMMON_WORDS
+from .models import SearchResult, ArticleTermFrequency
+from .cache import get_article_cache
+from .writebehind import get_write_behind_queue
+from .rollups import save_search_results
+from .http import get_http_client
+from .tokenizer import WordCounter
+from .executor import new_word_counter, get_analysis_executor
+from .filters import TokenFilter, NO_FILTER, get_token_filter
+from .streaming import parse_extracts
+from .extraction import strip_html, get_extract_config
+from .httpcache import make_etag
+from .termstore import get_term_store_config, sorted_terms, encode_terms, decode_terms, select_top_terms
+from .metrics import timed, with_request_context, STAGE_FETCH, STAGE_REVISION, STAGE_FULL_ARTICLE, STAGE_EXTRACT, \
+    STAGE_ANALYSE, STAGE_TERM_STORE, STAGE_SAVE
+from .const import WIKI_BASE_URL, WIKI_TOPIC_SEARCH_URL, STOPWORDS_COMMON, STOPWORDS_NONE, WIKI_MAX_TITLES_PER_QUERY, \
+    BATCH_FETCH_WORKERS, WIKI_FULL_ARTICLE_URL, WIKI_MAX_CONTINUATIONS, WIKI_STREAM_CHUNK_SIZE, SCOPE_INTRO, \
+    SCOPE_FULL, ANALYSIS_SCOPES, WIKI_REVISION_URL, NUMBERS_KEEP, NUMBERS_SKIP, PAGES_SEARCH, PAGES_CATEGORY, \
+    PAGE_SOURCES, WIKI_MAX_PAGES_PER_TOPIC, DEFAULT_PAGES_PER_TOPIC
 from wikipedia_analysis.loggers import logging
 
 
 logger = logging.getLogger("wiki_analysis")
 
+# Cleaned text of an article along with the revision it was taken from and the time the page last changed
+# (`touched`, also bumped when a template it uses is edited)
+Article = namedtuple('Article', ['text', 'revision_id', 'touched'], defaults=(None,))
+# Metadata of a page, as returned by the metadata only query
+PageInfo = namedtuple('PageInfo', ['revision_id', 'touched'])
+
+
+def is_current_article(article: Article, info: Optional[PageInfo]) -> bool:
+    """
+        Checks if the article is of the revision described by info, the page touched time too when known
+    """
+    if info is None or article.revision_id is None or article.revision_id != info.revision_id:
+        return False
+    return article.touched is None or info.touched is None or article.touched == info.touched
+
+
+def topic_search_url() -> str:
+    """
+        Returns the url of the lead section query, asking for plain text when `WIKI_EXTRACTS['EXPLAINTEXT']` is set
+    """
+    if get_extract_config()['EXPLAINTEXT']:
+        return f"{WIKI_TOPIC_SEARCH_URL}&explaintext=1"
+    return WIKI_TOPIC_SEARCH_URL
+
 
 class WikiAnalysisUtil:
     """
@@ -18,18 +62,30 @@ class WikiAnalysisUtil:
     """
 
     def __init__(self, topic: str, top_word_count: int = 10, skip_common_words: bool = False,
-                 skip_numbers: bool = False) -> None:
+                 skip_numbers: bool = False, scope: str = SCOPE_INTRO, token_filter: TokenFilter = None) -> None:
         """
             Constructor to initialize the topic and top_word_count
         :param topic: Topic to be searched
         :param top_word_count: An integer specifying the number of top frequent words to return
         :param skip_common_words: (bool) if defined common words are not to be considered
         :param skip_numbers: (bool) if numbers are to be skipped
+        :param scope: SCOPE_INTRO to analyse the lead section, SCOPE_FULL for the whole article
+        :param token_filter: Filter of the words not to be considered, replaces skip_common_words and skip_numbers
         """
         self.topic = self.clean_input_topic(topic)
         self.top_word_count = top_word_count
         self.skip_common_words = skip_common_words
         self.skip_numbers = skip_numbers
+        if token_filter is None:
+            token_filter = get_token_filter(STOPWORDS_COMMON if skip_common_words else STOPWORDS_NONE,
+                                            numbers=NUMBERS_SKIP if skip_numbers else NUMBERS_KEEP)
+        self.token_filter = token_filter
+        if scope not in ANALYSIS_SCOPES:
+            logger.error(f"Scope is invalid. scope:: {scope}")
+            raise ValueError("Scope is invalid.")
+        self.scope = scope
+        # Revision of the article the last analysis was computed from
+        self.revision_id = None
 
     @staticmethod
     def clean_input_topic(topic: str) -> str:
@@ -43,21 +99,21 @@ class WikiAnalysisUtil:
         logger.error(f"Topic is invalid. topic:: {topic}")
         raise ValueError("Topic is invalid.")
 
-    def _check_to_skip(self, word: str) -> bool:
+    @property
+    def analysis_key(self) -> tuple:
         """
-            Method to check if a word has to be skipped
-        :param word: Word to check for sanity
-        :return: bool, True if word is to be considered else False
+            Key identifying analyses that produce the same result, used to coalesce concurrent requests
+        :return: Tuple of the cleaned topic, top_word_count, token filter and scope
         """
-        good_to_go = True
-        if self.skip_common_words:
-            if word in COMMON_WORDS:
-                good_to_go = False
-
-        if self.skip_numbers:
-            good_to_go = not word.isnumeric()
+        return self.topic, self.top_word_count, self.token_filter.key, self.scope
 
-        return good_to_go
+    def etag(self, revision_id) -> Optional[str]:
+        """
+            Strong ETag of the result of this analysis on the given article revision, None if it is unknown
+        """
+        if revision_id is None:
+            return None
+        return make_etag(self.analysis_key, revision_id, get_extract_config()['EXPLAINTEXT'])
 
     def word_frequency_analysis(self, text):
         """
@@ -65,30 +121,24 @@ class WikiAnalysisUtil:
         :param text: Text to be analysed for words and their frequency
         :return: top self.top_word_count words along with their counts
         """
-        # Tokenize the text
-        words = re.findall(r'\w+', text.lower())
-        words_list = [word for word in words]
+        with timed(STAGE_ANALYSE):
+            return self._new_word_counter().feed(text).most_common(self.top_word_count)
 
-        # Filter out common words or numbers
-        if self.skip_numbers or self.skip_common_words:
-            filtered_words = list(filter(self._check_to_skip, words_list))
-        else:
-            filtered_words = words_list
-        word_freq = Counter(filtered_words)
-        return word_freq.most_common(self.top_word_count)
+    @property
+    def stopwords(self) -> frozenset:
+        return self.token_filter.stopwords
+
+    def _new_word_counter(self) -> WordCounter:
+        return new_word_counter(self.token_filter)
 
     @staticmethod
     def remove_html_tags(text: str):
         """
             Remove the HTML tags from the text and return the HTML less text.
         :param text: Text containing the HTML tags
-        :return: Text without the HTML tags
+        :return: Text without the HTML tags, <script>/<style> content and entities
         """
-        # regular expression to match any text that starts with <, followed by any number of characters,
-        # and ends with >, which is the pattern for HTML tags. It then replaces these matches with an empty string,
-        # effectively removing them.
-        clean = re.compile('<.*?>')
-        return re.sub(clean, '', text)
+        return strip_html(text)
 
     def _extract_text(self, pages):
         """
@@ -100,23 +150,40 @@ class WikiAnalysisUtil:
         """
         try:
             text = list(pages.values())[0]['extract']
-            # Remove the HTML tags from the text
-            text = self.remove_html_tags(text)
+            # Remove the HTML tags from the text, plain text extracts have none
+            if not get_extract_config()['EXPLAINTEXT']:
+                with timed(STAGE_EXTRACT):
+                    text = self.remove_html_tags(text)
         except (IndexError, KeyError):
             logger.error(f"No data found. page values:: {pages.values()}")
             raise ValueError("No data found")
         return text
 
-    def fetch_wikipedia_article(self):
+    def _extract_article(self, pages) -> Article:
         """
-            Method to fetch the text of a Wikipedia article
-        :return:
+            Method to extract the text and the revision of the first page
+        :param pages: Page object
+        :return: Article
+        :raises:
+            ValueError if no page found
+        """
+        text = self._extract_text(pages)
+        page = list(pages.values())[0]
+        return Article(text, page.get('lastrevid'), page.get('touched'))
+
+    @property
+    def article_url(self) -> str:
+        return f"{topic_search_url()}&titles={self.topic}"
+
+    @staticmethod
+    def _get_pages(data: dict) -> dict:
+        """
+            Returns the pages of a WIKI query response
+        :param data: Decoded JSON response
+        :return: Page objects keyed by the page id
+        :raises:
+            ValueError if the response has no pages
         """
-        url = f"{WIKI_TOPIC_SEARCH_URL}&titles={self.topic}"
-        response = requests.get(url)
-        # Raise error if the response status is not in 2xx
-        response.raise_for_status()
-        data = response.json()
         try:
             pages = data['query']['pages']
         except KeyError:
@@ -124,6 +191,231 @@ class WikiAnalysisUtil:
             raise ValueError("No data found")
         return pages
 
+    @staticmethod
+    def _get_pages_by_title(data: dict, titles: list) -> dict:
+        """
+            Returns the pages of a WIKI query response keyed by the requested titles
+        :param data: Decoded JSON response
+        :param titles: Requested titles
+        :return: Page objects keyed by the requested title, titles without a page are left out
+        """
+        pages = WikiAnalysisUtil._get_pages(data)
+        # WIKI answers with the normalized titles, e.g. `database sharding` -> `Database sharding`
+        normalized = {item['from']: item['to'] for item in data['query'].get('normalized', [])}
+        pages_by_title = {page.get('title'): page for page in pages.values()}
+        return {title: pages_by_title[normalized.get(title, title)] for title in titles
+                if normalized.get(title, title) in pages_by_title}
+
+    @staticmethod
+    def _page_infos(data: dict, titles: list) -> dict:
+        pages = WikiAnalysisUtil._get_pages_by_title(data, titles)
+        return {title: PageInfo(page['lastrevid'], page.get('touched')) for title, page in pages.items()
+                if 'lastrevid' in page}
+
+    @staticmethod
+    def fetch_page_info(titles: list) -> dict:
+        """
+            Fetches the current revision id and touched time of up to WIKI_MAX_INFO_TITLES_PER_QUERY titles with
+            a single metadata only query
+        :param titles: Cleaned topics
+        :return: PageInfo keyed by the requested title, titles without a page are left out
+        """
+        with timed(STAGE_REVISION):
+            response = get_http_client().get(WIKI_REVISION_URL, params={'titles': '|'.join(titles)})
+            # Raise error if the response status is not in 2xx
+            response.raise_for_status()
+            data = response.json()
+        return WikiAnalysisUtil._page_infos(data, titles)
+
+    @staticmethod
+    def fetch_revision_ids(titles: list) -> dict:
+        """
+            Fetches the current revision ids of up to WIKI_MAX_INFO_TITLES_PER_QUERY titles with a metadata only
+            query
+        :param titles: Cleaned topics
+        :return: Revision id keyed by the requested title, titles without a page are left out
+        """
+        return {title: info.revision_id for title, info in WikiAnalysisUtil.fetch_page_info(titles).items()}
+
+    def _article_is_current(self, article: Article) -> bool:
+        """
+            Checks with a metadata only query if a cached article is still the current revision of the page
+        """
+        if article.revision_id is None:
+            return False
+        return is_current_article(article, self.fetch_page_info([self.topic]).get(self.topic))
+
+    def fetch_wikipedia_article(self):
+        """
+            Method to fetch the text of a Wikipedia article
+        :return:
+        """
+        with timed(STAGE_FETCH):
+            response = get_http_client().get(self.article_url)
+            # Raise error if the response status is not in 2xx
+            response.raise_for_status()
+            data = response.json()
+        return self._get_pages(data)
+
+    def count_full_article_words(self) -> tuple:
+        """
+            Method to count the words of the whole article. The plain text extract is streamed from WIKI and fed
+            to the counter as it is parsed, following the continuations, so the article is never held in memory
+        :return: Unfiltered WordCounter of the article and the revision id
+        :raises:
+            ValueError if no page found
+        """
+        with timed(STAGE_FULL_ARTICLE):
+            return self._count_full_article_words()
+
+    def _count_full_article_words(self) -> tuple:
+        word_counter = new_word_counter()
+        params = {'titles': self.topic}
+        found = False
+        revision_id = None
+        for _ in range(WIKI_MAX_CONTINUATIONS):
+            response = get_http_client().get(WIKI_FULL_ARTICLE_URL, params=params, stream=True)
+            with response:
+                # Raise error if the response status is not in 2xx
+                response.raise_for_status()
+                data = parse_extracts(response.iter_content(WIKI_STREAM_CHUNK_SIZE),
+                                      lambda index, text: word_counter.feed(text))
+            # Do not join the last word of this extract with the first word of the continuation
+            word_counter.feed('\n')
+            for page in self._get_pages(data).values():
+                found = found or 'extract' in page
+                revision_id = revision_id or page.get('lastrevid')
+            if 'continue' not in data:
+                break
+            params = {'titles': self.topic, **data['continue']}
+        if not found:
+            logger.error(f"No data found. topic:: {self.topic}")
+            raise ValueError("No data found")
+        return word_counter, revision_id
+
+    def _fetch_article(self) -> Article:
+        return self._extract_article(self.fetch_wikipedia_article())
+
+    def get_article(self) -> Article:
+        """
+            Method to return the cleaned text and revision of the article, served from the article cache when
+            enabled
+        :return: Article
+        """
+        cache = get_article_cache()
+        if cache is None:
+            return self._fetch_article()
+        # A stale article is only downloaded again if its revision changed
+        return cache.get_or_fetch(self.topic, self._fetch_article, self._article_is_current)
+
+    def get_article_text(self) -> str:
+        """
+            Method to return the cleaned text of the article, served from the article cache when enabled
+        :return: Text of the article without the HTML tags
+        """
+        return self.get_article().text
+
+    @staticmethod
+    def _count_text_terms(text: str) -> list:
+        with timed(STAGE_ANALYSE):
+            return sorted_terms(new_word_counter().feed(text).close())
+
+    def _count_article_terms(self) -> tuple:
+        """
+            Method to fetch the article and count all of its words
+        :return: Terms, most frequent first, and the revision id of the article
+        """
+        if self.scope == SCOPE_FULL:
+            word_counter, revision_id = self.count_full_article_words()
+            return sorted_terms(word_counter.close()), revision_id
+        article = self.get_article()
+        return self._count_text_terms(article.text), article.revision_id
+
+    def _is_current(self, stored: ArticleTermFrequency, config: dict) -> bool:
+        """
+            Checks if the stored terms are of the current revision of the article. Revisions are only checked,
+            with a metadata only query, once REVALIDATE_AFTER seconds passed since the last check
+        :param stored: Stored terms
+        :param config: Term store configuration
+        :return: bool, True if the stored terms can be served
+        """
+        if timezone.now() - stored.checked_at < timedelta(seconds=config['REVALIDATE_AFTER']):
+            return True
+        if stored.revision_id is None:
+            return False
+        try:
+            revision_id = self.fetch_revision_ids([self.topic]).get(self.topic)
+        except Exception as ex:
+            logger.error(f"Exception raised while checking the revision. topic:: {self.topic}  exception:: {ex}")
+            return False
+        return self._revalidate(stored, revision_id)
+
+    @staticmethod
+    def _revalidate(stored: ArticleTermFrequency, revision_id) -> bool:
+        if revision_id is None or revision_id != stored.revision_id:
+            return False
+        ArticleTermFrequency.objects.filter(pk=stored.pk).update(checked_at=timezone.now())
+        return True
+
+    def _store_terms(self, terms: list, revision_id) -> None:
+        """
+            Saves the terms of the article in the ArticleTermFrequency table, replacing those of an older revision
+        :param terms: Terms, most frequent first
+        :param revision_id: Revision id of the article
+        """
+        try:
+            with timed(STAGE_TERM_STORE):
+                ArticleTermFrequency.objects.update_or_create(
+                    topic=self.topic, scope=self.scope,
+                    defaults=dict(revision_id=revision_id, terms=encode_terms(terms), checked_at=timezone.now(),
+                                  total_words=sum(count for _, count in terms)))
+        except Exception as ex:
+            logger.error(f"Exception raised while saving the terms in ArticleTermFrequency. topic:: {self.topic} "
+                         f"exception:: {ex}")
+            traceback.print_exc()
+
+    def get_term_frequencies(self) -> list:
+        """
+            Method to return every word of the article with its count, most frequent first. Served from the term
+            frequency store while the article revision is unchanged, so any `n` and token filter are answered
+            without fetching and tokenizing the article again
+        :return: List of (word, count) tuples
+        """
+        config = get_term_store_config()
+        if not config['ENABLED']:
+            terms, self.revision_id = self._count_article_terms()
+            return terms
+        stored = ArticleTermFrequency.objects.filter(topic=self.topic, scope=self.scope).first()
+        if stored is not None and self._is_current(stored, config):
+            self.revision_id = stored.revision_id
+            with timed(STAGE_TERM_STORE):
+                return decode_terms(stored.terms)
+        terms, self.revision_id = self._count_article_terms()
+        self._store_terms(terms, self.revision_id)
+        return terms
+
+    def _stored_revision(self):
+        return ArticleTermFrequency.objects.filter(topic=self.topic, scope=self.scope) \
+            .only('pk', 'revision_id', 'checked_at').first()
+
+    def current_revision_id(self):
+        """
+            Returns the revision of the stored terms of the article if they are current, checking the revision
+            with a metadata only query once REVALIDATE_AFTER seconds passed, without fetching the article
+        :return: Revision id, None if there are no current stored terms
+        """
+        config = get_term_store_config()
+        if not config['ENABLED']:
+            return None
+        stored = self._stored_revision()
+        if stored is None or not self._is_current(stored, config):
+            return None
+        return stored.revision_id
+
+    def _select_top_words(self, terms) -> list:
+        with timed(STAGE_ANALYSE):
+            return select_top_terms(terms, self.top_word_count, self.token_filter)
+
     def _save_result(self, word_frequency_json: dict) -> None:
         """
             Saves the search result of the topic in SearchResult table
@@ -136,27 +428,38 @@ class WikiAnalysisUtil:
         """
         try:
             search_result = SearchResult(topic=self.topic, word_frequency=word_frequency_json)
-            search_result.save()
+            write_behind = get_write_behind_queue()
+            with timed(STAGE_SAVE):
+                if write_behind is not None:
+                    write_behind.save(search_result)
+                else:
+                    save_search_results([search_result])
         except Exception as ex:
             logger.error(
                 f"Exception raised while saving the data in SearchResult. topic:: {self.topic} "
                 f"word_frequency_json:: {word_frequency_json}  exception:: {ex}")
             traceback.print_exc()
 
-    def run_analysis(self) -> dict:
+    def _build_result(self, word_freq: list) -> dict:
         """
-            Processes the topic and returns Json containing the topic and the `top_word_count` word to count data
-        :return: Json containing the topic and the `top_word_count` word to count data
+            Returns the result Json of the analysis
+        :param word_freq: top self.top_word_count words along with their counts
+        :return: Json containing the topic and the word to count data
+        :raises:
+            ValueError if no words were found
         """
-        pages = self.fetch_wikipedia_article()
-        # Extract the text of the first page
-        text = self._extract_text(pages)
-        word_freq = self.word_frequency_analysis(text)
         if not word_freq:
             logger.error(f"No Data found, topic:: {self.topic}  word_freq:: {word_freq}")
             raise ValueError("No Data found")
         return dict(topic=self.topic, word_frequency=word_freq)
 
+    def run_analysis(self) -> dict:
+        """
+            Processes the topic and returns Json containing the topic and the `top_word_count` word to count data
+        :return: Json containing the topic and the `top_word_count` word to count data
+        """
+        return self._build_result(self._select_top_words(self.get_term_frequencies()))
+
     def process(self) -> dict:
         """
             Runs the analysis and saves the result
@@ -166,3 +469,449 @@ class WikiAnalysisUtil:
         self._save_result(return_data.get("word_frequency"))
         return return_data
 
+    def process_versioned(self) -> tuple:
+        """
+            Runs process
+        :return: Tuple of the result Json and the revision of the article it was computed from
+        """
+        return self.process(), self.revision_id
+
+
+class AsyncWikiAnalysisUtil(WikiAnalysisUtil):
+    """
+        Async variant of WikiAnalysisUtil for the ASGI request path. The article is fetched with the pooled
+        async HTTP client, tokenization runs in a worker thread to keep the event loop free and the result is
+        saved with the async ORM.
+    """
+
+    async def afetch_wikipedia_article(self) -> dict:
+        """
+            Async counterpart of fetch_wikipedia_article
+        :return: Page objects keyed by the page id
+        """
+        with timed(STAGE_FETCH):
+            response = await get_http_client().aget(self.article_url)
+            # Raise error if the response status is not in 2xx
+            response.raise_for_status()
+            data = response.json()
+        return self._get_pages(data)
+
+    async def _afetch_article(self) -> Article:
+        return self._extract_article(await self.afetch_wikipedia_article())
+
+    async def aget_article(self) -> Article:
+        """
+            Async counterpart of get_article
+        :return: Article
+        """
+        cache = get_article_cache()
+        if cache is None:
+            return await self._afetch_article()
+        return await cache.aget_or_fetch(self.topic, self._afetch_article, self._aarticle_is_current)
+
+    async def aget_article_text(self) -> str:
+        """
+            Async counterpart of get_article_text
+        :return: Text of the article without the HTML tags
+        """
+        return (await self.aget_article()).text
+
+    @staticmethod
+    async def afetch_page_info(titles: list) -> dict:
+        """
+            Async counterpart of fetch_page_info
+        :return: PageInfo keyed by the requested title, titles without a page are left out
+        """
+        with timed(STAGE_REVISION):
+            response = await get_http_client().aget(WIKI_REVISION_URL, params={'titles': '|'.join(titles)})
+            # Raise error if the response status is not in 2xx
+            response.raise_for_status()
+            data = response.json()
+        return WikiAnalysisUtil._page_infos(data, titles)
+
+    @staticmethod
+    async def afetch_revision_ids(titles: list) -> dict:
+        """
+            Async counterpart of fetch_revision_ids
+        :return: Revision id keyed by the requested title, titles without a page are left out
+        """
+        return {title: info.revision_id
+                for title, info in (await AsyncWikiAnalysisUtil.afetch_page_info(titles)).items()}
+
+    async def _aarticle_is_current(self, article: Article) -> bool:
+        """
+            Async counterpart of _article_is_current
+        """
+        if article.revision_id is None:
+            return False
+        return is_current_article(article, (await self.afetch_page_info([self.topic])).get(self.topic))
+
+    async def _acount_article_terms(self) -> tuple:
+        if self.scope == SCOPE_FULL:
+            # The whole article is streamed and counted as it arrives, which is CPU bound, so it runs on the
+            # sync path in a worker thread
+            return await sync_to_async(self._count_article_terms, thread_sensitive=False)()
+        article = await self.aget_article()
+        # Tokenizing is CPU bound, run it off the event loop
+        terms = await sync_to_async(self._count_text_terms, thread_sensitive=False)(article.text)
+        return terms, article.revision_id
+
+    async def _ais_current(self, stored: ArticleTermFrequency, config: dict) -> bool:
+        """
+            Async counterpart of _is_current
+        """
+        if timezone.now() - stored.checked_at < timedelta(seconds=config['REVALIDATE_AFTER']):
+            return True
+        if stored.revision_id is None:
+            return False
+        try:
+            revision_id = (await self.afetch_revision_ids([self.topic])).get(self.topic)
+        except Exception as ex:
+            logger.error(f"Exception raised while checking the revision. topic:: {self.topic}  exception:: {ex}")
+            return False
+        return await sync_to_async(self._revalidate)(stored, revision_id)
+
+    async def aget_term_frequencies(self) -> list:
+        """
+            Async counterpart of get_term_frequencies
+        :return: List of (word, count) tuples
+        """
+        config = get_term_store_config()
+        if not config['ENABLED']:
+            terms, self.revision_id = await self._acount_article_terms()
+            return terms
+        stored = await ArticleTermFrequency.objects.filter(topic=self.topic, scope=self.scope).afirst()
+        if stored is not None and await self._ais_current(stored, config):
+            self.revision_id = stored.revision_id
+            with timed(STAGE_TERM_STORE):
+                return decode_terms(stored.terms)
+        terms, self.revision_id = await self._acount_article_terms()
+        await sync_to_async(self._store_terms)(terms, self.revision_id)
+        return terms
+
+    async def acurrent_revision_id(self):
+        """
+            Async counterpart of current_revision_id
+        """
+        config = get_term_store_config()
+        if not config['ENABLED']:
+            return None
+        stored = await sync_to_async(self._stored_revision)()
+        if stored is None or not await self._ais_current(stored, config):
+            return None
+        return stored.revision_id
+
+    async def _asave_result(self, word_frequency_json: dict) -> None:
+        """
+            Async counterpart of _save_result
+        """
+        try:
+            search_result = SearchResult(topic=self.topic, word_frequency=word_frequency_json)
+            write_behind = get_write_behind_queue()
+            with timed(STAGE_SAVE):
+                if write_behind is not None:
+                    # Queuing may block on backpressure or wait for the flush, keep it off the event loop
+                    await sync_to_async(write_behind.save, thread_sensitive=False)(search_result)
+                else:
+                    await sync_to_async(save_search_results)([search_result])
+        except Exception as ex:
+            logger.error(
+                f"Exception raised while saving the data in SearchResult. topic:: {self.topic} "
+                f"word_frequency_json:: {word_frequency_json}  exception:: {ex}")
+            traceback.print_exc()
+
+    async def arun_analysis(self) -> dict:
+        """
+            Async counterpart of run_analysis
+        :return: Json containing the topic and the `top_word_count` word to count data
+        """
+        return self._build_result(self._select_top_words(await self.aget_term_frequencies()))
+
+    async def aprocess(self) -> dict:
+        """
+            Async counterpart of process
+        :return: Json containing the topic and the `top_word_count` word to count data
+        """
+        return_data = await self.arun_analysis()
+        await self._asave_result(return_data.get("word_frequency"))
+        return return_data
+
+    async def aprocess_versioned(self) -> tuple:
+        """
+            Async counterpart of process_versioned
+        """
+        return await self.aprocess(), self.revision_id
+
+
+class WikiBatchAnalysisUtil:
+    """
+        Utility class for analysing many topics at once. Topics are grouped into as few WIKI queries as the
+        API allows (pipe separated `titles`), the queries run concurrently and the results are saved with a
+        single bulk insert.
+    """
+
+    def __init__(self, topics: list, top_word_count: int = 10, skip_common_words: bool = False,
+                 skip_numbers: bool = False, token_filter: TokenFilter = None) -> None:
+        """
+            Constructor to initialize the topics, invalid topics are reported in the results
+        :param topics: List of topics to be searched
+        :param top_word_count: An integer specifying the number of top frequent words to return
+        :param skip_common_words: (bool) if defined common words are not to be considered
+        :param skip_numbers: (bool) if numbers are to be skipped
+        :param token_filter: Filter of the words not to be considered, replaces skip_common_words and skip_numbers
+        """
+        self.topics = topics
+        self.utils = {}
+        self.errors = {}
+        for topic in topics:
+            try:
+                util_obj = WikiAnalysisUtil(topic, top_word_count=top_word_count,
+                                            skip_common_words=skip_common_words, skip_numbers=skip_numbers,
+                                            token_filter=token_filter)
+            except ValueError as ex:
+                self.errors[topic] = f"{ex}"
+                continue
+            # Topics differing only in case or surrounding spaces are analysed once
+            self.utils.setdefault(util_obj.topic, util_obj)
+
+    @staticmethod
+    def fetch_wikipedia_articles(titles: list) -> dict:
+        """
+            Fetches the articles of up to WIKI_MAX_TITLES_PER_QUERY titles in a single WIKI query
+        :param titles: Cleaned topics
+        :return: Page objects keyed by the requested title, titles without a page are left out
+        """
+        with timed(STAGE_FETCH):
+            response = get_http_client().get(topic_search_url(),
+                                             params={'titles': '|'.join(titles), 'exlimit': 'max'})
+            # Raise error if the response status is not in 2xx
+            response.raise_for_status()
+            data = response.json()
+        return WikiAnalysisUtil._get_pages_by_title(data, titles)
+
+    def _process_chunk(self, titles: list) -> dict:
+        """
+            Fetches and analyses a chunk of topics
+        :param titles: Cleaned topics
+        :return: Result Json or the exception raised, keyed by the topic
+        """
+        try:
+            pages = self.fetch_wikipedia_articles(titles)
+        except Exception as ex:
+            logger.error(f"Exception raised while fetching the articles. titles:: {titles}  exception:: {ex}")
+            return {title: ex for title in titles}
+
+        cache = get_article_cache()
+        results = {}
+        for title in titles:
+            try:
+                article = self.utils[title]._extract_article({title: pages[title]} if title in pages else {})
+            except ValueError as ex:
+                results[title] = ex
+                continue
+            if cache is not None:
+                cache.set(title, article)
+            results[title] = self._analyse(title, article.text)
+        return results
+
+    def _analyse(self, title: str, text: str):
+        """
+            Analyses the text of a topic
+        :return: Result Json or the ValueError raised
+        """
+        util_obj = self.utils[title]
+        try:
+            return util_obj._build_result(util_obj.word_frequency_analysis(text))
+        except ValueError as ex:
+            return ex
+
+    def run_analysis(self) -> dict:
+        """
+            Runs the analysis of every valid topic
+        :return: Result Json or the exception raised, keyed by the cleaned topic
+        """
+        cache = get_article_cache()
+        cached, to_fetch = [], []
+        for title in self.utils:
+            article = cache.get(title) if cache is not None else None
+            if article is None:
+                to_fetch.append(title)
+            else:
+                cached.append((title, article.text))
+
+        chunks = [to_fetch[index:index + WIKI_MAX_TITLES_PER_QUERY]
+                  for index in range(0, len(to_fetch), WIKI_MAX_TITLES_PER_QUERY)]
+        results = {}
+        if chunks:
+            # Each chunk is fetched and analysed in its own thread, analysing one chunk overlaps the fetch
+            # of the others. The stages they time are reported with this request
+            with ThreadPoolExecutor(max_workers=min(BATCH_FETCH_WORKERS, len(chunks))) as executor:
+                for chunk_results in executor.map(with_request_context(self._process_chunk), chunks):
+                    results.update(chunk_results)
+        for title, text in cached:
+            results[title] = self._analyse(title, text)
+        return results
+
+    def _save_results(self, results: dict) -> None:
+        """
+            Saves the successful results in the SearchResult table with a single bulk insert
+        :param results: Result Json or exception keyed by the cleaned topic
+        """
+        search_results = [SearchResult(topic=title, word_frequency=result.get("word_frequency"))
+                          for title, result in results.items() if not isinstance(result, Exception)]
+        try:
+            with timed(STAGE_SAVE):
+                save_search_results(search_results)
+        except Exception as ex:
+            logger.error(f"Exception raised while saving the data in SearchResult. topics:: {list(results)}  "
+                         f"exception:: {ex}")
+            traceback.print_exc()
+
+    def process(self) -> list:
+        """
+            Runs the analysis, saves the results and returns them in the order of the requested topics
+        :return: List of Json, one per requested topic, containing either the word to count data or the error
+        """
+        results = self.run_analysis()
+        self._save_results(results)
+        return_data = []
+        for topic in self.topics:
+            if topic in self.errors:
+                return_data.append(dict(topic=topic, error=self.errors[topic]))
+                continue
+            title = WikiAnalysisUtil.clean_input_topic(topic)
+            result = results[title]
+            if isinstance(result, Exception):
+                return_data.append(dict(topic=title, error=f"{result}"))
+            else:
+                return_data.append(result)
+        return return_data
+
+
+class WikiMultiPageAnalysisUtil(WikiAnalysisUtil):
+    """
+        Utility class for analysing the lead sections of up to WIKI_MAX_PAGES_PER_TOPIC pages a topic resolves to,
+        found by the full text search or as the members of the category named after the topic. The pages and
+        their extracts come from a single WIKI query (a generator feeding `prop=extracts`), are counted in
+        parallel on the analysis executor when it is enabled and their counts are merged before a single top
+        words selection, so the combined result ranks words by their count over every page.
+    """
+
+    def __init__(self, topic: str, top_word_count: int = 10, pages: int = DEFAULT_PAGES_PER_TOPIC,
+                 source: str = PAGES_SEARCH, skip_common_words: bool = False, skip_numbers: bool = False,
+                 token_filter: TokenFilter = None) -> None:
+        """
+            Constructor to initialize the topic, the number of pages and where they are found
+        :param topic: Topic to be searched
+        :param top_word_count: An integer specifying the number of top frequent words to return
+        :param pages: Maximum number of pages to analyse, up to WIKI_MAX_PAGES_PER_TOPIC
+        :param source: PAGES_SEARCH or PAGES_CATEGORY
+        :param skip_common_words: (bool) if defined common words are not to be considered
+        :param skip_numbers: (bool) if numbers are to be skipped
+        :param token_filter: Filter of the words not to be considered, replaces skip_common_words and skip_numbers
+        """
+        super().__init__(topic, top_word_count=top_word_count, skip_common_words=skip_common_words,
+                         skip_numbers=skip_numbers, token_filter=token_filter)
+        if not isinstance(pages, int) or not 1 <= pages <= WIKI_MAX_PAGES_PER_TOPIC:
+            logger.error(f"Pages is invalid. pages:: {pages}")
+            raise ValueError("Pages is invalid.")
+        if source not in PAGE_SOURCES:
+            logger.error(f"Source is invalid. source:: {source}")
+            raise ValueError("Source is invalid.")
+        self.pages = pages
+        self.source = source
+        # Search is case insensitive but category titles are not, past their first letter
+        self.query = topic.strip()
+
+    @property
+    def analysis_key(self) -> tuple:
+        return super().analysis_key + (self.pages, self.source)
+
+    @property
+    def generator_params(self) -> dict:
+        """
+            Query parameters resolving the topic to its pages, added to those of the lead section query
+        """
+        if self.source == PAGES_CATEGORY:
+            return {'generator': 'categorymembers', 'gcmtitle': f"Category:{self.query}", 'gcmtype': 'page',
+                    'gcmlimit': self.pages, 'exlimit': 'max'}
+        return {'generator': 'search', 'gsrsearch': self.query, 'gsrlimit': self.pages, 'exlimit': 'max'}
+
+    def fetch_wikipedia_pages(self) -> list:
+        """
+            Fetches the pages of the topic along with their lead sections in a single WIKI query
+        :return: Page objects, in the order of the search results
+        :raises:
+            ValueError if the topic resolves to no page
+        """
+        with timed(STAGE_FETCH):
+            response = get_http_client().get(topic_search_url(), params=self.generator_params)
+            # Raise error if the response status is not in 2xx
+            response.raise_for_status()
+            data = response.json()
+        # The generator gives no `query` at all when nothing matches
+        pages = self._get_pages(data) if 'query' in data else {}
+        if not pages:
+            logger.error(f"No pages found. topic:: {self.topic}  source:: {self.source}")
+            raise ValueError("No data found")
+        # Search results carry their rank, category members come in title order
+        return sorted(pages.values(), key=lambda page: page.get('index', 0))
+
+    def _count_pages(self, texts: list) -> list:
+        """
+            Counts the words of every text, each in a worker process when the analysis executor is enabled and the
+            text is not shorter than its MIN_TEXT_SIZE
+        :return: Unfiltered Counter per text
+        """
+        executor = get_analysis_executor()
+        with timed(STAGE_ANALYSE):
+            if executor is None or len(texts) < 2:
+                return [new_word_counter().feed(text).close() for text in texts]
+            # Pages shorter than MIN_TEXT_SIZE are counted here while the workers count the others
+            futures = [executor.submit(text, NO_FILTER) if len(text) >= executor.min_text_size else None
+                       for text in texts]
+            page_counts = []
+            try:
+                for text, future in zip(texts, futures):
+                    if future is None:
+                        executor.count_inline()
+                        page_counts.append(new_word_counter().feed(text).close())
+                    else:
+                        page_counts.append(future.result()[0])
+                return page_counts
+            except BrokenProcessPool:
+                logger.error("Analysis process pool is broken, restarting it")
+                executor.reset()
+                raise
+
+    def run_analysis(self) -> dict:
+        """
+            Fetches and analyses the pages of the topic
+        :return: Json containing the topic, the `top_word_count` word to count data over every page and the same
+            data per page
+        :raises:
+            ValueError if no page has an extract
+        """
+        # Pages past the extracts limit of the query, or without a lead section, have no extract
+        articles = [(page['title'], self._extract_article({page['title']: page}))
+                    for page in self.fetch_wikipedia_pages() if 'extract' in page]
+        if not articles:
+            logger.error(f"No data found. topic:: {self.topic}  source:: {self.source}")
+            raise ValueError("No data found")
+
+        cache = get_article_cache()
+        if cache is not None:
+            # A later request for one of the pages by its title is served from the cache
+            for title, article in articles:
+                cache.set(self.clean_input_topic(title), article)
+
+        page_counts = self._count_pages([article.text for _, article in articles])
+        combined = Counter()
+        for counts in page_counts:
+            combined.update(counts)
+        return_data = self._build_result(self._select_top_words(combined))
+        return_data['source'] = self.source
+        return_data['pages'] = [dict(title=title, revision_id=article.revision_id,
+                                     word_frequency=self._select_top_words(counts))
+                                for (title, article), counts in zip(articles, page_counts)]
+        return return_data
@@ -1,16 +1,68 @@
+import re
+import json
+from datetime import datetime, timedelta
+
 from django.views import View
-from django.http import JsonResponse
-from django.core.paginator import Paginator
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 
-from analysis.utils import WikiAnalysisUtil
+from analysis.utils import WikiAnalysisUtil, AsyncWikiAnalysisUtil, WikiBatchAnalysisUtil, WikiMultiPageAnalysisUtil
+from analysis.singleflight import analysis_flight
+from analysis.refresher import get_revision_refresher
+from analysis.warmer import get_cache_warmer
 from .models import SearchResult
-from .const import SEARCH_HISTORY_DATETIME_FORMAT
+from .pagination import keyset_page, cached_count
+from .filters import TokenFilter, get_token_filter
+from .rollups import top_words, word_trend
+from .export import NDJSON_CONTENT_TYPE, parse_since, export_queryset, iter_ndjson, iter_blocks, aiter_blocks
+from .metrics import get_metrics, PROMETHEUS_CONTENT_TYPE
+from .httpcache import get_http_cache_config, make_etag, not_modified, set_validators, cached_response, \
+    store_response
+from .const import SEARCH_HISTORY_DATETIME_FORMAT, BATCH_MAX_TOPICS, SCOPE_INTRO, HISTORY_FIELDS, \
+    HISTORY_COUNT_CACHE_TIMEOUT, STOPWORDS_COMMON, NUMBERS_SKIP, WORD_TRENDS_TOP_DAYS, WORD_TRENDS_TREND_DAYS, \
+    WORD_TRENDS_DATE_FORMAT, DEFAULT_PAGES_PER_TOPIC, PAGES_SEARCH
 from wikipedia_analysis.loggers import logging
 
 
 logger = logging.getLogger("wiki_analysis")
 
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+def record_hot_topics(topics) -> None:
+    """
+        Counts requests for the topics, so that the background refresher keeps the hottest ones warm, and starts
+        the cache warmer of this process with the first request
+    """
+    refresher = get_revision_refresher()
+    if refresher is not None:
+        for topic in topics:
+            refresher.record(topic)
+    warmer = get_cache_warmer()
+    if warmer is not None:
+        warmer.start()
+
+
+def token_filter_from(params) -> TokenFilter:
+    """
+        Returns the word filter of the `stopwords`, `min_length`, `max_length` and `numbers` parameters,
+        defaulting to the common words and numbers being skipped. Requests with the same parameters share it
+    :param params: QueryDict or dict of the request parameters
+    :return: TokenFilter
+    :raises:
+        ValueError if a parameter is invalid
+    """
+    return get_token_filter(stopwords=params.get('stopwords', STOPWORDS_COMMON),
+                            min_length=params.get('min_length', 1),
+                            max_length=params.get('max_length'),
+                            numbers=params.get('numbers', NUMBERS_SKIP))
+
 
 class WikiSearch(View):
     def get(self, request, *args, **kwargs):
@@ -38,15 +90,164 @@ class WikiSearch(View):
             logger.error(f"No topic provided. Topic:: {topic}")
             return JsonResponse({'error': 'Topic is required'}, status=400)
         top_word_count = int(request.GET.get('n', 10))
+        scope = request.GET.get('scope', SCOPE_INTRO)
+        config = get_http_cache_config()
         try:
-            util_obj = WikiAnalysisUtil(topic=topic, top_word_count=top_word_count, skip_common_words=True,
-                                        skip_numbers=True)
-            word_freq_data = util_obj.process()
+            util_obj = WikiAnalysisUtil(topic=topic, top_word_count=top_word_count, scope=scope,
+                                        token_filter=token_filter_from(request.GET))
+            record_hot_topics([util_obj.topic])
+            if config['ENABLED'] and 'HTTP_IF_NONE_MATCH' in request.META:
+                # The client has a result, answer 304 while the stored terms are of the same revision, without
+                # analysing (or saving) anything
+                etag = util_obj.etag(util_obj.current_revision_id())
+                response = not_modified(request, etag)
+                if response is not None:
+                    return set_validators(response, etag, max_age=config['MAX_AGE'])
+            # Concurrent requests for the same analysis share a single fetch, analysis and save
+            word_freq_data, revision_id = analysis_flight.do(util_obj.analysis_key, util_obj.process_versioned)
+        except Exception as ex:
+            return JsonResponse({"error": f"{ex}"}, status=400)
+        response = JsonResponse(word_freq_data, status=200)
+        if config['ENABLED']:
+            set_validators(response, util_obj.etag(revision_id), max_age=config['MAX_AGE'])
+        return response
+
+
+class AsyncWikiSearch(View):
+    async def get(self, request, *args, **kwargs):
+        """
+            Async variant of WikiSearch.get for ASGI deployments, does not hold a worker thread while waiting
+            on WIKI. Takes the same parameters and returns the same response as WikiSearch.get
+        :param request: HTTPRequest object
+        :return: JSON Response
+        """
+        topic = request.GET.get('topic', '')
+        if not topic:
+            logger.error(f"No topic provided. Topic:: {topic}")
+            return JsonResponse({'error': 'Topic is required'}, status=400)
+        top_word_count = int(request.GET.get('n', 10))
+        scope = request.GET.get('scope', SCOPE_INTRO)
+        config = get_http_cache_config()
+        try:
+            util_obj = AsyncWikiAnalysisUtil(topic=topic, top_word_count=top_word_count, scope=scope,
+                                             token_filter=token_filter_from(request.GET))
+            record_hot_topics([util_obj.topic])
+            if config['ENABLED'] and 'HTTP_IF_NONE_MATCH' in request.META:
+                etag = util_obj.etag(await util_obj.acurrent_revision_id())
+                response = not_modified(request, etag)
+                if response is not None:
+                    return set_validators(response, etag, max_age=config['MAX_AGE'])
+            word_freq_data, revision_id = await analysis_flight.do_async(util_obj.analysis_key,
+                                                                         util_obj.aprocess_versioned)
+        except Exception as ex:
+            return JsonResponse({"error": f"{ex}"}, status=400)
+        response = JsonResponse(word_freq_data, status=200)
+        if config['ENABLED']:
+            set_validators(response, util_obj.etag(revision_id), max_age=config['MAX_AGE'])
+        return response
+
+
+class WikiMultiPageSearch(View):
+    def get(self, request, *args, **kwargs):
+        """
+            Method to return the analysis of top words over the pages a WIKI topic resolves to
+        :param request: HTTPRequest object, with `topic`, `n`, `pages` (up to 20), `source` (`search` or
+            `category`) and the word filter parameters
+        :return: JSON Response
+            On success:
+                {
+                    "topic": "database sharding",
+                    "word_frequency": [
+                        {
+                            "word": frequency
+                        }
+                    ],
+                    "source": "search",
+                    "pages": [
+                        {
+                            "title": "Shard (database architecture)",
+                            "revision_id": 1234,
+                            "word_frequency": [
+                                {
+                                    "word": frequency
+                                }
+                            ]
+                        }
+                    ]
+                }
+
+            On Failure:
+            {
+                "error": "error"
+            }
+        """
+        topic = request.GET.get('topic', '')
+        if not topic:
+            logger.error(f"No topic provided. Topic:: {topic}")
+            return JsonResponse({'error': 'Topic is required'}, status=400)
+        try:
+            util_obj = WikiMultiPageAnalysisUtil(topic=topic, top_word_count=int(request.GET.get('n', 10)),
+                                                 pages=int(request.GET.get('pages', DEFAULT_PAGES_PER_TOPIC)),
+                                                 source=request.GET.get('source', PAGES_SEARCH),
+                                                 token_filter=token_filter_from(request.GET))
+            word_freq_data = analysis_flight.do(util_obj.analysis_key, util_obj.process)
         except Exception as ex:
             return JsonResponse({"error": f"{ex}"}, status=400)
         return JsonResponse(word_freq_data, status=200)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class WikiBatchSearch(View):
+    def post(self, request, *args, **kwargs):
+        """
+            Method to return the analysis of top words for many WIKI topics in one request
+        :param request: HTTPRequest object with a JSON body
+            {
+                "topics": ["database sharding", "load balancing"],
+                "n": 10,
+                "stopwords": "en",
+                "min_length": 3,
+                "numbers": "skip_any"
+            }
+        :return: JSON Response, one result per requested topic in the requested order
+            {
+                "results": [
+                    {
+                        "topic": "database sharding",
+                        "word_frequency": [
+                            {
+                                "word": frequency
+                            }
+                        ]
+                    },
+                    {
+                        "topic": "load balancing",
+                        "error": "error"
+                    }
+                ]
+            }
+        """
+        try:
+            body = json.loads(request.body)
+            topics = body['topics']
+            top_word_count = int(body.get('n', 10))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return JsonResponse({'error': 'A JSON body with a list of topics is required'}, status=400)
+        if not isinstance(topics, list) or not topics:
+            return JsonResponse({'error': 'A JSON body with a list of topics is required'}, status=400)
+        if not all(isinstance(topic, str) for topic in topics):
+            return JsonResponse({'error': 'Topics must be strings'}, status=400)
+        if len(topics) > BATCH_MAX_TOPICS:
+            return JsonResponse({'error': f'At most {BATCH_MAX_TOPICS} topics are allowed'}, status=400)
+        try:
+            token_filter = token_filter_from(body)
+        except ValueError as ex:
+            return JsonResponse({"error": f"{ex}"}, status=400)
+        util_obj = WikiBatchAnalysisUtil(topics=topics, top_word_count=top_word_count, token_filter=token_filter)
+        record_hot_topics(util_obj.utils)
+        return JsonResponse({'results': util_obj.process()}, status=200)
+
+
 class WikiHistory(View):
     def get(self, request, *args, **kwargs):
         """
@@ -73,15 +274,57 @@ class WikiHistory(View):
                     'previous_page:
                 }
             }
+            Optional parameters: `topic` to filter on a topic, `fields` (comma separated) to return only some of
+            the fields and `pagination=cursor` / `cursor` for cursor pagination, see _keyset_response
+
+            The ETag and Last-Modified of a page are those of the newest matching search result (the history is
+            append only), so If-None-Match / If-Modified-Since are answered with 304 after a single index seek.
         """
 
         # Default values for pagination parameters
-        page = request.GET.get('page', 1)
         page_size = request.GET.get('page_size', 10)
         if isinstance(page_size, str) and not page_size.isnumeric():
             return JsonResponse({'error': "Invalid page size"}, status=400)
+        page_size = int(page_size)
+        if not page_size:
+            return JsonResponse({'error': "Invalid page size"}, status=400)
+
+        fields = request.GET.get('fields')
+        fields = fields.split(',') if fields else list(HISTORY_FIELDS)
+        if not set(fields) <= set(HISTORY_FIELDS):
+            return JsonResponse({'error': f"Invalid fields, allowed fields are {', '.join(HISTORY_FIELDS)}"},
+                                status=400)
+
+        # Only the requested columns are loaded, as dicts rather than model instances
+        search_results = SearchResult.objects.values(*{*fields, 'created_at', 'id'})
+        topic = request.GET.get('topic')
+        if topic:
+            search_results = search_results.filter(topic=WikiAnalysisUtil.clean_input_topic(topic))
+
+        config = get_http_cache_config()
+        if not config['ENABLED']:
+            return self._page_response(request, search_results, fields, page_size, topic)
+        newest = search_results.order_by('-created_at', '-id').values('id', 'created_at').first()
+        last_modified = newest['created_at'] if newest else None
+        etag = make_etag('search_history', newest, sorted(request.GET.lists()))
+        response = not_modified(request, etag, last_modified) or cached_response(etag, config)
+        if response is None:
+            response = self._page_response(request, search_results, fields, page_size, topic)
+            store_response(etag, response, config)
+        return set_validators(response, etag, last_modified, config['HISTORY_MAX_AGE'])
+
+    def _page_response(self, request, search_results: QuerySet, fields: list, page_size: int,
+                       topic: str) -> JsonResponse:
+        """
+            Returns the requested page of the search history
+        """
+        page = request.GET.get('page', 1)
+        cursor = request.GET.get('cursor')
+        if cursor or request.GET.get('pagination') == 'cursor':
+            return self._keyset_response(request, search_results, fields, page_size, cursor, topic)
+
         # Fetch all search results ordered by creation time
-        search_results = SearchResult.objects.all().order_by('-created_at')
+        search_results = search_results.order_by('-created_at', '-id')
 
         # Create a Paginator object
         paginator = Paginator(search_results, page_size)
@@ -97,14 +340,7 @@ class WikiHistory(View):
             search_results_page = paginator.page(paginator.num_pages)
 
         # Prepare the search history data
-        search_history = [
-            {
-                'topic': result.topic,
-                'word_frequency': result.word_frequency,
-                'created_at': result.created_at.strftime(SEARCH_HISTORY_DATETIME_FORMAT)
-            }
-            for result in search_results_page
-        ]
+        search_history = [self._serialize(result, fields) for result in search_results_page]
 
         # Include pagination information in the response
         pagination_info = {
@@ -116,3 +352,147 @@ class WikiHistory(View):
         }
 
         return JsonResponse({'data': search_history, 'pagination': pagination_info})
+
+    @staticmethod
+    def _serialize(result: dict, fields: list) -> dict:
+        search_result = {field: result[field] for field in fields}
+        if 'word_frequency' in search_result:
+            search_result['word_frequency'] = result['word_frequency'].tolist()
+        if 'created_at' in search_result:
+            search_result['created_at'] = result['created_at'].strftime(SEARCH_HISTORY_DATETIME_FORMAT)
+        return search_result
+
+    def _keyset_response(self, request, search_results: QuerySet, fields: list, page_size: int, cursor: str,
+                         topic: str) -> JsonResponse:
+        """
+            Returns a page of the search history using a cursor instead of a page number. Pages are found by
+            seeking on (created_at, id), without counting the results or skipping the previous pages
+        :return: JSON Response
+            {
+                data: [...],
+                pagination: {
+                    'next_cursor': ,
+                    'page_size': ,
+                    'total_results':   (only with include_total=true, cached for a while)
+                }
+            }
+        """
+        try:
+            rows, next_cursor = keyset_page(search_results, page_size, cursor)
+        except ValueError as ex:
+            return JsonResponse({'error': f"{ex}"}, status=400)
+
+        pagination_info = {'next_cursor': next_cursor, 'page_size': page_size}
+        if request.GET.get('include_total') == 'true':
+            cache_key = f"search_history_count:{WikiAnalysisUtil.clean_input_topic(topic) if topic else ''}"
+            pagination_info['total_results'] = cached_count(search_results, cache_key,
+                                                            HISTORY_COUNT_CACHE_TIMEOUT)
+        return JsonResponse({'data': [self._serialize(row, fields) for row in rows],
+                             'pagination': pagination_info})
+
+
+class HistoryExport(View):
+    def get(self, request, *args, **kwargs):
+        """
+            Method to stream the whole search history, or an increment of it, as newline delimited JSON
+        :param request: HTTPRequest object
+            `since`, `until` (optional): only the searches created at or after / before this ISO 8601 day or date
+                and time
+            `after_id` (optional): only the searches saved after this one, the id of the last exported line
+            `topic` (optional): only the searches of this topic
+        :return: Streaming application/x-ndjson response, gzip encoded if the client accepts it, a line per search
+            oldest first:
+            {"id": 1, "topic": "database sharding", "word_frequency": [["database", 42]],
+             "created_at": "2024-03-01T12:00:00.123456+00:00"}
+            On Failure:
+            {
+                "error": "error"
+            }
+        """
+        try:
+            since = parse_since(request.GET.get('since'))
+            until = parse_since(request.GET.get('until'))
+            after_id = request.GET.get('after_id')
+            after_id = int(after_id) if after_id else None
+        except ValueError as ex:
+            return JsonResponse({'error': f"{ex}"}, status=400)
+        topic = request.GET.get('topic')
+        rows = export_queryset(since, until, after_id, WikiAnalysisUtil.clean_input_topic(topic) if topic else None)
+
+        compress = bool(ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', '')))
+        blocks = iter_blocks(iter_ndjson(rows), compress=compress)
+        # Under ASGI a synchronous iterator would be read to the end before the first byte is sent
+        response = StreamingHttpResponse(aiter_blocks(blocks) if isinstance(request, ASGIRequest) else blocks,
+                                         content_type=NDJSON_CONTENT_TYPE)
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class WordTrends(View):
+    def get(self, request, *args, **kwargs):
+        """
+            Method to return corpus wide word statistics of the search history, read from the daily rollups
+        :param request: HTTPRequest object
+            `word`: the word to return the trend of, the top words are returned without it
+            `since`, `until`: first and last day (YYYY-MM-DD), until defaults to today and since to the last
+                WORD_TRENDS_TOP_DAYS days for the top words, WORD_TRENDS_TREND_DAYS days for a trend
+            `n`: number of top words, 10 by default
+        :return: JSON Response
+            Top words:
+            {
+                "since": "2024-03-01",
+                "until": "2024-03-07",
+                "top_words": [["database", 42]]
+            }
+            Trend of a word:
+            {
+                "word": "database",
+                "since": "2024-02-07",
+                "until": "2024-03-07",
+                "trend": [{"day": "2024-03-01", "frequency": 12, "searches": 3}]
+            }
+            On Failure:
+            {
+                "error": "error"
+            }
+        """
+        word = request.GET.get('word', '').strip().lower()
+        try:
+            until = self._parse_day(request.GET.get('until')) or timezone.localdate()
+            since = self._parse_day(request.GET.get('since')) or \
+                until - timedelta(days=(WORD_TRENDS_TREND_DAYS if word else WORD_TRENDS_TOP_DAYS) - 1)
+            top_word_count = int(request.GET.get('n', 10))
+        except ValueError as ex:
+            return JsonResponse({'error': f"{ex}"}, status=400)
+        if since > until:
+            return JsonResponse({'error': "since is after until"}, status=400)
+
+        period = {'since': since.strftime(WORD_TRENDS_DATE_FORMAT), 'until': until.strftime(WORD_TRENDS_DATE_FORMAT)}
+        if not word:
+            return JsonResponse({**period, 'top_words': top_words(since, until, top_word_count)})
+        trend = [{**row, 'day': row['day'].strftime(WORD_TRENDS_DATE_FORMAT)} for row in word_trend(word, since, until)]
+        return JsonResponse({'word': word, **period, 'trend': trend})
+
+    @staticmethod
+    def _parse_day(value: str):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, WORD_TRENDS_DATE_FORMAT).date()
+        except ValueError:
+            raise ValueError(f"Invalid day {value}, expected YYYY-MM-DD")
+
+
+class Metrics(View):
+    def get(self, request, *args, **kwargs):
+        """
+            Method to return the metrics of this process in the Prometheus text format
+        :param request: HTTPRequest object
+        :return: text/plain response, 404 when metrics are disabled
+        """
+        metrics = get_metrics()
+        if metrics is None:
+            return JsonResponse({'error': 'Metrics are disabled'}, status=404)
+        return HttpResponse(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
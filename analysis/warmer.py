@@ -0,0 +1,240 @@
+import time
+import atexit
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import SearchResult, ArticleTermFrequency
+from .cache import get_article_cache
+from .termstore import get_term_store_config
+from .utils import WikiAnalysisUtil, WikiBatchAnalysisUtil
+from .const import SCOPE_INTRO, WIKI_MAX_TITLES_PER_QUERY
+from wikipedia_analysis.loggers import logging
+
+
+logger = logging.getLogger("wiki_analysis")
+
+DEFAULT_WARMER_CONFIG = {
+    'ENABLED': False,
+    'INTERVAL': 300,
+    'TOP_K': 100,
+    'WINDOW': 86400,
+    'REQUESTS_PER_SECOND': 1.0,
+    'MAX_REQUESTS': 50,
+}
+
+
+def get_warmer_config() -> dict:
+    """
+        Returns the cache warmer configuration, `settings.WIKI_WARMER` over the defaults
+    """
+    return {**DEFAULT_WARMER_CONFIG, **getattr(settings, 'WIKI_WARMER', {})}
+
+
+def popular_topics(since, k: int) -> list:
+    """
+        Returns the k topics searched the most since the given time, most searched first
+    :return: List of (topic, searches) tuples
+    """
+    return list(SearchResult.objects.filter(created_at__gte=since).values('topic')
+                .annotate(searches=Count('id')).order_by('-searches', 'topic').values_list('topic', 'searches')[:k])
+
+
+class RateBudget:
+    """
+        Spaces calls at least 1 / `rate` seconds apart, at most `max_calls` per run
+    """
+
+    def __init__(self, rate: float, max_calls: Optional[int] = None, stop: Optional[threading.Event] = None) -> None:
+        self.interval = 1 / rate if rate else 0.0
+        self.max_calls = max_calls
+        self.calls = 0
+        self._stop = stop or threading.Event()
+        self._next = 0.0
+
+    def acquire(self) -> bool:
+        """
+            Waits for the next call to be allowed
+        :return: bool, False once the budget of the run is spent or the warmer is stopping
+        """
+        if self.max_calls is not None and self.calls >= self.max_calls:
+            return False
+        delay = self._next - time.monotonic()
+        if delay > 0 and self._stop.wait(delay):
+            return False
+        self._next = max(self._next, time.monotonic()) + self.interval
+        self.calls += 1
+        return True
+
+
+class CacheWarmer:
+    """
+        Prefetches the lead sections of the TOP_K topics searched the most in the last WINDOW seconds, so that
+        the first request for a popular topic does not wait on WIKI. Topics whose stored terms (or cached article,
+        without the term store) are still fresh are skipped, the others are fetched 20 per query, spending at most
+        MAX_REQUESTS queries per run at REQUESTS_PER_SECOND, then cached and counted into the term store.
+
+        Each run reports the warm hit ratio of the period since the previous run: the share of the searches saved
+        in the meantime whose topic that run left warm. Read from the search history, it is right whether the
+        warmer runs in the web process or in `manage.py warm_cache`.
+    """
+
+    def __init__(self, config: Optional[dict] = None) -> None:
+        """
+            Constructor to initialize the warmer, the thread starts with `start`
+        :param config: Warmer configuration, see DEFAULT_WARMER_CONFIG
+        """
+        self.config = {**DEFAULT_WARMER_CONFIG, **(config or {})}
+        self._worker = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.warm_topics = set()
+        self.last_run_at = None
+        self.runs = 0
+        self.prefetched = 0
+        self.failures = 0
+        self.searches = 0
+        self.warm_hits = 0
+        self.last_report = {}
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, daemon=True, name='cache-warmer')
+                self._worker.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join()
+
+    def _run(self) -> None:
+        try:
+            while True:
+                try:
+                    self.warm()
+                except Exception as ex:
+                    self.failures += 1
+                    logger.error(f"Exception raised while warming the cache. exception:: {ex}")
+                if self._stop.wait(self.config['INTERVAL']):
+                    break
+        finally:
+            connection.close()
+
+    def _cold_topics(self, topics: list, cache) -> list:
+        """
+            Returns the topics a request would fetch from WIKI
+        """
+        config = get_term_store_config()
+        if config['ENABLED']:
+            fresh_after = timezone.now() - timedelta(seconds=config['REVALIDATE_AFTER'])
+            warm = set(ArticleTermFrequency.objects.filter(topic__in=topics, scope=SCOPE_INTRO,
+                                                           checked_at__gte=fresh_after)
+                       .values_list('topic', flat=True))
+        elif cache is not None:
+            warm = {topic for topic in topics if cache.is_fresh(topic)}
+        else:
+            return []
+        return [topic for topic in topics if topic not in warm]
+
+    def _prefetch(self, topics: list, cache, budget: RateBudget) -> tuple:
+        """
+            Fetches the lead sections of the topics in batched queries, caches them and stores their terms
+        :return: Tuple of the prefetched topics and the number of topics left for lack of budget
+        """
+        store_terms = get_term_store_config()['ENABLED']
+        prefetched = []
+        for start in range(0, len(topics), WIKI_MAX_TITLES_PER_QUERY):
+            chunk = topics[start:start + WIKI_MAX_TITLES_PER_QUERY]
+            if not budget.acquire():
+                return prefetched, len(topics) - start
+            try:
+                pages = WikiBatchAnalysisUtil.fetch_wikipedia_articles(chunk)
+            except Exception as ex:
+                self.failures += 1
+                logger.error(f"Exception raised while prefetching the articles. titles:: {chunk}  exception:: {ex}")
+                continue
+            for topic in chunk:
+                util_obj = WikiAnalysisUtil(topic)
+                try:
+                    article = util_obj._extract_article({topic: pages[topic]} if topic in pages else {})
+                except ValueError:
+                    continue
+                if cache is not None:
+                    cache.set(topic, article)
+                if store_terms:
+                    util_obj._store_terms(util_obj._count_text_terms(article.text), article.revision_id)
+                prefetched.append(topic)
+        return prefetched, 0
+
+    def _warm_hits(self, now) -> tuple:
+        """
+            Counts the searches saved since the previous run, and those of topics it left warm
+        """
+        if self.last_run_at is None:
+            return 0, 0
+        searches = SearchResult.objects.filter(created_at__gt=self.last_run_at, created_at__lte=now)
+        return searches.count(), searches.filter(topic__in=self.warm_topics).count() if self.warm_topics else 0
+
+    def warm(self) -> dict:
+        """
+            Ranks the topics by recent searches and prefetches the cold ones among the TOP_K
+        :return: dict report of the run
+        """
+        now = timezone.now()
+        searches, warm_hits = self._warm_hits(now)
+        ranked = [topic for topic, _ in popular_topics(now - timedelta(seconds=self.config['WINDOW']),
+                                                       self.config['TOP_K'])]
+        cache = get_article_cache()
+        cold = self._cold_topics(ranked, cache)
+        budget = RateBudget(self.config['REQUESTS_PER_SECOND'], self.config['MAX_REQUESTS'], self._stop)
+        prefetched, skipped = self._prefetch(cold, cache, budget)
+        cold_left = set(cold).difference(prefetched)
+
+        report = dict(ranked=len(ranked), already_warm=len(ranked) - len(cold), prefetched=len(prefetched),
+                      skipped=skipped, requests=budget.calls, searches=searches, warm_hits=warm_hits,
+                      warm_hit_ratio=round(warm_hits / searches, 4) if searches else None)
+        with self._lock:
+            self.warm_topics = {topic for topic in ranked if topic not in cold_left}
+            self.last_run_at = now
+            self.runs += 1
+            self.prefetched += len(prefetched)
+            self.searches += searches
+            self.warm_hits += warm_hits
+            self.last_report = report
+        return report
+
+    def stats(self) -> dict:
+        """
+            Returns the run counters and the warm hit ratio over every run
+        """
+        return dict(runs=self.runs, warm_topics=len(self.warm_topics), prefetched=self.prefetched,
+                    failures=self.failures, searches=self.searches, warm_hits=self.warm_hits,
+                    warm_hit_ratio=self.warm_hits / self.searches if self.searches else 0.0)
+
+
+_cache_warmer = None
+_cache_warmer_lock = threading.Lock()
+
+
+def get_cache_warmer() -> Optional[CacheWarmer]:
+    """
+        Returns the process wide warmer built from `settings.WIKI_WARMER`, None if it is disabled
+    """
+    global _cache_warmer
+    config = get_warmer_config()
+    if not config['ENABLED']:
+        return None
+    if _cache_warmer is None:
+        with _cache_warmer_lock:
+            if _cache_warmer is None:
+                _cache_warmer = CacheWarmer(config)
+                atexit.register(_cache_warmer.stop)
+    return _cache_warmer
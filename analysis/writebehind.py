@@ -0,0 +1,224 @@
+import time
+import queue
+import atexit
+import threading
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from .models import SearchResult
+from .rollups import save_search_results
+from wikipedia_analysis.loggers import logging
+
+
+logger = logging.getLogger("wiki_analysis")
+
+MODE_FIRE_AND_FORGET = 'fire_and_forget'
+MODE_WAIT_FOR_FLUSH = 'wait_for_flush'
+
+DEFAULT_WRITE_BEHIND_CONFIG = {
+    'ENABLED': False,
+    'MODE': MODE_FIRE_AND_FORGET,
+    'MAX_QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'PUT_TIMEOUT': 1.0,
+}
+
+
+class _Pending:
+    """
+        A model instance waiting in the queue, flushed is set once it is written (or failed to be)
+    """
+    __slots__ = ('instance', 'flushed', 'error')
+
+    def __init__(self, instance) -> None:
+        self.instance = instance
+        self.flushed = threading.Event()
+        self.error = None
+
+
+class WriteBehindQueue:
+    """
+        Bounded in-process buffer of model instances written by a background thread with `bulk_create`,
+        once BATCH_SIZE instances are queued or FLUSH_INTERVAL seconds after the first one, whichever comes first.
+
+        Requests no longer wait on an INSERT each: with MODE_FIRE_AND_FORGET `save` returns as soon as the
+        instance is queued, with MODE_WAIT_FOR_FLUSH it returns once the batch holding it is committed, which
+        still turns concurrent INSERTs into one transaction. When the queue is full `save` blocks up to
+        PUT_TIMEOUT seconds (backpressure) and then writes the instance itself. The queue is drained on shutdown.
+    """
+
+    def __init__(self, model, config: Optional[dict] = None,
+                 writer: Optional[Callable[[list], object]] = None) -> None:
+        """
+            Constructor to initialize the queue, the worker starts on the first save
+        :param model: Model class of the queued instances
+        :param config: Queue configuration, see DEFAULT_WRITE_BEHIND_CONFIG
+        :param writer: Callable saving a list of instances, `model.objects.bulk_create` by default
+        """
+        self.model = model
+        self.writer = writer or model.objects.bulk_create
+        self.config = {**DEFAULT_WRITE_BEHIND_CONFIG, **(config or {})}
+        self._queue = queue.Queue(maxsize=self.config['MAX_QUEUE_SIZE'])
+        self._worker = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.flushed = 0
+        self.failed = 0
+        self.flushes = 0
+        self.inline_saves = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping = False
+                self._worker = threading.Thread(target=self._run, daemon=True, name='write-behind')
+                self._worker.start()
+
+    def save(self, instance) -> None:
+        """
+            Queues the instance to be written, waiting for the write in MODE_WAIT_FOR_FLUSH
+        :param instance: Unsaved model instance
+        :raises:
+            Whatever the write raised, in MODE_WAIT_FOR_FLUSH
+        """
+        if self._stopping:
+            self.writer([instance])
+            return
+        self.start()
+        pending = _Pending(instance)
+        try:
+            self._queue.put(pending, timeout=self.config['PUT_TIMEOUT'])
+        except queue.Full:
+            logger.error(f"Write behind queue is full, saving inline. depth:: {self._queue.qsize()}")
+            with self._lock:
+                self.inline_saves += 1
+            self.writer([instance])
+            return
+        with self._lock:
+            self.enqueued += 1
+        if self.config['MODE'] == MODE_WAIT_FOR_FLUSH:
+            pending.flushed.wait()
+            if pending.error is not None:
+                raise pending.error
+
+    def _next_batch(self) -> list:
+        """
+            Waits for the first instance, then collects more until the batch is full or the interval is over
+        """
+        first = self._queue.get()
+        batch = [first]
+        if first is None:
+            return batch
+        deadline = time.monotonic() + self.config['FLUSH_INTERVAL']
+        while len(batch) < self.config['BATCH_SIZE']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is None:
+                break
+        return batch
+
+    def _flush(self, batch: list) -> None:
+        start = time.perf_counter()
+        error = None
+        try:
+            self.writer([pending.instance for pending in batch])
+        except Exception as ex:
+            error = ex
+            logger.error(f"Exception raised while flushing the write behind queue. size:: {len(batch)}  "
+                         f"exception:: {ex}")
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.flushes += 1
+            if error is None:
+                self.flushed += len(batch)
+            else:
+                self.failed += len(batch)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            self.total_flush_seconds += elapsed
+        for pending in batch:
+            pending.error = error
+            pending.flushed.set()
+
+    def _run(self) -> None:
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = batch[-1] is None
+                batch = [pending for pending in batch if pending is not None]
+                if batch:
+                    self._flush(batch)
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+                if stop:
+                    break
+        finally:
+            connection.close()
+
+    def flush(self) -> None:
+        """
+            Waits until every queued instance is written
+        """
+        self._queue.join()
+
+    def stop(self) -> None:
+        """
+            Writes the queued instances and stops the worker, later saves are written inline
+        """
+        self._stopping = True
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            self._queue.put(None)
+            worker.join()
+        # Saves that raced with the stop
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is not None:
+                self._flush([pending])
+            self._queue.task_done()
+
+    def stats(self) -> dict:
+        """
+            Returns the queue depth, counters and flush latencies in seconds
+        """
+        return dict(depth=self._queue.qsize(), enqueued=self.enqueued, flushed=self.flushed, failed=self.failed,
+                    inline_saves=self.inline_saves, flushes=self.flushes,
+                    last_flush_seconds=self.last_flush_seconds, max_flush_seconds=self.max_flush_seconds,
+                    avg_flush_seconds=self.total_flush_seconds / self.flushes if self.flushes else 0.0)
+
+
+_write_behind_queue = None
+_write_behind_lock = threading.Lock()
+
+
+def get_write_behind_queue() -> Optional[WriteBehindQueue]:
+    """
+        Returns the process wide SearchResult write behind queue built from `settings.WIKI_WRITE_BEHIND`,
+        None if it is disabled
+    """
+    global _write_behind_queue
+    config = {**DEFAULT_WRITE_BEHIND_CONFIG, **getattr(settings, 'WIKI_WRITE_BEHIND', {})}
+    if not config['ENABLED']:
+        return None
+    if _write_behind_queue is None:
+        with _write_behind_lock:
+            if _write_behind_queue is None:
+                _write_behind_queue = WriteBehindQueue(SearchResult, config, writer=save_search_results)
+                atexit.register(_write_behind_queue.stop)
+    return _write_behind_queue
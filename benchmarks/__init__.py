@@ -0,0 +1,4 @@
+"""
+    Benchmarks of the analysis service, run from the project directory, e.g.
+    `python -m benchmarks.request_throughput`
+"""
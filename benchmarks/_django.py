@@ -0,0 +1,48 @@
+import os
+import tempfile
+
+
+def setup_django(database: bool = True) -> None:
+    """
+        Configures Django for a benchmark run, optionally on a throw away SQLite database with the migrations
+        applied so that benchmarks never touch db.sqlite3
+    :param database: if a benchmark database is to be created
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wikipedia_analysis.settings')
+    import django
+    from django.conf import settings
+    django.setup()
+    # Benchmarks measure the request path, not the article cache or the term frequency store
+    settings.WIKI_ARTICLE_CACHE = {'ENABLED': False}
+    settings.WIKI_TERM_STORE = {'ENABLED': False}
+    if database:
+        from django.db import connection
+        from django.test.utils import setup_test_environment
+        setup_test_environment()
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        name = connection.creation.create_test_db(verbosity=0)
+        _point_mirrors_at(name)
+
+
+def _point_mirrors_at(name: str) -> None:
+    """
+        Points the aliases mirroring default (the production profile read only alias) at the benchmark database
+    """
+    from django.db import connections
+    from analysis.db import is_read_only
+    for alias in connections:
+        mirror = connections[alias]
+        if mirror.settings_dict['TEST'].get('MIRROR') == 'default':
+            read_only = is_read_only(mirror)
+            mirror.close()
+            mirror.settings_dict['NAME'] = f"file:{name}?mode=ro" if read_only else name
+
+
+def use_stub_server(url: str) -> None:
+    """
+        Points the WIKI fetches at the given stub server url
+    """
+    from analysis import utils
+    utils.WIKI_TOPIC_SEARCH_URL = f"{url}?action=query&prop=extracts|info&format=json&exintro="
+    utils.WIKI_FULL_ARTICLE_URL = f"{url}?action=query&prop=extracts|info&format=json&explaintext=1"
+    utils.WIKI_REVISION_URL = f"{url}?action=query&prop=info&format=json"
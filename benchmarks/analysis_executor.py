@@ -0,0 +1,65 @@
+"""
+    Multi core scaling of the analysis executor: throughput of counting one large text in the calling thread
+    against PooledWordCounter with 1, 2, 4... worker processes, and the latency of small analyses running in
+    another thread meanwhile (what a hot request does to the rest of the worker).
+
+    python -m benchmarks.analysis_executor --size 20000000 --workers 1 2 4 8
+"""
+import os
+import time
+import argparse
+import threading
+
+from benchmarks.tokenizer import generate_text
+
+
+def small_request_latencies(stop: threading.Event, text: str, latencies: list) -> None:
+    from analysis.tokenizer import WordCounter
+    while not stop.is_set():
+        start = time.perf_counter()
+        WordCounter().feed(text).most_common(10)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.005)
+
+
+def run(name: str, new_counter, text: str, small_text: str) -> None:
+    stop = threading.Event()
+    latencies = []
+    thread = threading.Thread(target=small_request_latencies, args=(stop, small_text, latencies))
+    thread.start()
+    start = time.perf_counter()
+    new_counter().feed(text).close()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    print(f"{name:>12}: {elapsed * 1000:8.1f} ms, {len(text) / elapsed / 1e6:6.1f} MB/s, "
+          f"small analyses meanwhile {len(latencies):>4}, p99 {p99 * 1000:6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=20_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--block-size', type=int, default=1024 * 1024)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wikipedia_analysis.settings')
+    from analysis.tokenizer import WordCounter
+    from analysis.executor import AnalysisExecutor, PooledWordCounter
+    text = generate_text(args.size)
+    small_text = generate_text(10_000, seed=1)
+    print(f"{os.cpu_count()} cores, {args.size} chars")
+    run('in thread', WordCounter, text, small_text)
+    for workers in args.workers:
+        executor = AnalysisExecutor({'MAX_WORKERS': workers, 'BLOCK_SIZE': args.block_size})
+        executor.warm()
+        try:
+            run(f'{workers} workers', lambda: PooledWordCounter(executor), text, small_text)
+        finally:
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
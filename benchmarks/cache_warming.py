@@ -0,0 +1,73 @@
+"""
+    Effect of the cache warmer per TOP_K against a local stub of the Wikipedia API: the search history is seeded
+    with topics of Zipf like popularity, the warmer prefetches the top K of them, then requests drawn from the
+    same popularity are replayed through `/word_frequency/`. Reports the queries spent prefetching, the warm hit
+    ratio of the replay and its latencies, K=0 being the cold baseline.
+
+    python -m benchmarks.cache_warming --topics 2000 --history 20000 --requests 500 --top 0 50 200 800
+"""
+import time
+import random
+import argparse
+import statistics
+from itertools import accumulate
+
+from benchmarks._django import setup_django, use_stub_server
+from benchmarks.stub_server import StubWikiServer
+from benchmarks.html_extraction import generate_html
+
+
+def topic_sampler(topics: int, seed: int):
+    rng = random.Random(seed)
+    cum_weights = list(accumulate(1 / rank for rank in range(1, topics + 1)))
+    return lambda k: [f"topic {index}" for index in rng.choices(range(topics), cum_weights=cum_weights, k=k)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--topics', type=int, default=2000, help='Distinct topics searched')
+    parser.add_argument('--history', type=int, default=20_000, help='Seeded searches the topics are ranked on')
+    parser.add_argument('--requests', type=int, default=500, help='Replayed requests per K')
+    parser.add_argument('--top', type=int, nargs='+', default=[0, 50, 200, 800], help='TOP_K values')
+    parser.add_argument('--size', type=int, default=5_000, help='Characters of HTML per lead section')
+    parser.add_argument('--latency', type=float, default=0.05, help='Injected upstream latency in seconds')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    from analysis.models import SearchResult, ArticleTermFrequency
+    from analysis.warmer import CacheWarmer
+    settings.WIKI_TERM_STORE = {'ENABLED': True}
+    SearchResult.objects.bulk_create(SearchResult(topic=topic, word_frequency=[])
+                                     for topic in topic_sampler(args.topics, seed=1)(args.history))
+    client = Client()
+
+    with StubWikiServer(extract=generate_html(args.size), latency=args.latency) as server:
+        use_stub_server(server.url)
+        for top in args.top:
+            ArticleTermFrequency.objects.all().delete()
+            warmer = CacheWarmer({'TOP_K': top, 'REQUESTS_PER_SECOND': 0, 'MAX_REQUESTS': None})
+            requests = server.requests
+            start = time.perf_counter()
+            warmer.warm()
+            warm_seconds = time.perf_counter() - start
+            warm_requests = server.requests - requests
+
+            latencies = []
+            requests = server.requests
+            for topic in topic_sampler(args.topics, seed=2)(args.requests):
+                start = time.perf_counter()
+                response = client.get('/api/word_frequency/', {'topic': topic})
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.content
+            cold = server.requests - requests
+            report = warmer.warm() if top else {'warm_hit_ratio': 0.0}
+            print(f"K={top:<5} prefetch {warm_requests:4} queries {warm_seconds:6.2f}s  "
+                  f"warm hits {report['warm_hit_ratio']:6.1%}  upstream queries {cold:4}  "
+                  f"mean {statistics.mean(latencies) * 1000:6.1f} ms  "
+                  f"p95 {sorted(latencies)[int(len(latencies) * 0.95)] * 1000:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+    Cold start and per request fixed overhead of the service, the costs a newly scaled worker pays. Each run starts
+    a fresh interpreter that configures Django, runs the system checks (as `manage.py check` and `runserver` do),
+    builds the WSGI application and serves a first `/word_frequency/` request against a local stub of the
+    Wikipedia API. It then serves `--requests` more, each for a new topic with a tiny lead section and no
+    injected latency, so their time is the fixed overhead of the request path. The settings are the project
+    ones, on a throw away database.
+
+    Reports the median of `--runs` runs per phase, and which heavy modules were imported before the first request.
+
+    python -m benchmarks.cold_start --runs 5 --requests 200
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# Modules that only some request paths need, reported when imported before the first request
+HEAVY_MODULES = ('requests', 'httpx', 'urllib3', 'multiprocessing', 'concurrent.futures.process')
+PHASES = ('interpreter', 'setup', 'check', 'wsgi', 'first_request')
+EXTRACT = "<p>Database sharding splits a dataset across databases.</p>"
+
+
+def child(database: str, url: str, requests: int) -> None:
+    """
+        Cold starts the service in this process, printing the phase timings as a JSON line once the first request
+        is served, then the per request latencies as a second one
+    """
+    timings = {}
+    start = time.perf_counter()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wikipedia_analysis.settings')
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+    django.setup()
+    timings['setup'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from django.core.management import call_command
+    # Keep the stdout of this process for the timings
+    call_command('check', stdout=io.StringIO())
+    timings['check'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+    from django.test import Client
+    get_wsgi_application()
+    # Allowed by DEBUG without touching ALLOWED_HOSTS
+    client = Client(HTTP_HOST='localhost')
+    timings['wsgi'] = time.perf_counter() - start
+
+    from benchmarks._django import use_stub_server, _point_mirrors_at
+    _point_mirrors_at(database)
+    imported = [name for name in HEAVY_MODULES if name in sys.modules]
+    use_stub_server(url)
+    start = time.perf_counter()
+    response = client.get('/api/word_frequency/', {'topic': 'first'})
+    timings['first_request'] = time.perf_counter() - start
+    assert response.status_code == 200, response.content
+    print(json.dumps(dict(timings=timings, imported=imported)), flush=True)
+
+    latencies = []
+    for index in range(requests):
+        start = time.perf_counter()
+        response = client.get('/api/word_frequency/', {'topic': f"topic {index}"})
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content
+    print(json.dumps(dict(latencies=latencies)), flush=True)
+
+
+def cold_start(database: str, url: str, requests: int) -> dict:
+    """
+        Runs the service in a fresh interpreter
+    :return: dict of the seconds per phase, the per request latencies and the heavy modules imported before the
+        first request
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.cold_start', '--child', '--database', database,
+                                '--url', url, '--requests', str(requests)],
+                               stdout=subprocess.PIPE, text=True, cwd=os.getcwd())
+    first = process.stdout.readline()
+    served = time.perf_counter() - start
+    rest = process.stdout.read()
+    if process.wait() or not first:
+        raise RuntimeError(f"Cold start run failed with status {process.returncode}")
+    run = json.loads(first)
+    timings = run['timings']
+    # Interpreter start up and the imports before django.setup
+    timings['interpreter'] = served - sum(timings.values())
+    return dict(total=served, timings=timings, latencies=json.loads(rest)['latencies'], imported=run['imported'])
+
+
+def measure(runs: int, requests: int) -> dict:
+    """
+        Cold starts the service `runs` times against a stub server, on a throw away migrated database. Django must
+        be set up with benchmarks._django.setup_django
+    :return: dict of the median seconds to the first request served and per phase, the median per request
+        latency over every run and the heavy modules imported before the first request
+    """
+    from django.db import connection
+    from benchmarks.stub_server import StubWikiServer
+    database = connection.settings_dict['NAME']
+    with StubWikiServer(extract=EXTRACT) as server:
+        results = [cold_start(database, server.url, requests) for _ in range(runs)]
+    return dict(total=statistics.median(result['total'] for result in results),
+                phases={phase: statistics.median(result['timings'][phase] for result in results)
+                        for phase in PHASES},
+                per_request=statistics.median(latency for result in results for latency in result['latencies']),
+                imported=results[-1]['imported'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts')
+    parser.add_argument('--requests', type=int, default=200, help='Requests served after the first, per run')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.database, args.url, args.requests)
+        return
+
+    from benchmarks._django import setup_django
+    setup_django()
+    report = measure(args.runs, args.requests)
+    print(f"first request served after {report['total'] * 1000:7.1f} ms  "
+          + '  '.join(f"{phase} {seconds * 1000:.1f}" for phase, seconds in report['phases'].items()))
+    print(f"per request fixed overhead {report['per_request'] * 1000:7.2f} ms")
+    print(f"imported before the first request: {', '.join(report['imported']) or 'none of'} "
+          f"{'' if report['imported'] else ', '.join(HEAVY_MODULES)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+    Latency of `/search_history/` pages on a seeded table: rendered, answered 304 to If-None-Match and served from
+    the rendered response cache.
+
+    python -m benchmarks.conditional_get --rows 20000 --page-size 50 --requests 200
+"""
+import time
+import argparse
+
+from benchmarks._django import setup_django
+from benchmarks.suite import seed_history
+
+
+def timed_get(client, params: dict, requests: int, **headers) -> tuple:
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/api/search_history/', params, **headers)
+    return (time.perf_counter() - start) / requests, response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    seed_history(args.rows)
+    client = Client()
+    params = {'page': 3, 'page_size': args.page_size}
+    etag = client.get('/api/search_history/', params)['ETag']
+    cases = (('rendered', {}, {}), ('if-none-match', {}, {'HTTP_IF_NONE_MATCH': etag}),
+             ('response cache', {'RESPONSE_CACHE_ALIAS': 'default'}, {}))
+    for name, config, headers in cases:
+        settings.WIKI_HTTP_CACHE = config
+        seconds, status = timed_get(client, params, args.requests, **headers)
+        print(f"{name:>15}: {seconds * 1000:6.2f}ms per request ({status})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+    Throughput of `manage.py analyse_dump` on a generated MediaWiki XML dump (bz2), per number of workers.
+
+    python -m benchmarks.dump_analysis --pages 2000 --page-size 20000 --workers 1 2 4
+"""
+import os
+import bz2
+import time
+import tempfile
+import argparse
+from io import StringIO
+from xml.sax.saxutils import escape
+
+from benchmarks._django import setup_django
+from benchmarks.tokenizer import generate_text
+
+
+def write_dump(path: str, pages: int, page_size: int) -> None:
+    with bz2.open(path, 'wt', encoding='utf-8') as dump:
+        dump.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">\n')
+        for index in range(pages):
+            words = generate_text(page_size, seed=index).split(' ')
+            # Some wikitext around the prose
+            text = (f"{{{{Infobox|name=Page {index}}}}}\n'''Page {index}''' is a [[page|{words[0]}]]. "
+                    f"{' '.join(words[1:])}<ref>{{{{cite web|url=https://example.org/{index}}}}}</ref>\n"
+                    f"[[Category:Benchmark]]")
+            dump.write(f"<page><title>Page {index}</title><ns>0</ns><id>{index}</id><revision><id>{index}</id>"
+                       f"<text xml:space=\"preserve\">{escape(text)}</text></revision></page>\n")
+        dump.write('</mediawiki>\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=20_000, help="characters of prose per page")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--store', default='both')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    path = os.path.join(tempfile.mkdtemp(), 'bench-pages-articles.xml.bz2')
+    write_dump(path, args.pages, args.page_size)
+    print(f"{args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB compressed, {os.cpu_count()} cores")
+    for workers in args.workers:
+        output = StringIO()
+        start = time.perf_counter()
+        call_command('analyse_dump', path, workers=workers, store=args.store, restart=True, stdout=output)
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>2} workers: {elapsed:7.2f}s, {args.pages / elapsed:8.1f} pages/s, "
+              f"{args.pages * args.page_size / elapsed / 1e6:6.2f}M characters/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+    Peak memory and time of a whole article analysis, materialising the response (decode the JSON, strip the
+    HTML, tokenize the whole string) against the streaming `scope=full` path of WikiAnalysisUtil.
+
+    python -m benchmarks.full_article --sizes 50000 500000 5000000
+"""
+import time
+import argparse
+import tracemalloc
+
+import requests
+
+from benchmarks._django import setup_django, use_stub_server
+from benchmarks.stub_server import stub_server_process
+from benchmarks.tokenizer import generate_text, legacy_word_frequency_analysis
+from benchmarks.html_extraction import legacy_remove_html_tags
+
+
+def materialised(url: str) -> list:
+    data = requests.get(url, params={'titles': 'benchmark'}).json()
+    text = list(data['query']['pages'].values())[0]['extract']
+    return legacy_word_frequency_analysis(legacy_remove_html_tags(text))
+
+
+def streaming(url: str) -> list:
+    from analysis.utils import WikiAnalysisUtil
+    return WikiAnalysisUtil('benchmark', skip_common_words=True, skip_numbers=True,
+                            scope='full').run_analysis()['word_frequency']
+
+
+def measure(function, url: str) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(url)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50_000, 500_000, 5_000_000])
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    from analysis import utils
+    for size in args.sizes:
+        with stub_server_process(full_extract=generate_text(size)) as url:
+            use_stub_server(url)
+            results = []
+            for name, function in (('materialised', materialised), ('streaming', streaming)):
+                result, elapsed, peak = measure(function, utils.WIKI_FULL_ARTICLE_URL)
+                results.append(result)
+                print(f"{name:>12} {size:>9} chars: {elapsed * 1000:8.1f} ms, peak {peak / 1024:9.1f} KiB")
+            assert results[0] == results[1]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+    Time and peak Python memory of exporting a seeded search history: the streamed NDJSON export of
+    `/search_history/export/` (plain and gzip) against walking `/search_history/` with cursor pagination, and
+    against loading every row into a single JSON document.
+
+    python -m benchmarks.history_export --rows 200000 --page-size 1000
+"""
+import json
+import time
+import argparse
+import tracemalloc
+
+from benchmarks._django import setup_django
+from benchmarks.history_pagination import seed
+
+
+def measure(function) -> tuple:
+    """
+        Runs the function once
+    :return: Tuple of the elapsed seconds, the peak traced memory in bytes and the function result
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--page-size', type=int, default=1000, help="Page size of the paginated walk")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from analysis.models import SearchResult
+    seed(args.rows)
+    client = Client()
+
+    def export(**headers):
+        response = client.get('/api/search_history/export/', **headers)
+        # Blocks are dropped as they are read, like a server writing them to the socket
+        return sum(len(block) for block in response.streaming_content)
+
+    def paginate():
+        size, params = 0, {'pagination': 'cursor', 'page_size': args.page_size}
+        while True:
+            response = client.get('/api/search_history/', params)
+            size += len(response.content)
+            cursor = response.json()['pagination']['next_cursor']
+            if cursor is None:
+                return size
+            params = {'cursor': cursor, 'page_size': args.page_size}
+
+    def load_all():
+        rows = [{**row, 'word_frequency': row['word_frequency'].tolist()} for row in
+                SearchResult.objects.order_by('id').values('id', 'topic', 'word_frequency', 'created_at')]
+        return len(json.dumps(rows, default=str).encode())
+
+    cases = [
+        ('streamed export', export),
+        ('streamed export, gzip', lambda: export(HTTP_ACCEPT_ENCODING='gzip')),
+        (f'cursor pages of {args.page_size}', paginate),
+        ('single JSON document', load_all),
+    ]
+    for name, function in cases:
+        elapsed, peak, size = measure(function)
+        print(f"{name:>28}: {elapsed:7.2f} s  {args.rows / elapsed:9.0f} rows/s  peak {peak / 2 ** 20:8.1f} MB  "
+              f"{size / 2 ** 20:7.1f} MB sent")
+
+
+if __name__ == '__main__':
+    main()
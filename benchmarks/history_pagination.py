@@ -0,0 +1,68 @@
+"""
+    Latency of `/search_history/` pages on a seeded table, page number pagination (COUNT(*) plus OFFSET) against
+    cursor pagination, with and without the `word_frequency` column.
+
+    python -m benchmarks.history_pagination --rows 200000 --page-size 50
+"""
+import time
+import argparse
+
+from benchmarks._django import setup_django
+
+
+WORD_FREQUENCY = [[f"word{index}", 100 - index] for index in range(10)]
+
+
+def seed(rows: int) -> None:
+    from analysis.models import SearchResult
+    batch = 10_000
+    for start in range(0, rows, batch):
+        SearchResult.objects.bulk_create(SearchResult(topic=f"topic {index % 1000}", word_frequency=WORD_FREQUENCY)
+                                         for index in range(start, min(rows, start + batch)))
+
+
+def timed_get(client, params: dict, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get('/api/search_history/', params)
+        best = min(best, time.perf_counter() - start)
+        assert response.status_code == 200, response.content
+    return best
+
+
+def cursor_at(depth: int) -> str:
+    from analysis.models import SearchResult
+    from analysis.pagination import encode_cursor
+    row = SearchResult.objects.order_by('-created_at', '-id').values('created_at', 'id')[depth - 1]
+    return encode_cursor(row['created_at'], row['id'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    seed(args.rows)
+    client = Client()
+    last_page = args.rows // args.page_size
+    deep = (last_page - 1) * args.page_size
+    cases = [
+        ('page 1', {'page': 1}),
+        (f'page {last_page}', {'page': last_page}),
+        ('cursor first page', {'pagination': 'cursor'}),
+        (f'cursor after row {deep}', {'cursor': cursor_at(deep)}),
+        (f'cursor after row {deep}, no word_frequency', {'cursor': cursor_at(deep), 'fields': 'topic,created_at'}),
+        ('cursor first page, cached total', {'pagination': 'cursor', 'include_total': 'true'}),
+    ]
+    for name, params in cases:
+        elapsed = timed_get(client, {'page_size': args.page_size, **params}, args.repeat)
+        print(f"{name:>45}: {elapsed * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
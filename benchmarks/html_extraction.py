@@ -0,0 +1,73 @@
+"""
+    Throughput of the HTML stripping stage, `analysis.extraction.strip_html` against the previous per call
+    compiled `'<.*?>'` substitution of `WikiAnalysisUtil.remove_html_tags`, on generated extracts shaped like the
+    WIKI ones (paragraphs, inline links and formatting, references, entities and a <style> block).
+
+    python -m benchmarks.html_extraction --sizes 100000 1000000 10000000
+"""
+import re
+import time
+import random
+import argparse
+
+from analysis.extraction import strip_html
+from benchmarks.tokenizer import generate_text
+
+
+def legacy_remove_html_tags(text: str) -> str:
+    """
+        The implementation that strip_html replaced, kept for comparison
+    """
+    clean = re.compile('<.*?>')
+    return re.sub(clean, '', text)
+
+
+def generate_html(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = generate_text(size, seed).split(' ')
+    parts = ['<style data-mw-deduplicate="TemplateStyles:r1">.mw-parser-output .hatnote{font-style:italic}</style>']
+    length = len(parts[0])
+    for index, word in enumerate(words):
+        roll = rng.random()
+        if roll < 0.05:
+            word = f'<a href="/wiki/{word}" title="{word}">{word}</a>'
+        elif roll < 0.08:
+            word = f'<b>{word}</b>'
+        elif roll < 0.09:
+            word = f'{word}&#160;&amp;'
+        elif roll < 0.095:
+            word = f'{word}<sup class="reference"><a href="#cite_note-{index}">[{index}]</a></sup>'
+        if index % 80 == 0:
+            word = f'</p>\n<p>{word}'
+        parts.append(word)
+        length += len(word) + 1
+        if length >= size:
+            break
+    return '<p>' + ' '.join(parts) + '</p>'
+
+
+def measure(function, text: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        html = generate_html(size)
+        megabytes = len(html.encode()) / 1e6
+        for name, function in (('legacy', legacy_remove_html_tags), ('strip_html', strip_html)):
+            elapsed = measure(function, html, args.repeat)
+            print(f"{name:>10} {len(html):>9} chars: {elapsed * 1000:8.2f} ms, {megabytes / elapsed:7.1f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+    Cost of the request instrumentation: a stage timer, and sequential `/word_frequency/` requests against a
+    local stub of the Wikipedia API with metrics disabled and enabled.
+
+    python -m benchmarks.metrics_overhead --requests 500 --timers 1000000
+"""
+import time
+import argparse
+
+from benchmarks._django import setup_django, use_stub_server
+from benchmarks.stub_server import StubWikiServer
+
+
+def time_timers(count: int) -> float:
+    from analysis.metrics import timed
+    start = time.perf_counter()
+    for _ in range(count):
+        with timed('bench'):
+            pass
+    return time.perf_counter() - start
+
+
+def time_requests(count: int) -> float:
+    from django.test import Client
+    client = Client()
+    start = time.perf_counter()
+    for index in range(count):
+        response = client.get('/api/word_frequency/', {'topic': f'topic {index % 50}'})
+        assert response.status_code == 200, response.content
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--timers', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from analysis.metrics import reset_metrics
+    with StubWikiServer(latency=0) as server:
+        use_stub_server(server.url)
+        time_requests(20)
+        for enabled in (False, True):
+            settings.WIKI_METRICS = {'ENABLED': enabled}
+            reset_metrics()
+            timer = time_timers(args.timers)
+            requests = time_requests(args.requests)
+            print(f"metrics {'enabled ' if enabled else 'disabled'}: timer {timer / args.timers * 1e9:6.0f}ns, "
+                  f"request {requests / args.requests * 1e3:6.2f}ms ({args.requests / requests:6.1f} requests/s)")
+
+
+if __name__ == '__main__':
+    main()
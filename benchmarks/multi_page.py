@@ -0,0 +1,61 @@
+"""
+    Analysing the N pages a topic resolves to against a local stub of the Wikipedia API: one
+    `/word_frequency/pages/` request (a single generator query, counts merged before one top words selection)
+    against a `/word_frequency/batch/` request for the same titles and against a `/word_frequency/` request per
+    page. Reports the upstream queries and the latency of each, with the analysis executor optionally enabled.
+
+    python -m benchmarks.multi_page --pages 5 10 20 --requests 20 --latency 0.05
+"""
+import time
+import argparse
+import statistics
+
+from benchmarks._django import setup_django, use_stub_server
+from benchmarks.stub_server import StubWikiServer
+from benchmarks.html_extraction import generate_html
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, nargs='+', default=[5, 10, 20], help='Pages per topic')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per case')
+    parser.add_argument('--size', type=int, default=20_000, help='Characters of HTML per lead section')
+    parser.add_argument('--latency', type=float, default=0.05, help='Injected upstream latency in seconds')
+    parser.add_argument('--executor', action='store_true', help='Count the pages on the analysis executor')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import Client
+    if args.executor:
+        settings.WIKI_ANALYSIS_EXECUTOR = {'ENABLED': True}
+        from analysis.executor import get_analysis_executor
+        get_analysis_executor().warm()
+    client = Client()
+
+    with StubWikiServer(extract=generate_html(args.size), latency=args.latency) as server:
+        use_stub_server(server.url)
+        for pages in args.pages:
+            titles = [f"database sharding {index + 1}" for index in range(pages)]
+            cases = [
+                ('pages', lambda: client.get('/api/word_frequency/pages/',
+                                             {'topic': 'database sharding', 'pages': pages})),
+                ('batch', lambda: client.post('/api/word_frequency/batch/', {'topics': titles},
+                                              content_type='application/json')),
+                ('per page', lambda: [client.get('/api/word_frequency/', {'topic': title}) for title in titles][-1]),
+            ]
+            for name, request in cases:
+                latencies = []
+                requests = server.requests
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    response = request()
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200, response.content
+                print(f"N={pages:<3} {name:>9}: upstream queries {(server.requests - requests) / args.requests:5.1f} "
+                      f"per topic  mean {statistics.mean(latencies) * 1000:7.1f} ms  "
+                      f"p95 {sorted(latencies)[int(len(latencies) * 0.95)] * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+    Concurrent request throughput of the sync (`/word_frequency/`, threaded WSGI handler) and async
+    (`/word_frequency/async/`, ASGI handler) paths against a local stub of the Wikipedia API.
+
+    The sync path is limited to `--threads` concurrent requests like a threaded WSGI worker, the async path
+    serves up to `--concurrency` requests on one event loop.
+
+    python -m benchmarks.request_throughput --requests 200 --concurrency 50 --threads 10 --latency 0.05
+"""
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks._django import setup_django, use_stub_server
+from benchmarks.stub_server import StubWikiServer
+
+
+def run_sync(total: int, concurrency: int) -> float:
+    from django.test import Client
+
+    def call(index):
+        response = Client().get('/api/word_frequency/', {'topic': f'sync topic {index}'})
+        assert response.status_code == 200, response.content
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, range(total)))
+    return time.perf_counter() - start
+
+
+def run_async(total: int, concurrency: int) -> float:
+    from django.test import AsyncClient
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        client = AsyncClient()
+
+        async def call(index):
+            async with semaphore:
+                response = await client.get('/api/word_frequency/async/', {'topic': f'async topic {index}'})
+                assert response.status_code == 200, response.content
+
+        start = time.perf_counter()
+        await asyncio.gather(*[call(index) for index in range(total)])
+        return time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=10, help='Worker threads of the sync path')
+    parser.add_argument('--latency', type=float, default=0.05, help='Injected upstream latency in seconds')
+    args = parser.parse_args()
+
+    setup_django()
+    with StubWikiServer(latency=args.latency) as server:
+        use_stub_server(server.url)
+        for name, runner, concurrency in (('sync', run_sync, args.threads),
+                                          ('async', run_async, args.concurrency)):
+            elapsed = runner(args.requests, concurrency)
+            print(f"{name:>5}: {args.requests} requests, concurrency {concurrency}, "
+                  f"{elapsed:.2f}s, {args.requests / elapsed:.1f} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+    Cost of keeping cached topics fresh against a local stub of the Wikipedia API: downloading every lead
+    section again, as a refresh did before, against the revision aware refresh of unchanged pages (batched
+    metadata only queries).
+
+    python -m benchmarks.revision_refresh --topics 500 --size 20000 --latency 0.02
+"""
+import time
+import argparse
+
+from benchmarks._django import setup_django, use_stub_server
+from benchmarks.stub_server import StubWikiServer
+from benchmarks.html_extraction import generate_html
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--size', type=int, default=20_000, help='Characters of HTML per lead section')
+    parser.add_argument('--latency', type=float, default=0.02, help='Injected upstream latency in seconds')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from analysis.cache import get_article_cache
+    from analysis.refresher import RevisionRefresher
+    settings.WIKI_ARTICLE_CACHE = {'ENABLED': True, 'MAX_ENTRIES': args.topics}
+    topics = [f"topic {index}" for index in range(args.topics)]
+    refresher = RevisionRefresher()
+
+    with StubWikiServer(extract=generate_html(args.size), latency=args.latency) as server:
+        use_stub_server(server.url)
+        for name, refresh in (('download every page', lambda: refresher._refetch_intros(topics, cache, {})),
+                              ('revision check', lambda: refresher.refresh(topics))):
+            cache = get_article_cache()
+            if not len(cache.local):
+                refresher._refetch_intros(topics, cache, {})
+            requests, sent = server.requests, server.bytes_sent
+            start = time.perf_counter()
+            refresh()
+            elapsed = time.perf_counter() - start
+            print(f"{name:>20}: {elapsed:6.2f}s, {server.requests - requests:4} requests, "
+                  f"{(server.bytes_sent - sent) / 1e6:7.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
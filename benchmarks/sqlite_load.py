@@ -0,0 +1,111 @@
+"""
+    Mixed read/write load on SQLite, the development profile (rollback journal, synchronous=FULL, one connection
+    per thread for reads and writes) against WIKI_DB_PROFILE=production (WAL, synchronous=NORMAL, mmap, busy
+    timeout, history reads on the read only alias). Every thread runs for --seconds, saving a SearchResult
+    (--write-ratio of the operations) or reading a `/search_history/` page, each profile in its own process.
+
+    python -m benchmarks.sqlite_load --threads 8 --seconds 10 --write-ratio 0.3
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+
+from benchmarks._django import setup_django
+
+
+PROFILES = ('development', 'production')
+WORD_FREQUENCY = [[f"word{index}", 100 - index] for index in range(10)]
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def worker(seconds: float, write_ratio: float, results: dict, lock: threading.Lock) -> None:
+    from django.db import connections, OperationalError
+    from django.test import Client
+    from analysis.models import SearchResult
+    client = Client()
+    rng = random.Random()
+    local = dict(read=[], write=[], errors=0)
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            write = rng.random() < write_ratio
+            start = time.perf_counter()
+            try:
+                if write:
+                    SearchResult.objects.create(topic=f"topic {rng.randrange(1000)}", word_frequency=WORD_FREQUENCY)
+                else:
+                    response = client.get('/api/search_history/', {'pagination': 'cursor', 'page_size': 20})
+                    if response.status_code != 200:
+                        raise OperationalError(response.status_code)
+            except OperationalError:
+                local['errors'] += 1
+                continue
+            local['write' if write else 'read'].append(time.perf_counter() - start)
+    finally:
+        connections.close_all()
+    with lock:
+        for key in ('read', 'write'):
+            results[key].extend(local[key])
+        results['errors'] += local['errors']
+
+
+def run(args) -> dict:
+    setup_django()
+    from analysis.models import SearchResult
+    SearchResult.objects.bulk_create(SearchResult(topic=f"topic {index % 1000}", word_frequency=WORD_FREQUENCY)
+                                     for index in range(args.rows))
+    results = dict(read=[], write=[], errors=0)
+    lock = threading.Lock()
+    threads = [threading.Thread(target=worker, args=(args.seconds, args.write_ratio, results, lock))
+               for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(
+        reads_per_second=len(results['read']) / args.seconds,
+        writes_per_second=len(results['write']) / args.seconds,
+        read_p99_ms=percentile(results['read'], 0.99) * 1000,
+        write_p99_ms=percentile(results['write'], 0.99) * 1000,
+        errors=results['errors'],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--rows', type=int, default=10_000, help="rows seeded before the run")
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run(args)))
+        return
+
+    print(f"{args.threads} threads, {args.seconds:.0f}s, {args.write_ratio:.0%} writes")
+    for profile in PROFILES:
+        # The profile is read by the settings module, so each one runs in a fresh process
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.sqlite_load', *sys.argv[1:], '--profile', profile],
+                                env={**os.environ, 'WIKI_DB_PROFILE': profile}, check=True,
+                                capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:<12} reads/s {result['reads_per_second']:>8.0f}  writes/s {result['writes_per_second']:>7.0f}  "
+              f"read p99 {result['read_p99_ms']:>7.1f}ms  write p99 {result['write_p99_ms']:>7.1f}ms  "
+              f"errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
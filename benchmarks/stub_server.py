@@ -0,0 +1,129 @@
+import json
+import time
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+DEFAULT_EXTRACT = "<p>Database sharding is a method of splitting and storing a single logical dataset in " \
+                  "multiple databases. By distributing the data among multiple machines, a cluster of " \
+                  "database systems can store a larger dataset and handle additional requests.</p>" * 20
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under benchmark concurrency
+    request_queue_size = 1024
+
+
+class StubWikiServer:
+    """
+        Local stand-in for the MediaWiki query API, answering every `prop=extracts` query with the same extract
+        after an optional injected latency. Queries without `exintro` get `full_extract`. With `extracts`, pages
+        whose title starts with one of its keys (e.g. `large 12` for `large`) get that extract instead. Every page
+        is at `revision_id`, metadata only queries (`prop=info`) get no extract. Generator queries (`generator=search`
+        or `categorymembers`) get as many pages as their limit asks, titled after the search or category.
+    """
+
+    def __init__(self, extract: str = DEFAULT_EXTRACT, latency: float = 0.0, host: str = '127.0.0.1',
+                 port: int = 0, full_extract: str = None, extracts: dict = None, revision_id: int = 1) -> None:
+        """
+            Constructor to initialize the server, port 0 picks a free port
+        :param extract: Extract returned for every page
+        :param latency: Seconds to sleep before answering
+        :param full_extract: Extract returned for whole article queries, `extract` if not given
+        :param extracts: Extracts keyed by the first word of the titles they are returned for
+        :param revision_id: Revision of every page
+        """
+        self.extract = extract
+        self.full_extract = full_extract if full_extract is not None else extract
+        self.extracts = extracts or {}
+        self.latency = latency
+        self.revision_id = revision_id
+        self.requests = 0
+        self.bytes_sent = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # The headers and the body are written separately, with Nagle's algorithm every kept alive request
+            # would wait on the delayed ACK of the client
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                query = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+                titles = query.get('titles', [''])[0].split('|')
+                if 'generator' in query:
+                    name = (query.get('gsrsearch') or query.get('gcmtitle'))[0].removeprefix('Category:')
+                    limit = int((query.get('gsrlimit') or query.get('gcmlimit') or ['10'])[0])
+                    titles = [f"{name} {index + 1}" for index in range(limit)]
+                extract = server.extract if 'exintro' in query else server.full_extract
+                pages = {}
+                for index, title in enumerate(titles):
+                    page = pages[str(index + 1)] = {'pageid': index + 1, 'title': title,
+                                                    'lastrevid': server.revision_id, 'touched': '2024-01-01T00:00:00Z'}
+                    if 'generator' in query:
+                        page['index'] = index + 1
+                    if 'extracts' in query.get('prop', [''])[0]:
+                        page['extract'] = server.extracts.get(title.split(' ')[0], extract)
+                body = json.dumps({'query': {'pages': pages}}).encode()
+                server.bytes_sent += len(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = _Server((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/w/api.php"
+
+    def start(self) -> 'StubWikiServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'StubWikiServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def _serve(queue, kwargs) -> None:
+    server = StubWikiServer(**kwargs)
+    queue.put(server.url)
+    server.httpd.serve_forever()
+
+
+@contextmanager
+def stub_server_process(**kwargs):
+    """
+        Runs a StubWikiServer in a child process, keeping its allocations and CPU time out of the measurements
+    :param kwargs: StubWikiServer arguments
+    :return: Url of the server
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(queue, kwargs), daemon=True)
+    process.start()
+    try:
+        yield queue.get(timeout=30)
+    finally:
+        process.terminate()
+        process.join()
@@ -0,0 +1,255 @@
+"""
+    Benchmark suite comparable across commits. Runs the tokenizer and HTML stripping micro benchmarks and drives
+    `/word_frequency/` (per extract size) and `/search_history/` at the given concurrency through the WSGI
+    (threaded `Client`) and ASGI (`AsyncClient` on one event loop) handlers, against a local stub of the
+    Wikipedia API in a child process. Inputs are generated with fixed seeds and every case is run `--repeat`
+    times, keeping the best time of the micro benchmarks and the median of the HTTP runs.
+
+    The `cold_start` group times fresh interpreters up to their first request served and the fixed overhead of
+    the requests after it (see benchmarks.cold_start).
+
+    Results are written as JSON. Given a `--baseline` (the JSON of an earlier run), every result worse than the
+    baseline by more than `--threshold` is reported and the run exits with status 1.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --output results.json --baseline baseline.json --threshold 0.15
+    python -m benchmarks.suite --only micro word_frequency --latency 0.02 --concurrency 8 --requests 100
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import platform
+import argparse
+import statistics
+import subprocess
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks._django import setup_django, use_stub_server
+from benchmarks.stub_server import stub_server_process
+from benchmarks.tokenizer import generate_text
+from benchmarks.html_extraction import generate_html
+from benchmarks.cold_start import measure as measure_cold_start
+
+
+GROUPS = ('micro', 'word_frequency', 'search_history', 'cold_start')
+MODES = ('wsgi', 'asgi')
+# Characters of HTML of the lead section extracts served by the stub, per size class
+EXTRACT_SIZES = {'small': 2_000, 'medium': 20_000, 'large': 200_000}
+MICRO_SIZE = 1_000_000
+HISTORY_ROWS = 20_000
+HISTORY_PAGE_SIZE = 50
+COLD_START_RUNS = 5
+
+
+def result(value: float, unit: str, higher_is_better: bool, gated: bool = True) -> dict:
+    """
+        A benchmark result, only gated results fail the run when they regress
+    """
+    return dict(value=round(value, 3), unit=unit, higher_is_better=higher_is_better, gated=gated)
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def bench_micro(repeat: int) -> dict:
+    from analysis.tokenizer import WordCounter
+    from analysis.extraction import strip_html
+    text, html = generate_text(MICRO_SIZE, seed=1), generate_html(MICRO_SIZE, seed=1)
+    results = {}
+    for name, function, data in (('tokenizer', lambda value: WordCounter().feed(value).most_common(10), text),
+                                 ('strip_html', strip_html, html)):
+        function(data)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(data)
+            timings.append(time.perf_counter() - start)
+        # The best time, like the other micro benchmarks, is the least disturbed by the rest of the machine
+        results[f"micro.{name}"] = result(len(data) / min(timings) / 1e6, 'M chars/s', True)
+    return results
+
+
+def drive_wsgi(path: str, params: list, concurrency: int) -> tuple:
+    """
+        Sends a GET per params through the WSGI handler from `concurrency` threads
+    :return: Tuple of the elapsed seconds and the latency of every request
+    """
+    from django.test import Client
+    local = threading.local()
+
+    def call(query):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client()
+        start = time.perf_counter()
+        response = client.get(path, query)
+        assert response.status_code == 200, response.content
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(call, params))
+    return time.perf_counter() - start, latencies
+
+
+def drive_asgi(path: str, params: list, concurrency: int) -> tuple:
+    """
+        Sends a GET per params through the ASGI handler, at most `concurrency` at a time
+    :return: Tuple of the elapsed seconds and the latency of every request
+    """
+    from django.test import AsyncClient
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        client = AsyncClient()
+
+        async def call(query):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, query)
+                assert response.status_code == 200, response.content
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*[call(query) for query in params])
+        return time.perf_counter() - start, latencies
+
+    return asyncio.run(main())
+
+
+DRIVERS = {'wsgi': drive_wsgi, 'asgi': drive_asgi}
+
+
+def bench_http(name: str, path: str, params_for, requests: int, concurrency: int, repeat: int, modes) -> dict:
+    """
+        Runs `requests` GETs per repeat in every mode, reporting the median throughput and 95th percentile latency
+    :param params_for: Callable returning the query parameters of the given run and request index
+    """
+    results = {}
+    for mode in modes:
+        drive = DRIVERS[mode]
+        drive(path, [params_for(-1, index) for index in range(min(requests, 20))], concurrency)
+        throughputs, p95s = [], []
+        for run in range(repeat):
+            elapsed, latencies = drive(path, [params_for(run, index) for index in range(requests)], concurrency)
+            throughputs.append(requests / elapsed)
+            p95s.append(percentile(latencies, 0.95) * 1000)
+        results[f"{name}.{mode}"] = result(statistics.median(throughputs), 'requests/s', True)
+        # Tail latencies of a few hundred requests are too noisy to gate on, they are reported only
+        results[f"{name}.{mode}.p95"] = result(statistics.median(p95s), 'ms', False, gated=False)
+    return results
+
+
+def seed_history(rows: int) -> None:
+    from analysis.models import SearchResult
+    word_frequency = [[f"word{index}", 100 - index] for index in range(10)]
+    for start in range(0, rows, 5000):
+        SearchResult.objects.bulk_create(SearchResult(topic=f"topic {index % 500}", word_frequency=word_frequency)
+                                         for index in range(start, min(rows, start + 5000)))
+
+
+def environment() -> dict:
+    import django
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return dict(commit=commit, timestamp=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                python=platform.python_version(), django=django.get_version(), platform=platform.platform(),
+                cpus=os.cpu_count())
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+        Compares the results with a baseline run
+    :param results: Results of this run
+    :param baseline: Results of the baseline run
+    :param threshold: Largest accepted relative slowdown, e.g. 0.1 for 10%
+    :return: List of (name, baseline value, value, relative change) of the gated results worse than the threshold
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None or not previous['value']:
+            continue
+        change = (current['value'] - previous['value']) / previous['value']
+        worse = -change if current['higher_is_better'] else change
+        regressed = current.get('gated', True) and worse > threshold
+        print(f"{name:<36} {previous['value']:>12.2f} -> {current['value']:>12.2f} {current['unit']:<11} "
+              f"{change:+7.1%}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append((name, previous['value'], current['value'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=list(GROUPS))
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--requests', type=int, default=200, help='Requests per case and repeat')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help='Injected upstream latency in seconds')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--extracts', help='JSON file of recorded extracts keyed by size class, replacing the '
+                                           'generated ones, e.g. {"small": "<p>...</p>", "large": "..."}')
+    parser.add_argument('--output', help='Path of the JSON results, printed when not given')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Largest accepted relative slowdown')
+    args = parser.parse_args()
+
+    setup_django()
+    if args.extracts:
+        with open(args.extracts) as extracts_file:
+            extracts = json.load(extracts_file)
+    else:
+        extracts = {name: generate_html(size, seed=index) for index, (name, size) in enumerate(EXTRACT_SIZES.items())}
+
+    results = {}
+    if 'micro' in args.only:
+        results.update(bench_micro(args.repeat))
+    if 'word_frequency' in args.only:
+        with stub_server_process(latency=args.latency, extracts=extracts) as url:
+            use_stub_server(url)
+            for size in extracts:
+                # Distinct topics per request, so that no request is coalesced with another
+                results.update(bench_http(f"word_frequency.{size}", '/api/word_frequency/',
+                                          lambda run, index, size=size: {'topic': f"{size} {run} {index}"},
+                                          args.requests, args.concurrency, args.repeat, args.modes))
+    if 'search_history' in args.only:
+        seed_history(HISTORY_ROWS)
+        results.update(bench_http('search_history', '/api/search_history/',
+                                  lambda run, index: {'page': index % 20 + 1, 'page_size': HISTORY_PAGE_SIZE},
+                                  args.requests, args.concurrency, args.repeat, args.modes))
+
+    if 'cold_start' in args.only:
+        cold_start = measure_cold_start(COLD_START_RUNS, args.requests)
+        results['cold_start.first_request_served'] = result(cold_start['total'] * 1000, 'ms', False)
+        results['cold_start.per_request'] = result(cold_start['per_request'] * 1000, 'ms', False)
+        for phase, seconds in cold_start['phases'].items():
+            results[f"cold_start.{phase}"] = result(seconds * 1000, 'ms', False, gated=False)
+
+    report = dict(environment=environment(), settings=dict(vars(args)), results=results)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} result(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+    Tokens per second of the word count with a large stopword list (every bundled language, 700+ words), the
+    previous per token filter (list lookup and `isnumeric()` call per token) against the TokenFilter applied
+    to the distinct words by WordCounter.
+
+    python -m benchmarks.token_filter --sizes 100000 1000000 --stopwords en,fr,de,es
+"""
+import re
+import time
+import random
+import argparse
+from collections import Counter
+
+from benchmarks._django import setup_django
+from benchmarks.tokenizer import VOCABULARY
+
+
+def legacy_filtered_count(text: str, stopwords: list) -> Counter:
+    """
+        The per token filter that TokenFilter replaced, kept for comparison
+    """
+    def check_to_skip(word):
+        return word not in stopwords and not word.isnumeric()
+
+    return Counter(filter(check_to_skip, re.findall(r'\w+', text.lower())))
+
+
+def generate_text(size: int, stopwords: list, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    # Stopwords make up about half of the tokens of real prose
+    words = VOCABULARY + [f"term{index}" for index in range(5000)] + stopwords
+    weights = [50] * len(VOCABULARY) + [1] * 5000 + [20] * len(stopwords)
+    parts, length = [], 0
+    while length < size:
+        chunk = ' '.join(rng.choices(words, weights, k=1000)) + '. '
+        parts.append(chunk)
+        length += len(chunk)
+    return ''.join(parts)[:size]
+
+
+def measure(function, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--stopwords', default='en,fr,de,es')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    from analysis.filters import TokenFilter, load_stopwords
+    from analysis.tokenizer import WordCounter
+    stopwords = load_stopwords(args.stopwords)
+    stopword_list = sorted(stopwords)
+    token_filter = TokenFilter(stopwords, numbers='skip')
+    print(f"{len(stopwords)} stopwords")
+    for size in args.sizes:
+        text = generate_text(size, stopword_list)
+        counter = WordCounter(token_filter).feed(text)
+        counts = counter.close()
+        assert counts == legacy_filtered_count(text, stopword_list)
+        for name, function in (('per token', lambda: legacy_filtered_count(text, stopword_list)),
+                               ('TokenFilter', lambda: WordCounter(token_filter).feed(text).close())):
+            elapsed = measure(function, args.repeat)
+            print(f"{name:>11} {size:>9} chars: {elapsed * 1000:9.2f} ms, {counter.tokens / elapsed / 1e6:6.2f} M tokens/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+    Micro benchmark of the word counting engine against the previous list based implementation of
+    `WikiAnalysisUtil.word_frequency_analysis`, reporting throughput and peak memory per text size.
+
+    python -m benchmarks.tokenizer --sizes 10000 100000 1000000 5000000
+"""
+import re
+import time
+import random
+import argparse
+import tracemalloc
+from collections import Counter
+
+from analysis.const import COMMON_WORDS
+from analysis.tokenizer import WordCounter
+from analysis.filters import TokenFilter
+
+
+VOCABULARY = ['database', 'sharding', 'the', 'is', 'in', 'at', 'which', 'on', 'a', 'this', 'partition', 'replica',
+              'horizontal', 'scaling', 'query', 'node', 'cluster', 'key', 'range', 'hash', '2024', '42', 'index']
+
+
+def legacy_word_frequency_analysis(text: str, top_word_count: int = 10) -> list:
+    """
+        The list based implementation that WordCounter replaced, kept for comparison
+    """
+    def check_to_skip(word):
+        good_to_go = True
+        if word in COMMON_WORDS:
+            good_to_go = False
+        if not word.isnumeric() and good_to_go:
+            return True
+        return False
+
+    words = re.findall(r'\w+', text.lower())
+    words_list = [word for word in words]
+    filtered_words = list(filter(check_to_skip, words_list))
+    return Counter(filtered_words).most_common(top_word_count)
+
+
+def streaming_word_frequency_analysis(text: str, top_word_count: int = 10) -> list:
+    return WordCounter(TokenFilter(COMMON_WORDS, numbers='skip')).feed(text).most_common(top_word_count)
+
+
+def generate_text(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    # A long tail of rare words next to the common ones, like a real article
+    words = VOCABULARY + [f"term{index}" for index in range(5000)]
+    weights = [50] * len(VOCABULARY) + [1] * 5000
+    parts, length = [], 0
+    while length < size:
+        chunk = ' '.join(rng.choices(words, weights, k=1000)) + '. '
+        parts.append(chunk)
+        length += len(chunk)
+    return ''.join(parts)[:size]
+
+
+def measure(function, text: str, repeat: int) -> tuple:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    function(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        text = generate_text(size)
+        assert legacy_word_frequency_analysis(text) == streaming_word_frequency_analysis(text)
+        for name, function in (('legacy', legacy_word_frequency_analysis),
+                               ('streaming', streaming_word_frequency_analysis)):
+            elapsed, peak = measure(function, text, args.repeat)
+            print(f"{name:>9} {size:>9} chars: {elapsed * 1000:8.2f} ms, {size / elapsed / 1e6:6.1f} MB/s, "
+                  f"peak {peak / 1024:9.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+    Storage of `SearchResult.word_frequency` as JSON text (JSONField) against the packed WordFrequencyField:
+    table size, bulk insert rate, and the time to decode history pages and to scan the whole column, on tables of
+    `--rows` seeded search results holding the top `--words` words of realistic frequencies.
+
+    python -m benchmarks.word_frequency_storage --rows 1000000 --words 10
+"""
+import time
+import random
+import argparse
+from itertools import accumulate
+
+from benchmarks._django import setup_django
+
+
+BATCH_SIZE = 5000
+PAGE_SIZE = 50
+
+
+def storage_models() -> dict:
+    """
+        Returns a model per storage format, with the columns of SearchResult
+    """
+    from django.db import models
+    from analysis.fields import WordFrequencyField
+
+    def model(name, field):
+        return type(name, (models.Model,), {
+            '__module__': __name__,
+            'topic': models.CharField(max_length=255),
+            'word_frequency': field,
+            'created_at': models.DateTimeField(auto_now_add=True),
+            'Meta': type('Meta', (), {'app_label': 'analysis', 'db_table': f"bench_{name.lower()}"}),
+        })
+
+    return {'json': model('JsonSearchResult', models.JSONField()),
+            'packed': model('PackedSearchResult', WordFrequencyField())}
+
+
+def generate_rows(rows: int, words: int, seed: int = 1):
+    """
+        Yields (topic, word_frequency) pairs, words drawn from a Zipf like vocabulary with decreasing counts
+    """
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 11)))
+                  for _ in range(20_000)]
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    for index in range(rows):
+        top = sorted(rng.choices(range(len(vocabulary)), cum_weights=cum_weights, k=words))
+        counts = sorted((rng.randint(1, 40) for _ in top), reverse=True)
+        yield f"topic {index % 5000}", [[vocabulary[rank], count] for rank, count in zip(top, counts)]
+
+
+def insert(model, rows: int, words: int) -> float:
+    """
+        Bulk inserts the rows in transactions of BATCH_SIZE
+    :return: Rows inserted per second
+    """
+    from django.db import transaction
+
+    def write(batch):
+        start = time.perf_counter()
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        return time.perf_counter() - start
+
+    batch, elapsed = [], 0.0
+    for topic, word_frequency in generate_rows(rows, words):
+        batch.append(model(topic=topic, word_frequency=word_frequency))
+        if len(batch) == BATCH_SIZE:
+            elapsed += write(batch)
+            batch = []
+    if batch:
+        elapsed += write(batch)
+    return rows / elapsed
+
+
+def table_size(model) -> int:
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def decode_pages(model, pages: int) -> float:
+    """
+        Loads and serializes history pages of PAGE_SIZE rows spread over the table, like /search_history/
+    :return: Milliseconds per page
+    """
+    from analysis.fields import WordFrequency
+    last_id = model.objects.order_by('-id').values_list('id', flat=True)[0]
+    rng = random.Random(2)
+    start = time.perf_counter()
+    for _ in range(pages):
+        for row in model.objects.filter(id__lte=rng.randint(PAGE_SIZE, last_id)).order_by('-id') \
+                .values('topic', 'word_frequency', 'created_at')[:PAGE_SIZE]:
+            word_frequency = row['word_frequency']
+            if isinstance(word_frequency, WordFrequency):
+                word_frequency.tolist()
+    return (time.perf_counter() - start) / pages * 1000
+
+
+def scan(model) -> float:
+    """
+        Decodes the word frequency of every row, like the rollup backfill
+    :return: Rows per second
+    """
+    start = time.perf_counter()
+    count = 0
+    for word_frequency in model.objects.values_list('word_frequency', flat=True).iterator(chunk_size=BATCH_SIZE):
+        for _ in word_frequency:
+            pass
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--words', type=int, default=10, help="Words per search result")
+    parser.add_argument('--pages', type=int, default=500, help="History pages decoded")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    for name, model in storage_models().items():
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(model)
+        rate = insert(model, args.rows, args.words)
+        size = table_size(model)
+        page = decode_pages(model, args.pages)
+        scanned = scan(model)
+        print(f"{name:>6}: {size / 2 ** 20:8.1f} MB  {size / args.rows:6.1f} B/row  insert {rate:9.0f} rows/s  "
+              f"page of {PAGE_SIZE} {page:6.2f} ms  scan {scanned:9.0f} rows/s")
+        with connection.schema_editor() as schema_editor:
+            schema_editor.delete_model(model)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+    Top words of the search history, merging every saved `word_frequency` in Python against the
+    `/word_trends/` rollups, on a seeded history spread over --days days.
+
+    python -m benchmarks.word_trends --rows 100000 --days 30
+"""
+import time
+import random
+import argparse
+from datetime import timedelta
+from collections import Counter
+from unittest.mock import patch
+
+from benchmarks._django import setup_django
+
+
+def seed(rows: int, days: int) -> None:
+    from django.utils import timezone
+    from analysis.models import SearchResult
+    from analysis.rollups import save_search_results
+    rng = random.Random(0)
+    vocabulary = [f"word{index}" for index in range(20_000)]
+    # Zipf like, a few words show up in most results
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    now = timezone.now()
+    batch = 2000
+    for start in range(0, rows, batch):
+        # Every batch is saved on its own day, like a steady stream of searches
+        with patch('django.utils.timezone.now', return_value=now - timedelta(days=start * days // rows)):
+            save_search_results([SearchResult(topic=f"topic {index}",
+                                              word_frequency=[[word, rng.randint(1, 50)]
+                                                              for word in set(rng.choices(vocabulary, weights, k=10))])
+                                 for index in range(start, min(rows, start + batch))])
+
+
+def scan_history(since) -> list:
+    from analysis.models import SearchResult
+    counts = Counter()
+    for word_frequency in SearchResult.objects.filter(created_at__date__gte=since) \
+            .values_list('word_frequency', flat=True).iterator(chunk_size=2000):
+        for word, count in word_frequency:
+            counts[word] += count
+    return counts.most_common(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.utils import timezone
+    seed(args.rows, args.days)
+    since = timezone.localdate() - timedelta(days=6)
+    client = Client()
+
+    client.get('/api/word_trends/', {'n': 10})
+    start = time.perf_counter()
+    scanned = scan_history(since)
+    print(f"history scan:  {(time.perf_counter() - start) * 1000:9.1f} ms")
+    start = time.perf_counter()
+    response = client.get('/api/word_trends/', {'n': 10})
+    print(f"rollups:       {(time.perf_counter() - start) * 1000:9.1f} ms")
+    start = time.perf_counter()
+    client.get('/api/word_trends/', {'word': 'word0'})
+    print(f"word trend:    {(time.perf_counter() - start) * 1000:9.1f} ms")
+    assert [tuple(pair) for pair in response.json()['top_words']][:3] == scanned[:3], (response.json(), scanned)
+
+
+if __name__ == '__main__':
+    main()
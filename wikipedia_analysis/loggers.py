@@ -1,8 +1,4 @@
 import logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
+# Logging is configured by `settings.LOGGING` when Django is set up, so importing this module (and through it any
+# analysis module) does not touch the logging configuration of the importing process
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'analysis.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +84,36 @@ DATABASES = {
     }
 }
 
+# Database profile, WIKI_DB_PROFILE=production tunes SQLite for concurrent readers and writers:
+# WAL journal, synchronous=NORMAL, memory mapped I/O, a busy timeout instead of immediate `database is locked`
+# errors and a bigger page cache, applied to every connection by analysis.db.configure_sqlite_connection.
+# Search history reads go through a separate read only connection (analysis.routers.HistoryReadRouter).
+
+WIKI_DB_PROFILE = os.environ.get('WIKI_DB_PROFILE', 'development')
+
+WIKI_SQLITE_PRAGMAS = {}
+
+WIKI_HISTORY_READ_DATABASE = 'history'
+
+if WIKI_DB_PROFILE == 'production':
+    DATABASES['default']['OPTIONS'] = {'timeout': 20}
+    DATABASES[WIKI_HISTORY_READ_DATABASE] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['analysis.routers.HistoryReadRouter']
+    WIKI_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 20000,
+        # Negative sizes are in KiB
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -123,3 +155,153 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Logging, applied once by django.setup(): every record of INFO and above to stderr. httpx logs every request at
+# INFO.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s - %(levelname)s - %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'root': {'level': 'INFO', 'handlers': ['console']},
+    'loggers': {
+        'httpx': {'level': 'WARNING'},
+    },
+}
+
+
+# Wikipedia analysis
+# Article cache in front of the Wikipedia API. Set SHARED_CACHE_ALIAS to an alias of CACHES
+# (e.g. a FileBasedCache or Redis backend) to share the cleaned articles across processes.
+
+WIKI_ARTICLE_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 1024,
+    'TTL': 300,
+    'STALE_TTL': 3600,
+    'SHARED_CACHE_ALIAS': None,
+    'SHARED_CACHE_TIMEOUT': 86400,
+}
+
+# Shared HTTP client for all Wikipedia access. Timeouts are in seconds, 429 and 5xx responses are retried
+# with jittered exponential backoff (honouring Retry-After) and the circuit opens after
+# CIRCUIT_FAILURE_THRESHOLD consecutive failures for CIRCUIT_RECOVERY_TIMEOUT seconds.
+
+WIKI_HTTP_CLIENT = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 50,
+    'MAX_RETRIES': 3,
+    'BACKOFF_FACTOR': 0.5,
+    'BACKOFF_JITTER': 0.5,
+    'BACKOFF_MAX': 30,
+    'CIRCUIT_FAILURE_THRESHOLD': 5,
+    'CIRCUIT_RECOVERY_TIMEOUT': 30,
+}
+
+# Every word of each analysed article is stored per revision, so repeat queries with another `n` or other skip
+# flags are answered without fetching the article. The revision is checked again after REVALIDATE_AFTER seconds.
+
+WIKI_TERM_STORE = {
+    'ENABLED': True,
+    'REVALIDATE_AFTER': 300,
+}
+
+# Lead section extracts are fetched as HTML and stripped (tags, <script>/<style>, entities), EXPLAINTEXT asks WIKI
+# for plain text instead.
+
+WIKI_EXTRACTS = {
+    'EXPLAINTEXT': False,
+}
+
+# Directories searched for `<language>.txt` stopword lists before the ones bundled in analysis/stopwords.
+
+WIKI_STOPWORDS = {
+    'DIRS': [],
+}
+
+# Per day and word rollups of the saved search results, read by /word_trends/. Disabling them leaves the rollups
+# behind the history until `manage.py backfill_word_rollups` is run.
+
+WIKI_ROLLUPS = {
+    'ENABLED': True,
+}
+
+# Counts the words of texts of MIN_TEXT_SIZE characters or more in a warm pool of MAX_WORKERS processes (one per
+# core when None), in blocks of BLOCK_SIZE characters, so that large and full articles neither hold the GIL of the
+# request threads nor stay on a single core. Smaller texts are counted in the request thread.
+
+WIKI_ANALYSIS_EXECUTOR = {
+    'ENABLED': False,
+    'MAX_WORKERS': None,
+    'MIN_TEXT_SIZE': 256 * 1024,
+    'BLOCK_SIZE': 1024 * 1024,
+}
+
+# Write behind queue for the search history. When enabled, SearchResult rows are written in batches by a
+# background thread instead of one INSERT per request. MODE is 'fire_and_forget' (the request does not wait for
+# the write, queued rows are lost if the process is killed) or 'wait_for_flush' (the request waits for the batch
+# holding its row to commit).
+
+WIKI_WRITE_BEHIND = {
+    'ENABLED': False,
+    'MODE': 'fire_and_forget',
+    'MAX_QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'PUT_TIMEOUT': 1.0,
+}
+
+# Background refresher keeping the TOP_TOPICS most requested topics warm. Every INTERVAL seconds their revisions
+# are checked with metadata only queries (50 titles per query) and only the pages that changed are downloaded and
+# counted again. Request counts are multiplied by DECAY at every run, at most MAX_TRACKED topics are tracked.
+
+WIKI_REFRESHER = {
+    'ENABLED': False,
+    'INTERVAL': 60,
+    'TOP_TOPICS': 100,
+    'MAX_TRACKED': 10000,
+    'DECAY': 0.5,
+}
+
+# Cache warmer prefetching the lead sections of the TOP_K topics searched the most in the last WINDOW seconds, every
+# INTERVAL seconds, from a thread started with the first request (or `manage.py warm_cache`). Topics still fresh
+# in the term store are skipped, the others are fetched 20 per query with at most MAX_REQUESTS queries per run,
+# REQUESTS_PER_SECOND apart.
+
+WIKI_WARMER = {
+    'ENABLED': False,
+    'INTERVAL': 300,
+    'TOP_K': 100,
+    'WINDOW': 86400,
+    'REQUESTS_PER_SECOND': 1.0,
+    'MAX_REQUESTS': 50,
+}
+
+# HTTP caching of the responses. Analyses carry a strong ETag of the article revision and `max-age=MAX_AGE`, history
+# pages the ETag and Last-Modified of the newest search result, revalidated after HISTORY_MAX_AGE seconds (every
+# time with 0). Conditional requests are answered with 304 without computing the body. RESPONSE_CACHE_ALIAS, an
+# alias of CACHES, keeps the rendered history pages for RESPONSE_CACHE_TIMEOUT seconds.
+
+WIKI_HTTP_CACHE = {
+    'ENABLED': True,
+    'MAX_AGE': 60,
+    'HISTORY_MAX_AGE': 0,
+    'RESPONSE_CACHE_ALIAS': None,
+    'RESPONSE_CACHE_TIMEOUT': 300,
+}
+
+# Request, stage, Wikipedia and database metrics exposed at /metrics in the Prometheus text format, with a
+# Server-Timing header on every response when SERVER_TIMING is set. Metrics are kept per process. When disabled the
+# middleware removes itself and no timer or query wrapper is installed.
+
+WIKI_METRICS = {
+    'ENABLED': False,
+    'SERVER_TIMING': True,
+}
@@ -17,6 +17,9 @@ Including another URLconf
 
 from django.urls import path, include
 
+from analysis.views import Metrics
+
 urlpatterns = [
     path('api/', include('analysis.urls')),
+    path('metrics', Metrics.as_view(), name='metrics'),
 ]